@@ -0,0 +1,351 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from main import format_table, write_job_yaml
+from src.agent_config import default_agent_config
+from src.gen_trace import TRACE_FORMATS, generate_decode_trace
+from src.hw_spec import DEFAULT_SPEC, HardwareSpec
+from src.model_config import model_params
+from src.profiler import RSS_UNIT
+
+AGENTX_DIR = Path(__file__).resolve().parent
+STUB_SIMULATOR = AGENTX_DIR / "src" / "stub_agentx.py"
+
+BENCH_MODELS = ["8B", "14B", "32B", "70B"]
+BENCH_CONTEXTS = [512, 2048, 8192, 32768]
+BENCH_SUITES = ["generate", "load", "e2e"]
+
+# Fields identifying a result across runs, and the metrics compared per
+# benchmark with whether larger values are better.
+KEY_FIELDS = ("bench", "model", "context", "format", "dataset", "cache")
+BENCH_METRICS = {"generate": {"cmd_per_s": True, "trace_bytes": False, "peak_mem": False},
+                 "load": {"seconds": False, "sim_cmd_per_s": True, "sim_peak_rss": False},
+                 "e2e": {"seconds": False}}
+
+# NDPLoadStoreTrace log lines saying a text trace is streamed or a binary one mapped.
+TRACE_READY_MARKERS = ("Streaming trace lines", "Mapped")
+
+# Synthetic H100 tables for machines without measured ones (see synthetic_latency_tables).
+SYNTHETIC_LENGTHS = [0.5, 1, 2, 4, 8, 16, 24, 32]
+
+
+class CountingSink:
+    # Binary sink that only counts the bytes written to it.
+    def __init__(self) -> None:
+        self.n_bytes = 0
+
+    def write(self, data: bytes) -> None:
+        self.n_bytes += len(data)
+
+
+def best_of(fn, repeat: int):
+    # (fastest wall time, result of that run) over repeat runs.
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        if elapsed < best:
+            best, result = elapsed, out
+    return best, result
+
+
+def bench_generate(models: List[str], contexts: List[int], formats: List[str], repeat: int,
+                   spec: HardwareSpec = DEFAULT_SPEC) -> List[dict]:
+    """
+    Trace generation throughput (commands/s, loops expanded), trace size and
+    peak Python heap of one decoder layer, written to a byte-counting sink.
+    """
+    rows = []
+    for model in models:
+        for context_len in contexts:
+            for trace_format in formats:
+                def run():
+                    sink = CountingSink()
+                    n_cmd = generate_decode_trace(model, context_len, sink=sink, trace_format=trace_format,
+                                                  spec=spec)
+                    return n_cmd, sink.n_bytes
+
+                seconds, (n_cmd, n_bytes) = best_of(run, repeat)
+                # Measured separately: tracing allocations slows generation down.
+                tracemalloc.start()
+                run()
+                _, peak_mem = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                rows.append({"bench": "generate", "model": model, "context": context_len, "format": trace_format,
+                             "commands": n_cmd, "seconds": seconds, "cmd_per_s": n_cmd / seconds,
+                             "trace_bytes": n_bytes, "peak_mem": peak_mem})
+    return rows
+
+
+def run_timed_load(agentx_bin: Path, job_yaml: Path, cwd: Path) -> tuple:
+    """
+    Runs the simulator and returns (startup seconds, total seconds, peak RSS
+    in bytes, output). The startup time spans the frontend's "Loading trace
+    file" log line and the one saying the trace is streamed or mapped.
+    """
+    start = time.perf_counter()
+    t_loading = t_ready = None
+    lines = []
+    proc = subprocess.Popen([str(agentx_bin), "-f", str(job_yaml)], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, cwd=cwd)
+    for line in proc.stdout:
+        now = time.perf_counter()
+        if t_loading is None and "Loading trace file" in line:
+            t_loading = now
+        elif t_ready is None and any(marker in line for marker in TRACE_READY_MARKERS):
+            t_ready = now
+        lines.append(line)
+    # wait4 gives the peak RSS of this run alone.
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    output = "".join(lines)
+    if proc.returncode != 0 or t_loading is None or t_ready is None:
+        raise RuntimeError(f"Failed to time the trace load of {agentx_bin} (exit code {proc.returncode}).\n"
+                           f"Output:\n{output}")
+    return t_ready - t_loading, time.perf_counter() - start, usage.ru_maxrss * RSS_UNIT, output
+
+
+def bench_load(agentx_dir: Path, models: List[str], contexts: List[int], formats: List[str], repeat: int,
+               spec: HardwareSpec = DEFAULT_SPEC) -> List[dict]:
+    # NDPLoadStoreTrace startup time, and simulation throughput (commands/s) and
+    # peak RSS of the simulator in agentx_dir.
+    agentx_bin = (agentx_dir / "AgentX").resolve()
+    rows = []
+    for model in models:
+        for context_len in contexts:
+            for trace_format in formats:
+                job_dir = Path(tempfile.mkdtemp(prefix="agentx-bench-"))
+                try:
+                    trace_path = job_dir / "AgentX-NDP.trace"
+                    n_cmd = generate_decode_trace(model, context_len, sink=trace_path, trace_format=trace_format,
+                                                  spec=spec)
+                    job_yaml = write_job_yaml(agentx_dir / "AgentX.yaml", job_dir, trace_path, trace_format, spec)
+                    _, (load_s, sim_s, sim_rss, _) = best_of(lambda: run_timed_load(agentx_bin, job_yaml, job_dir), repeat)
+                    n_bytes = trace_path.stat().st_size
+                finally:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                rows.append({"bench": "load", "model": model, "context": context_len, "format": trace_format,
+                             "commands": n_cmd, "trace_bytes": n_bytes, "seconds": load_s,
+                             "sim_seconds": sim_s, "sim_cmd_per_s": n_cmd / sim_s, "sim_peak_rss": sim_rss})
+    return rows
+
+
+def bench_e2e(agentx_dir: Path, latency_dir: Path, datasets: List[str], repeat: int, cache_root: Path,
+              trace_format: str = "loop") -> List[dict]:
+    """
+    Wall time of a main.py run (interpreter start-up included) per dataset and
+    cache state: without the cache, with an empty one and with one filled by a
+    previous run. Every cached run uses its own directory under cache_root.
+    """
+    rows = []
+    for dataset in datasets:
+        cmd = [sys.executable, str(AGENTX_DIR / "main.py"), "--dataset", dataset,
+               "--agentx_dir", str(agentx_dir), "--latency_dir", str(latency_dir),
+               "--trace_format", trace_format]
+
+        def run(options):
+            res = subprocess.run(cmd + options, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                 cwd=AGENTX_DIR)
+            if res.returncode != 0:
+                raise RuntimeError(f"main.py failed for {dataset}.\nCommand: {' '.join(cmd + options)}\n"
+                                   f"Output:\n{res.stdout}")
+
+        def run_cold():
+            cache_dir = Path(tempfile.mkdtemp(prefix="cold-", dir=cache_root))
+            try:
+                run(["--cache_dir", str(cache_dir)])
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+        warm_dir = Path(tempfile.mkdtemp(prefix="warm-", dir=cache_root))
+        run(["--cache_dir", str(warm_dir)])
+        for cache, fn in (("off", lambda: run(["--no_cache"])), ("cold", run_cold),
+                          ("warm", lambda: run(["--cache_dir", str(warm_dir)]))):
+            seconds, _ = best_of(fn, repeat)
+            rows.append({"bench": "e2e", "dataset": dataset, "format": trace_format, "cache": cache,
+                         "seconds": seconds})
+        shutil.rmtree(warm_dir, ignore_errors=True)
+    return rows
+
+
+def make_stub_dir(directory: Path) -> Path:
+    # An AgentX directory whose "binary" runs the deterministic stub simulator.
+    shutil.copy(AGENTX_DIR / "AgentX.yaml", directory / "AgentX.yaml")
+    agentx_bin = directory / "AgentX"
+    agentx_bin.write_text(f"#!/bin/sh\nexec \"{sys.executable}\" \"{STUB_SIMULATOR}\" \"$@\"\n")
+    agentx_bin.chmod(0o755)
+    return directory
+
+
+def synthetic_latency_tables(directory: Path, models) -> Path:
+    # Deterministic model_size<model>.csv tables, so end-to-end runs need no H100 measurements.
+    for model in models:
+        size = model_params(model)
+        with open(directory / f"model_size{model}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["length", "prefill", "decode"])
+            for length in SYNTHETIC_LENGTHS:
+                writer.writerow([length, 0.006 * size * length, 4 + 0.45 * size + 0.05 * length])
+    return directory
+
+
+def result_key(row: dict) -> tuple:
+    return tuple(row.get(name) for name in KEY_FIELDS)
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float) -> List[dict]:
+    """
+    Metrics of results worse than the matching baseline result by more than
+    threshold (relative), as rows with both values and the change.
+    """
+    base = {result_key(row): row for row in baseline}
+    regressions = []
+    for row in results:
+        old = base.get(result_key(row))
+        if old is None:
+            continue
+        for metric, higher_is_better in BENCH_METRICS[row["bench"]].items():
+            if metric not in row or metric not in old or not old[metric]:
+                continue
+            change = row[metric] / old[metric] - 1
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({**{name: row.get(name, "") for name in KEY_FIELDS},
+                                    "metric": metric, "baseline": old[metric], "current": row[metric],
+                                    "change (%)": 100 * change})
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True, check=True, cwd=AGENTX_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark trace generation, trace loading and end-to-end evaluation",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--suites",
+                        type=str,
+                        nargs="+",
+                        default=BENCH_SUITES,
+                        choices=BENCH_SUITES,
+                        help="benchmarks to run")
+    parser.add_argument("--models",
+                        type=str,
+                        nargs="+",
+                        default=BENCH_MODELS,
+                        help="model sizes of the generate and load benchmarks")
+    parser.add_argument("--contexts",
+                        type=int,
+                        nargs="+",
+                        default=BENCH_CONTEXTS,
+                        help="context lengths of the generate and load benchmarks")
+    parser.add_argument("--formats",
+                        type=str,
+                        nargs="+",
+                        default=list(TRACE_FORMATS),
+                        choices=list(TRACE_FORMATS),
+                        help="trace formats of the generate and load benchmarks")
+    parser.add_argument("--datasets",
+                        type=str,
+                        nargs="+",
+                        default=["BBH"],
+                        help="datasets of the end-to-end benchmark, or 'all'")
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=3,
+                        help="repetitions per measurement; the fastest is reported")
+    parser.add_argument("--agentx_dir",
+                        type=str,
+                        default=".",
+                        help="directory of the AgentX binary and AgentX.yaml")
+    parser.add_argument("--stub",
+                        action="store_true",
+                        help="use the deterministic stub simulator even if an AgentX binary exists "
+                             "(it is used automatically without one)")
+    parser.add_argument("--latency_dir",
+                        type=str,
+                        default="./src",
+                        help="directory of the H100 latency tables; synthetic tables are used if it has none")
+    parser.add_argument("--output",
+                        type=str,
+                        default="bench_results.json",
+                        help="JSON results file")
+    parser.add_argument("--baseline",
+                        type=str,
+                        default=None,
+                        help="earlier results file to compare against")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=0.1,
+                        help="relative slowdown (or growth in size/memory) flagged as a regression")
+    args = parser.parse_args()
+
+    datasets = default_agent_config.datasets if args.datasets == ["all"] else args.datasets
+    work_dir = Path(tempfile.mkdtemp(prefix="agentx-bench-"))
+    try:
+        agentx_dir = Path(args.agentx_dir)
+        stub = args.stub or not (agentx_dir / "AgentX").exists()
+        if stub:
+            agentx_dir = make_stub_dir(work_dir)
+        latency_dir = Path(args.latency_dir)
+        models = sorted({agent.model for dataset in datasets for agent in default_agent_config[dataset].values()})
+        if not all((latency_dir / f"model_size{model}.csv").exists() for model in models):
+            latency_dir = synthetic_latency_tables(work_dir, models)
+
+        results = []
+        if "generate" in args.suites:
+            results += bench_generate(args.models, args.contexts, args.formats, args.repeat)
+        if "load" in args.suites:
+            results += bench_load(agentx_dir, args.models, args.contexts, args.formats, args.repeat)
+        if "e2e" in args.suites:
+            results += bench_e2e(agentx_dir.resolve(), latency_dir.resolve(), datasets, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for bench in args.suites:
+        rows = [row for row in results if row["bench"] == bench]
+        if rows:
+            print(format_table([{k: v for k, v in row.items() if k != "bench"} for row in rows]))
+            print()
+
+    report = {"meta": {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "revision": git_revision(), "python": platform.python_version(),
+                       "platform": platform.platform(), "simulator": "stub" if stub else str(agentx_dir),
+                       "latency_tables": "synthetic" if latency_dir == work_dir else str(latency_dir),
+                       "args": vars(args)},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to", args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline} "
+                  f"(revision {baseline['meta'].get('revision')}):")
+            print(format_table(regressions))
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from main import collect_sim_points, format_table, simulate_points, write_latency_table
+from src.agent_config import default_agent_config, evaluate_latency
+from src.analytical import DEFAULT_FAST_MODEL, FastModel, macab_bound_cycles
+from src.gen_trace import TRACE_FORMATS, layout_footprint
+from src.hw_spec import DEFAULT_SPEC, HardwareSpec, dtype_bytes
+from src.sim_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, SimCache
+
+
+def spec_grid(packages: Sequence[int], channels: Sequence[int], banks: Sequence[int],
+              rates: Sequence[int], base: HardwareSpec = DEFAULT_SPEC) -> List[HardwareSpec]:
+    """
+    Hardware specs of every package/channel/bank/data-rate combination. The
+    device density of base is kept, so more banks per group have fewer rows;
+    combinations AgentX-NDP cannot model are skipped.
+    """
+    specs = []
+    for n_package in packages:
+        for n_channel in channels:
+            for n_bank in banks:
+                for rate in rates:
+                    try:
+                        specs.append(HardwareSpec(n_package=n_package, n_channel=n_channel, n_rank=base.n_rank,
+                                                  n_bg=base.n_bg, n_bank=n_bank,
+                                                  n_row=base.n_row * base.n_bank // n_bank, n_col=base.n_col,
+                                                  channel_width=base.channel_width, rate=rate))
+                    except ValueError as e:
+                        print(f"Skipping {n_package} packages x {n_channel} channels, {n_bank} banks, "
+                              f"{rate} MT/s: {e}")
+    return specs
+
+
+def fits(spec: HardwareSpec, points: Sequence[tuple]) -> bool:
+    # Whether every simulated point's decoder layer fits one channel of spec.
+    return all(layout_footprint(modelsize, context_len, batch_size, dbyte, spec, kv_dbyte, n_query) <= spec.gs['ch']
+               for modelsize, context_len, batch_size, maxlen, dbyte, kv_dbyte, n_query in dict.fromkeys(points))
+
+
+def pareto_front(objectives: Sequence[Tuple[float, float]]) -> List[int]:
+    # Indices of the points no other point matches or beats in both objectives (minimized).
+    front = []
+    for i, (a0, a1) in enumerate(objectives):
+        dominated = any(b0 <= a0 and b1 <= a1 and (b0 < a0 or b1 < a1)
+                        for j, (b0, b1) in enumerate(objectives) if j != i)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def explore(specs: Sequence[HardwareSpec], datasets: Sequence[str], batch_size: int, maxlen: int,
+            dtype: float, decode_samples: int = 1, fast_model: Optional[FastModel] = None,
+            cache: Optional[SimCache] = None, jobs: int = 1, trace_format: str = "loop",
+            kv_dtype: Optional[float] = None, agentx_dir: str = ".") -> List[Dict]:
+    """
+    Evaluates the AgentX latency (s, summed over datasets) of every spec and
+    marks the latency/capacity Pareto front, with capacity (provisioned GB)
+    as the cost. Candidates are visited by increasing capacity; one whose
+    MACAB-issue lower bound is already dominated by an evaluated point is
+    pruned without being simulated. fast_model replaces the simulator, which
+    is otherwise the AgentX binary in agentx_dir.
+    """
+    points = collect_sim_points(list(datasets), batch_size, maxlen, dtype, decode_samples, kv_dtype)
+    evaluate = partial(evaluate_latency, datasets, batch_size, maxlen, dtype, decode_samples=decode_samples,
+                       kv_dbyte=kv_dtype)
+
+    rows = []
+    for spec in specs:
+        row = {"n_package": spec.n_package, "n_channel": spec.n_channel, "n_bank": spec.n_bank,
+               "rate": spec.rate, "capacity_gb": spec.capacity_gb,
+               "lower_bound_s": float("nan"), "latency_s": float("nan"), "speedup": float("nan"),
+               "status": "infeasible"}
+        if fits(spec, points):
+            bound = evaluate(partial(macab_bound_cycles, spec=spec), spec=spec)
+            row["lower_bound_s"] = float(bound.agentx.sum())
+            row["status"] = "pending"
+        rows.append((spec, row))
+    rows.sort(key=lambda item: (item[1]["capacity_gb"], item[1]["lower_bound_s"]))
+
+    evaluated = []
+    for spec, row in rows:
+        if row["status"] != "pending":
+            continue
+        if any(cap <= row["capacity_gb"] and lat <= row["lower_bound_s"] and
+               (cap < row["capacity_gb"] or lat < row["lower_bound_s"]) for cap, lat in evaluated):
+            row["status"] = "pruned"
+            continue
+        if fast_model is not None:
+            run_fn = partial(fast_model.cycles, spec=spec)
+        else:
+            stages = simulate_points(points, jobs, cache, trace_format=trace_format, spec=spec,
+                                     agentx_dir=agentx_dir)
+            run_fn = lambda *point: sum(stages[point].values())
+        latency = evaluate(run_fn, spec=spec)
+        row["latency_s"] = float(latency.agentx.sum())
+        row["speedup"] = float(latency.h100.sum() / latency.agentx.sum())
+        row["status"] = "dominated"
+        evaluated.append((row["capacity_gb"], row["latency_s"]))
+
+    done = [row for _, row in rows if row["status"] == "dominated"]
+    for i in pareto_front([(row["capacity_gb"], row["latency_s"]) for row in done]):
+        done[i]["status"] = "pareto"
+    return [row for _, row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Design-space exploration of the AgentX-NDP hardware",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--dataset",
+                        type=str,
+                        default="all",
+                        help="dataset name, or 'all' for every dataset. default=all")
+    parser.add_argument("--packages",
+                        type=int,
+                        nargs="+",
+                        default=[2, 4, 6, 8],
+                        help="packages per device to sweep")
+    parser.add_argument("--channels",
+                        type=int,
+                        nargs="+",
+                        default=[4, 8, 16],
+                        help="channels per package to sweep")
+    parser.add_argument("--banks",
+                        type=int,
+                        nargs="+",
+                        default=[4],
+                        help="banks per bank group to sweep (the device density is kept)")
+    parser.add_argument("--rates",
+                        type=int,
+                        nargs="+",
+                        default=[6400],
+                        help="data rates (MT/s) to sweep")
+    parser.add_argument("--hw",
+                        type=str,
+                        default=None,
+                        help="hardware spec file the sweep starts from (rank, bank group, density, width)")
+    parser.add_argument("--batchsize",
+                        type=int,
+                        default=1,
+                        help="batch size. default=1")
+    parser.add_argument("--maxlen",
+                        type=int,
+                        default=32768,
+                        help="maximum context length. default=32768")
+    parser.add_argument("--dtype",
+                        type=dtype_bytes,
+                        default=2,
+                        help="weight data type, in bytes or fp16, bf16, fp8, int8, int4. default=2")
+    parser.add_argument("--kv_dtype",
+                        type=dtype_bytes,
+                        default=None,
+                        help="KV cache data type, like --dtype. default=--dtype")
+    parser.add_argument("--decode_samples",
+                        type=int,
+                        default=1,
+                        help="context lengths simulated per role across the decode")
+    parser.add_argument("--fast",
+                        action="store_true",
+                        help="estimate cycles with the calibrated analytical model instead of simulating")
+    parser.add_argument("--fast_model",
+                        type=str,
+                        default=DEFAULT_FAST_MODEL,
+                        help="analytical model parameter file")
+    parser.add_argument("--trace_format",
+                        type=str,
+                        default="loop",
+                        choices=list(TRACE_FORMATS),
+                        help="trace file format handed to AgentX. default=loop")
+    parser.add_argument("--agentx_dir",
+                        type=str,
+                        default=".",
+                        help="directory of the AgentX binary and AgentX.yaml")
+    parser.add_argument("--cache_dir",
+                        type=str,
+                        default=DEFAULT_CACHE_DIR,
+                        help="directory of the simulation result cache")
+    parser.add_argument("--no_cache",
+                        action="store_true",
+                        help="always rerun the simulator")
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=1,
+                        help="number of simulations run in parallel")
+    parser.add_argument("--output",
+                        type=str,
+                        default=None,
+                        help="write every candidate to this .csv or .json file")
+    args = parser.parse_args()
+
+    base = HardwareSpec.load(args.hw) if args.hw else DEFAULT_SPEC
+    datasets = default_agent_config.datasets if args.dataset == "all" else [args.dataset]
+    specs = spec_grid(args.packages, args.channels, args.banks, args.rates, base)
+    fast_model = FastModel.load(args.fast_model) if args.fast else None
+    if fast_model is not None and not fast_model.calibrated:
+        print(f"Warning: {args.fast_model} not found, using uncalibrated AgentX_6400 defaults "
+              f"(run main.py --calibrate first).")
+    cache = None if args.no_cache or args.fast else SimCache(args.cache_dir, DEFAULT_MAX_ENTRIES)
+
+    rows = explore(specs, datasets, args.batchsize, args.maxlen, args.dtype, args.decode_samples,
+                   fast_model, cache, args.jobs, args.trace_format, args.kv_dtype, args.agentx_dir)
+    print(format_table(rows))
+    front = [row for row in rows if row["status"] == "pareto"]
+    n_pruned = sum(row["status"] == "pruned" for row in rows)
+    print(f"{len(rows)} candidates, {len(front)} on the Pareto front, {n_pruned} pruned before simulation.")
+    if args.output is not None:
+        write_latency_table(rows, args.output)
+    if cache is not None:
+        print("Simulation cache:", cache.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,490 @@
 import argparse
+import csv
+import io
+import json
 import math
 import os
-import pandas
+import threading
 from src.model_config import *
 from src.agent_config import *
+from src.gen_trace import (generate_decode_trace, group_names, weights_base, CONTEXT_GROUPS, MOE_GROUP_NAMES,
+                           TRACE_FORMATS)
+from src.analytical import FastModel, CALIBRATION_POINTS, DEFAULT_FAST_MODEL
+from src.sim_cache import SimCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES
+from src.hw_spec import HardwareSpec, DEFAULT_SPEC, dtype_bytes
+from src.placement import Placement, PlacementError, plan_placement, resident_models
+from src.profiler import profiler
+from src.sim_stats import SimStats, StatsParser
+from src.agentx_sim import extension_path, get_simulator, trace_records, work_dir
+import src.gen_trace, src.hw_spec, src.placement, src.model_config
+import shutil
 import subprocess
+import tempfile
+import time
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 
+# Sources the trace layout depends on, hashed into every cache key. They are
+# the imported modules; only the simulator and its YAML come from agentx_dir.
+TRACE_SOURCES = [Path(module.__file__) for module in (src.gen_trace, src.hw_spec, src.placement, src.model_config)]
 
-def run_lpddrpim(
+
+def sim_cache_entry(
+    agentx_path: Path, yaml_file: str, modelsize: str, context_len: int,
+    batch_size: int, maxlen: int, dbyte: float, segment: str = "all",
+    spec: HardwareSpec = DEFAULT_SPEC, base_addr: int = 0, inprocess: bool = False,
+    kv_dbyte: Optional[float] = None, n_query: int = 1
+):
+    # segment "weights" holds the context-independent stage groups only. They
+    # are laid out after the KV-sized score/context stages, so instead of the
+    # context length, KV dtype and number of queries, their key holds the
+    # address that offset ends at (weights_base), which keeps reuse
+    # address-exact. The experts an MoE model activates are sampled over its
+    # batch * n_query tokens (with gen_trace's default seed, whose source is
+    # hashed), so its FFN also depends on n_query.
+    # In-process results depend on the _agentx module instead of the binary.
+    weights_only = segment == "weights"
+    params = {"modelsize": modelsize.upper(),
+              "context_len": None if weights_only else float(context_len),
+              "batch_size": batch_size, "maxlen": maxlen, "dbyte": dbyte,
+              "kv_dbyte": None if weights_only else (dbyte if kv_dbyte is None else kv_dbyte),
+              "n_query": None if weights_only and not is_moe(modelsize) else n_query, "segment": segment,
+              "hw": spec.as_dict(), "base_addr": base_addr}
+    if weights_only:
+        params["weights_base"] = weights_base(modelsize, context_len, batch_size, dbyte, spec,
+                                              base_addr, kv_dbyte, n_query)
+    simulator = extension_path(agentx_path) if inprocess else agentx_path / "AgentX"
+    key = SimCache.make_key(params, [agentx_path / yaml_file, simulator, *TRACE_SOURCES])
+    return params, key
+
+
+def job_config(yaml_path: Path, job_dir: Path, trace_path: Path, trace_format: str,
+               spec: HardwareSpec = DEFAULT_SPEC, recorder: str = "summary") -> dict:
+    """
+    A copy of the AgentX config whose trace and recorder paths point into
+    job_dir, so concurrent simulations never share files. Its DRAM section is
+    generated from spec, the geometry the trace was laid out on, and its
+    AgentXTraceRecorder plugins run in the given mode, writing binary logs
+    unless the mode is off.
+    """
+    with open(yaml_path) as f:
+        config = spec.apply(yaml.safe_load(f))
+
+    config["Frontend"]["path"] = str(trace_path)
+    config["Frontend"]["format"] = TRACE_FORMATS[trace_format]
+    for plugin in config["MemorySystem"]["Controller"].get("plugins") or []:
+        plugin_config = plugin["ControllerPlugin"]
+        if plugin_config.get("impl") == "AgentXTraceRecorder":
+            plugin_config["mode"] = recorder
+            if recorder != "off":
+                plugin_config["format"] = "binary"
+        if "path" in plugin_config:
+            plugin_config["path"] = str(job_dir / plugin_config["path"])
+    return config
+
+
+def write_job_yaml(yaml_path: Path, job_dir: Path, trace_path: Path, trace_format: str,
+                   spec: HardwareSpec = DEFAULT_SPEC, recorder: str = "summary") -> Path:
+    # Writes job_config(...) into job_dir.
+    job_yaml = job_dir / yaml_path.name
+    with open(job_yaml, "w") as f:
+        yaml.safe_dump(job_config(yaml_path, job_dir, trace_path, trace_format, spec, recorder), f, sort_keys=False)
+    return job_yaml
+
+
+class CountingWriter:
+    # Binary file wrapper counting the bytes written through it.
+    def __init__(self, file) -> None:
+        self.file = file
+        self.n_bytes = 0
+
+    def write(self, data: bytes) -> int:
+        self.n_bytes += len(data)
+        return self.file.write(data)
+
+
+def run_simulator(run_cmd: List[str], cwd: Path, feed: Optional[Callable] = None) -> SimStats:
+    """
+    Runs AgentX and parses its stats from stdout while it runs, so the output
+    is never held in memory as a whole.
+
+    With feed, the trace is piped: feed(stdin) writes it to AgentX's stdin
+    (its config's trace path is "-") while AgentX simulates it. An exception
+    in feed stops AgentX and is re-raised; if AgentX exits first, its output
+    is reported.
+    """
+    parser = StatsParser()
+    parse_start, parse_time = time.perf_counter(), 0.0
+
+    def consume(lines):
+        # Feeds the parser, timing only the parsing (not the wait for output).
+        nonlocal parse_time
+        for line in lines:
+            start = time.perf_counter()
+            parser.feed(line)
+            parse_time += time.perf_counter() - start
+
+    if feed is None:
+        with subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, cwd=cwd) as proc:
+            consume(proc.stdout)
+        trace_complete = True
+    else:
+        with subprocess.Popen(run_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, cwd=cwd) as proc:
+            # stdout is drained by a thread, so neither process blocks the other.
+            reader = threading.Thread(target=consume, args=(io.TextIOWrapper(proc.stdout),))
+            reader.start()
+            try:
+                feed(proc.stdin)
+                proc.stdin.close()
+                trace_complete = True
+            except BrokenPipeError:
+                trace_complete = False
+            except BaseException:
+                proc.kill()
+                raise
+            finally:
+                reader.join()
+
+    # A piped trace is parsed on the reader thread, overlapping its generate span.
+    start = time.perf_counter()
+    stats = parser.result()
+    profiler.record("parse", parse_start, parse_time + time.perf_counter() - start, parallel=feed is not None)
+    if proc.returncode != 0 or not trace_complete:
+        reason = f"exit code {proc.returncode}" if proc.returncode != 0 else "it stopped reading the trace"
+        raise RuntimeError(f"Failed to run AgentX ({reason}).\n"
+                           f"Command: {' '.join(run_cmd)}\n"
+                           f"Last lines of output:\n{''.join(stats.tail)}")
+    return stats
+
+
+def partial_layer(modelsize: str, groups: List[str]) -> bool:
+    # A partial layer (e.g. only the attention segment) ends with a barrier so
+    # that its last group is timed like in the full trace, without the drain.
+    return groups != group_names(modelsize)
+
+
+def run_trace(
+    agentx_path: Path, yaml_file: str, modelsize: str, context_len: int,
+    batch_size: int, maxlen: int, dbyte: float, groups: List[str],
+    output: str, trace_format: str, spec: HardwareSpec = DEFAULT_SPEC, base_addr: int = 0,
+    recorder: str = "summary", pipe: bool = False, inprocess: bool = False,
+    kv_dbyte: Optional[float] = None, n_query: int = 1
+) -> SimStats:
+    """
+    Generates the trace of groups and simulates it. With pipe, the trace is
+    never written to disk: it is generated into AgentX's stdin while AgentX
+    simulates it. With inprocess, it is generated into memory and simulated
+    by the _agentx extension module, reusing one memory system per config.
+    """
+    if inprocess:
+        return run_trace_inprocess(agentx_path, yaml_file, modelsize, context_len, batch_size, maxlen, dbyte,
+                                   groups, spec, base_addr, recorder, kv_dbyte, n_query)
+    generate = partial(generate_decode_trace, modelsize, context_len, batch_size, maxlen, dbyte,
+                       trace_format=trace_format, groups=groups,
+                       trailing_barrier=partial_layer(modelsize, groups), spec=spec, base_addr=base_addr,
+                       kv_dbyte=kv_dbyte, n_query=n_query)
+    # Every simulation runs in its own directory (trace, YAML and logs).
+    job_dir = Path(tempfile.mkdtemp(prefix="agentx-job-"))
+    try:
+        trace_path = Path("-") if pipe else job_dir / output
+        feed = None
+        if pipe:
+            def feed(stdin):
+                with profiler.span("generate", format=trace_format, piped=True):
+                    sink = CountingWriter(stdin)
+                    profiler.count("commands", generate(sink=sink))
+                    profiler.count("trace_bytes", sink.n_bytes)
+        else:
+            with profiler.span("generate", format=trace_format):
+                profiler.count("commands", generate(sink=trace_path))
+                profiler.count("trace_bytes", trace_path.stat().st_size)
+        with profiler.span("write_config"):
+            job_yaml = write_job_yaml(agentx_path / yaml_file, job_dir, trace_path, trace_format, spec, recorder)
+
+        run_cmd = [str((agentx_path / "AgentX").resolve()), "-f", str(job_yaml)]
+        with profiler.span("simulator", piped=pipe):
+            stats = run_simulator(run_cmd, job_dir, feed)
+            profiler.count("sim_cycles", stats.cycles or 0)
+            profiler.count("refresh_stall_cycles", max(stats.refresh_stall_cycles, default=0))
+    finally:
+        with profiler.span("cleanup"):
+            shutil.rmtree(job_dir, ignore_errors=True)
+    return stats
+
+
+def run_trace_inprocess(
+    agentx_path: Path, yaml_file: str, modelsize: str, context_len: int,
+    batch_size: int, maxlen: int, dbyte: float, groups: List[str],
+    spec: HardwareSpec = DEFAULT_SPEC, base_addr: int = 0, recorder: str = "summary",
+    kv_dbyte: Optional[float] = None, n_query: int = 1
+) -> SimStats:
+    with profiler.span("generate", format="binary"):
+        records = trace_records(modelsize, context_len, batch_size, maxlen, dbyte, groups=groups,
+                                trailing_barrier=partial_layer(modelsize, groups), spec=spec, base_addr=base_addr,
+                                kv_dbyte=kv_dbyte, n_query=n_query)
+        profiler.count("commands", records.size)
+        profiler.count("trace_bytes", records.nbytes)
+    with profiler.span("write_config"):
+        config = job_config(agentx_path / yaml_file, work_dir(), Path("-"), "binary", spec, recorder)
+    with profiler.span("simulator", inprocess=True):
+        stats = get_simulator(config, str(agentx_path)).run(records)
+        profiler.count("sim_cycles", stats.cycles or 0)
+    return stats
+
+
+def simulate_trace(
+    agentx_path: Path, yaml_file: str, modelsize: str, context_len: int,
+    batch_size: int, maxlen: int, dbyte: float, groups: List[str],
+    output: str, trace_format: str, spec: HardwareSpec = DEFAULT_SPEC, base_addr: int = 0,
+    recorder: str = "summary", pipe: bool = False, inprocess: bool = False,
+    kv_dbyte: Optional[float] = None, n_query: int = 1
+) -> Dict[str, int]:
+    # Per-layer cycles of each of groups.
+    stats = run_trace(agentx_path, yaml_file, modelsize, context_len, batch_size, maxlen, dbyte, groups,
+                      output, trace_format, spec, base_addr, recorder, pipe, inprocess, kv_dbyte, n_query)
+    return stats.stage_breakdown(groups, partial_layer(modelsize, groups))
+
+
+def run_lpddrpim_stats(
     modelsize: str, context_len: int, batch_size: int = 1,
-    maxlen: int = 32768, dbyte: int = 2, output: str = "AgentX-NDP.trace",
-    agentx_dir: str = ".", yaml_file: str = "AgentX.yaml"
-) -> int:
-    
+    maxlen: int = 32768, dbyte: float = 2, kv_dbyte: Optional[float] = None, n_query: int = 1,
+    output: str = "AgentX-NDP.trace",
+    agentx_dir: str = ".", yaml_file: str = "AgentX.yaml",
+    trace_format: str = "loop", spec: HardwareSpec = DEFAULT_SPEC,
+    placement: Optional[Placement] = None, recorder: str = "summary", pipe: bool = False,
+    inprocess: bool = False
+) -> SimStats:
+    """
+    Simulates one decoder layer (uncached) and returns all of its stats:
+    cycles, per-channel and per-bank command counts, refresh stalls, ...
+    """
     agentx_path = Path(agentx_dir)
-    gen_trace_py = agentx_path / "src" / "gen_trace.py"
-    if not gen_trace_py.exists():
-        raise FileNotFoundError(f"Cannot find {gen_trace_py}. Please check your AgentX directory structure.")
-
-    gen_trace_cmd = ["python", str(gen_trace_py),
-                     "-modelsize", modelsize,
-                     "-len", str(context_len),
-                     "-batch", str(batch_size),
-                     "-maxl", str(maxlen),
-                     "-db", str(dbyte),
-                     "-o", output]
+    base_addr = placement.base_addr(modelsize, context_len) if placement is not None else 0
+    return run_trace(agentx_path, yaml_file, modelsize, context_len, batch_size, maxlen, dbyte, group_names(modelsize),
+                     output, trace_format, spec, base_addr, recorder, pipe, inprocess, kv_dbyte, n_query)
 
-    try:
-        subprocess.run(gen_trace_cmd, stdout=subprocess.PIPE,
-                       stderr=subprocess.STDOUT,text=True,
-                       check=True,cwd=agentx_path)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to run gen_trace.py.\n"
-                           f"Command: {' '.join(gen_trace_cmd)}\n"
-                           f"Output:\n{e.stdout}")
 
+def run_lpddrpim_stages(
+    modelsize: str, context_len: int, batch_size: int = 1,
+    maxlen: int = 32768, dbyte: float = 2, kv_dbyte: Optional[float] = None, n_query: int = 1,
+    output: str = "AgentX-NDP.trace",
+    agentx_dir: str = ".", yaml_file: str = "AgentX.yaml",
+    trace_format: str = "loop", cache: Optional[SimCache] = None,
+    reuse_stages: bool = True, spec: HardwareSpec = DEFAULT_SPEC,
+    placement: Optional[Placement] = None, recorder: str = "summary", pipe: bool = False,
+    inprocess: bool = False
+) -> Dict[str, int]:
+    """
+    Per-layer decode cycles of each barrier-separated stage group (group_names),
+    with dbyte-wide weights and a kv_dbyte-wide KV cache (default dbyte), of
+    a decode step or, with n_query > 1, of a multi-token (verify) pass.
+    With a placement, the layer is simulated in the model's region of it.
+    recorder is the AgentXTraceRecorder mode (off, summary, sampled or full);
+    its logs are removed with the job directory, and it does not change cycles.
+    With pipe, the trace is generated into AgentX's stdin instead of a file;
+    with inprocess, it is simulated in this process by the _agentx module.
+
+    With a cache, the context-independent groups (QKV, O-proj, FFN) are stored
+    per model, batch, dtype and the address they are laid out at; a new context
+    length for a known model whose KV stages take the same space (the same
+    weights_base) then only simulates the score/context segment.
+    """
+    agentx_path = Path(agentx_dir)
     agentx_bin = agentx_path / "AgentX"
-    if not agentx_bin.exists():
+    if not inprocess and not agentx_bin.exists():
         raise FileNotFoundError(f"Cannot find AgentX binary at {agentx_bin}. Please build AgentX first.")
+    base_addr = placement.base_addr(modelsize, context_len) if placement is not None else 0
 
-    run_cmd = ["./AgentX", "-f", yaml_file]
+    simulate = partial(simulate_trace, agentx_path, yaml_file, modelsize, context_len,
+                       batch_size, maxlen, dbyte, output=output, trace_format=trace_format, spec=spec,
+                       base_addr=base_addr, recorder=recorder, pipe=pipe, inprocess=inprocess,
+                       kv_dbyte=kv_dbyte, n_query=n_query)
+    if cache is None:
+        with profiler.span("simulate", groups="all"):
+            return simulate(groups=group_names(modelsize))
 
-    try:
-        run_res = subprocess.run(run_cmd, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT, text=True,
-                                 check=True, cwd=agentx_path)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to run AgentX.\n"
-                           f"Command: {' '.join(run_cmd)}\n"
-                           f"Output:\n{e.stdout}")
+    params, key = sim_cache_entry(agentx_path, yaml_file, modelsize, context_len,
+                                  batch_size, maxlen, dbyte, spec=spec, base_addr=base_addr,
+                                  inprocess=inprocess, kv_dbyte=kv_dbyte, n_query=n_query)
+    stages = cache.get(key)
+    if stages is not None:
+        profiler.count("cache_hits")
+        return stages
 
-    cycles = None
-    for line in run_res.stdout.splitlines():
-        if "memory_system_cycles" in line:
-            parts = line.split()
-            try:
-                cycles = int(parts[-1])
-            except (ValueError, IndexError):
-                pass
+    weight_params, weight_key = sim_cache_entry(agentx_path, yaml_file, modelsize, context_len,
+                                                batch_size, maxlen, dbyte, segment="weights", spec=spec,
+                                                base_addr=base_addr, inprocess=inprocess, kv_dbyte=kv_dbyte,
+                                                n_query=n_query)
+    weight_stages = cache.get(weight_key) if reuse_stages else None
+    if weight_stages is not None:
+        with profiler.span("simulate", groups="context"):
+            stages = {**weight_stages, **simulate(groups=CONTEXT_GROUPS)}
+        stages = {group: stages[group] for group in group_names(modelsize)}
+    else:
+        with profiler.span("simulate", groups="all"):
+            stages = simulate(groups=group_names(modelsize))
+        cache.put(weight_key, weight_params,
+                  {group: c for group, c in stages.items() if group not in CONTEXT_GROUPS})
 
-    if cycles is None:
-        raise RuntimeError("Cannot find 'memory_system_cycles' in AgentX output.\n"f"Full output:\n{run_res.stdout}")
+    cache.put(key, params, stages)
+    return stages
 
-    rm_trace_cmd = f"rm {output}"
+
+def run_lpddrpim(
+    modelsize: str, context_len: int, batch_size: int = 1,
+    maxlen: int = 32768, dbyte: float = 2, kv_dbyte: Optional[float] = None, n_query: int = 1,
+    output: str = "AgentX-NDP.trace",
+    agentx_dir: str = ".", yaml_file: str = "AgentX.yaml",
+    trace_format: str = "loop", cache: Optional[SimCache] = None,
+    spec: HardwareSpec = DEFAULT_SPEC, placement: Optional[Placement] = None,
+    recorder: str = "summary", pipe: bool = False, inprocess: bool = False
+) -> int:
     
+    return sum(run_lpddrpim_stages(modelsize, context_len, batch_size, maxlen, dbyte, kv_dbyte, n_query, output,
+                                   agentx_dir, yaml_file, trace_format, cache, spec=spec,
+                                   placement=placement, recorder=recorder, pipe=pipe,
+                                   inprocess=inprocess).values())
+
+
+def collect_sim_points(datasets: List[str], batch_size: int, maxlen: int, dtype: float,
+                       decode_samples: int = 1, kv_dtype: Optional[float] = None,
+                       config: AgentConfigStore = default_agent_config) -> List[tuple]:
+    # Records the run_lpddrpim calls the AgentX evaluation of datasets would make.
+    points = []
+    def record(*point):
+        points.append(point)
+        return 0
+    role_AgentX_time(datasets, batch_size, maxlen, dtype, record, config, decode_samples=decode_samples,
+                     kv_dbyte=kv_dtype)
+    return points
+
+
+def parse_speculative(value: str) -> tuple:
+    # ROLE=DRAFT:K:ACCEPT, e.g. planner=8B:4:0.7, as (role, draft size, draft length, acceptance rate).
     try:
-        os.system(rm_trace_cmd)
-    except Exception as e:
-        print(f"Error: {e}")
-    
-    rm_log_cmd = f"rm -rf log"
-    
+        role, _, rest = value.partition("=")
+        draft, draft_len, accept = rest.split(":")
+        return role, int(draft.upper().rstrip("B")), int(draft_len), float(accept)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ROLE=DRAFT:K:ACCEPT (e.g. planner=8B:4:0.7), got {value}")
+
+
+def parse_role_model(value: str) -> tuple:
+    # ROLE=MODEL, e.g. tool_l=30B-A3B, as (role, model).
+    role, sep, model = value.partition("=")
+    if not sep or not role or not model:
+        raise argparse.ArgumentTypeError(f"expected ROLE=MODEL (e.g. tool_l=30B-A3B), got {value}")
+    return role, model
+
+
+def simulate_point(point: tuple, cache_dir: Optional[str], cache_max_entries: int, run_kwargs: dict,
+                   profile: bool = False):
+    # Process pool entry: every job opens its own connection to the shared cache.
+    # Its profile spans are returned to be grafted into the parent's profile.
+    cache = SimCache(cache_dir, cache_max_entries) if cache_dir is not None else None
+    profiler.enabled = profile
     try:
-        os.system(rm_log_cmd)
-    except Exception as e:
-        print(f"Error: {e}")
-    
-    return cycles
+        with profiler.detached() as root:
+            stages = profile_point(point, cache, run_kwargs)
+    finally:
+        if cache is not None:
+            cache.close()
+    return stages, cache.stats if cache is not None else None, root.children
+
+
+def profile_point(point: tuple, cache: Optional[SimCache], run_kwargs: dict) -> Dict[str, int]:
+    with profiler.span("point", modelsize=point[0], context_len=point[1]):
+        return run_lpddrpim_stages(*point, cache=cache, **run_kwargs)
+
+
+def simulate_points(points, jobs: int, cache: Optional[SimCache], **run_kwargs) -> Dict[tuple, Dict[str, int]]:
+    """
+    Simulates every unique point (run_lpddrpim positional arguments) on a pool
+    of jobs processes and returns {point: per-stage cycles}. One point per
+    model/batch/dtype runs first, so that with a cache the remaining context
+    lengths only simulate the attention segment.
+    """
+    first, rest, seen = [], [], set()
+    for point in dict.fromkeys(points):
+        model_key = (point[0].upper(),) + tuple(point[2:])
+        (rest if model_key in seen else first).append(point)
+        seen.add(model_key)
+
+    results = {}
+    for wave in (first, rest):
+        if jobs > 1 and len(wave) > 1:
+            cache_dir = str(cache.cache_dir) if cache is not None else None
+            cache_max_entries = cache.max_entries if cache is not None else 0
+            run = partial(simulate_point, cache_dir=cache_dir, cache_max_entries=cache_max_entries,
+                          run_kwargs=run_kwargs, profile=profiler.enabled)
+            with ProcessPoolExecutor(max_workers=min(jobs, len(wave))) as executor:
+                for point, (stages, stats, spans) in zip(wave, executor.map(run, wave)):
+                    results[point] = stages
+                    profiler.graft(spans)
+                    if stats is not None:
+                        cache.stats += stats
+        else:
+            for point in wave:
+                results[point] = profile_point(point, cache, run_kwargs)
+    return results
+
+
+def format_table(rows: List[dict]) -> str:
+    # Right-aligned plain-text table of dict rows sharing the same keys.
+    def cell(value) -> str:
+        return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+    columns = list(rows[0])
+    cells = [[cell(row[col]) for col in columns] for row in rows]
+    widths = [max(len(col), *(len(line[i]) for line in cells)) for i, col in enumerate(columns)]
+    lines = [columns] + cells
+    return "\n".join("  ".join(text.rjust(width) for text, width in zip(line, widths)) for line in lines)
+
+
+def print_stage_breakdown(stages: Dict[tuple, Dict[str, int]]) -> None:
+    # Dense layers have no router group; it is shown as 0 next to MoE layers.
+    names = [group for group in MOE_GROUP_NAMES if any(group in point_stages for point_stages in stages.values())]
+    rows = [{"model": point[0], "context_len": point[1], **{group: point_stages.get(group, 0) for group in names},
+             "total": sum(point_stages.values())}
+            for point, point_stages in sorted(stages.items(), key=lambda item: (item[0][0], item[0][1]))]
+    print("Per-layer decode cycles by stage:")
+    print(format_table(rows))
+
+
+def write_latency_table(rows: List[dict], path: str) -> None:
+    # .json writes a list of row objects, anything else CSV.
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def calibrate_fast_model(args, cache: Optional[SimCache], spec: HardwareSpec = DEFAULT_SPEC) -> None:
+    points = [(size, context_len, args.batchsize, args.maxlen, args.dtype, args.kv_dtype)
+              for size, context_len in CALIBRATION_POINTS]
+    stages = simulate_points(points, args.jobs, cache, trace_format=args.trace_format, spec=spec,
+                             agentx_dir=args.agentx_dir, recorder=args.recorder, pipe=args.pipe,
+                             inprocess=args.inprocess)
+    sim_cycles = [sum(stages[p].values()) for p in points]
+    fast_model = FastModel.fit(points, sim_cycles, spec)
+    fast_model.save(args.fast_model)
+
+    rows = [{"model": p[0], "context": p[1], "AgentX cycles": sim, "fast cycles": fast_model.cycles(*p, spec=spec),
+             "error (%)": 100 * (fast_model.cycles(*p, spec=spec) - sim) / sim}
+            for p, sim in zip(points, sim_cycles)]
+    print(format_table(rows))
+    print(f"t_cmd={fast_model.t_cmd:.3f} t_row={fast_model.t_row:.3f} t_const={fast_model.t_const:.1f}")
+    print(f"Mean |error| {100 * fast_model.error['mean_abs_rel_err']:.2f}%, "
+          f"max |error| {100 * fast_model.error['max_abs_rel_err']:.2f}%. Saved to {args.fast_model}")
 
 
 def main():
@@ -99,7 +506,7 @@ def main():
     parser.add_argument("--dataset",
                         type=str,
                         default='BBH',
-                        help="dataset name. default=BBH")
+                        help="dataset name, or 'all' for every dataset. default=BBH")
     parser.add_argument("--batchsize",
                         type=int,
                         default=1,
@@ -117,24 +524,209 @@ def main():
                         default='H100 and AgentX',
                         help="device type. H100 or AgentX")
     parser.add_argument("--dtype",
-                        type=int,
+                        type=dtype_bytes,
                         default=2,
-                        help="data type (B). default=2")
+                        help="weight data type, in bytes or fp16, bf16, fp8, int8, int4 (also the KV cache's "
+                             "unless --kv_dtype is given). default=2")
+    parser.add_argument("--kv_dtype",
+                        type=dtype_bytes,
+                        default=None,
+                        help="KV cache data type, like --dtype. default=--dtype")
+    parser.add_argument("--trace_format",
+                        type=str,
+                        default="loop",
+                        choices=list(TRACE_FORMATS),
+                        help="trace file format handed to AgentX. default=loop")
+    parser.add_argument("--recorder",
+                        type=str,
+                        default="summary",
+                        choices=["off", "summary", "sampled", "full"],
+                        help="AgentXTraceRecorder mode of the simulations (their logs are removed with the job "
+                             "directory). default=summary")
+    parser.add_argument("--pipe",
+                        action="store_true",
+                        help="generate each trace into the simulator's stdin while it runs, instead of writing "
+                             "it to disk first")
+    parser.add_argument("--inprocess",
+                        action="store_true",
+                        help="simulate in this process with the _agentx extension module (built with "
+                             "cmake -DAgentX_PYTHON=ON) instead of running the AgentX binary")
+    parser.add_argument("--hw",
+                        type=str,
+                        default=None,
+                        help="hardware spec file (YAML/JSON) of the AgentX-NDP device; default is the 6x8-channel "
+                             "32Gb LPDDR 6400 MT/s configuration of AgentX.yaml")
+    parser.add_argument("--resident",
+                        action="store_true",
+                        help="keep the models of all roles resident together: plan their regions (KV caches "
+                             "reserved for --maxlen tokens) and simulate every model in its own region")
+    parser.add_argument("--agentx_dir",
+                        type=str,
+                        default=".",
+                        help="directory of the AgentX binary and AgentX.yaml")
+    parser.add_argument("--latency_dir",
+                        type=str,
+                        default="./src",
+                        help="directory of the H100 latency tables (model_size<N>B.csv)")
+    parser.add_argument("--cache_dir",
+                        type=str,
+                        default=DEFAULT_CACHE_DIR,
+                        help="directory of the simulation result cache")
+    parser.add_argument("--cache_max_entries",
+                        type=int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help="maximum number of cached simulation results")
+    parser.add_argument("--no_cache",
+                        action="store_true",
+                        help="always rerun the simulator")
+    parser.add_argument("--fast",
+                        action="store_true",
+                        help="estimate AgentX cycles with the calibrated analytical model instead of simulating")
+    parser.add_argument("--calibrate",
+                        action="store_true",
+                        help="fit the analytical model against AgentX simulations and save it")
+    parser.add_argument("--fast_model",
+                        type=str,
+                        default=DEFAULT_FAST_MODEL,
+                        help="analytical model parameter file")
+    parser.add_argument("--decode_samples",
+                        type=int,
+                        default=1,
+                        help="context lengths simulated per role across the decode and interpolated; "
+                             "1 assumes every step sees the prefill context")
+    parser.add_argument("--model",
+                        type=parse_role_model,
+                        action="append",
+                        default=None,
+                        metavar="ROLE=MODEL",
+                        help="run ROLE on MODEL, any model of model_config (e.g. tool_l=30B-A3B for an MoE model) "
+                             "in every dataset; its H100 table is model_size<MODEL>.csv. Repeatable")
+    parser.add_argument("--speculative",
+                        type=parse_speculative,
+                        action="append",
+                        default=None,
+                        metavar="ROLE=DRAFT:K:ACCEPT",
+                        help="decode ROLE speculatively: the DRAFT model (e.g. 8B) drafts K tokens per round, the "
+                             "role's model verifies them in one pass and accepts each with probability ACCEPT; "
+                             "reports tokens/s and the latency change against plain decoding. Repeatable")
+    parser.add_argument("--breakdown",
+                        action="store_true",
+                        help="print the simulated per-stage cycle breakdown of every point")
+    parser.add_argument("--latency_interp",
+                        type=str,
+                        default="linear",
+                        choices=LATENCY_INTERP,
+                        help="interpolation of the H100 latency tables between measured context lengths. default=linear")
+    parser.add_argument("--output",
+                        type=str,
+                        default=None,
+                        help="write the per-role latency table of every dataset to this .csv or .json file")
+    parser.add_argument("--profile",
+                        type=str,
+                        nargs="?",
+                        const="profile.json",
+                        default=None,
+                        help="time the evaluation phases (trace generation, simulation, parsing, H100 lookups, ...) "
+                             "and write a JSON report to this path (default profile.json) plus a summary")
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=1,
+                        help="number of simulations run in parallel")
 
     args = parser.parse_args()
-    dataset = args.dataset
     batch_size = args.batchsize
     maxlen = args.maxlen
     dtype = args.dtype
+    kv_dtype = args.kv_dtype
+    latency_tables.interp = args.latency_interp
+    latency_tables.directory = Path(args.latency_dir)
+    if args.profile is not None:
+        profiler.enable()
+    spec = HardwareSpec.load(args.hw) if args.hw else DEFAULT_SPEC
+    cache = None if args.no_cache or args.fast else SimCache(args.cache_dir, args.cache_max_entries)
+    if args.calibrate:
+        calibrate_fast_model(args, cache, spec)
+        return
     if args.device == "H100 and AgentX":
-        H100_time = get_prefill_time(dataset, "H100") + \
-                    get_pcle_time(dataset, "H100") + \
-                    get_decode_time(dataset, "H100")
-        print("Total latency on H100 for", dataset, ":", H100_time, "s")
-        AgentX_time = get_prefill_time(dataset, "AgentX") + \
-                      get_AgentX_time(dataset, "AgentX", batch_size, maxlen, dtype, run_lpddrpim)
-        print("Total latency on AgentX for", dataset, ":", AgentX_time, "s")
-        print("Speedup (H100 / AgentX):", H100_time / AgentX_time)
+        datasets = default_agent_config.datasets if args.dataset == "all" else [args.dataset]
+        # With --speculative, plain decoding (of the --model roles) is the baseline.
+        base_config = default_agent_config
+        try:
+            for role, model in args.model or []:
+                base_config = base_config.with_model(role, model)
+            config = base_config
+            for role, draft, draft_len, accept in args.speculative or []:
+                config = config.speculative(role, draft, draft_len, accept)
+        except ValueError as e:
+            print(e)
+            exit(1)
+        configs = [config, base_config] if args.speculative else [config]
+        placement = None
+        if args.resident:
+            try:
+                placement = plan_placement(resident_models(config, datasets), maxlen, dtype, spec, kv_dtype)
+            except PlacementError as e:
+                print(e)
+                exit(1)
+            print(format_table(placement.rows()))
+        if args.fast:
+            fast_model = FastModel.load(args.fast_model)
+            if not fast_model.calibrated:
+                print(f"Warning: {args.fast_model} not found, using uncalibrated AgentX_6400 defaults "
+                      f"(run main.py --calibrate first).")
+            run_fn = partial(fast_model.cycles, spec=spec)
+        else:
+            with profiler.span("collect_points"):
+                points = [point for c in configs
+                          for point in collect_sim_points(datasets, batch_size, maxlen, dtype, args.decode_samples,
+                                                          kv_dtype, c)]
+            with profiler.span("simulate_points", jobs=args.jobs):
+                stages = simulate_points(points, args.jobs, cache, trace_format=args.trace_format, spec=spec,
+                                         placement=placement, agentx_dir=args.agentx_dir,
+                                         recorder=args.recorder, pipe=args.pipe,
+                                         inprocess=args.inprocess)
+            run_fn = lambda *point: sum(stages[point].values())
+            if args.breakdown:
+                print_stage_breakdown(stages)
+
+        with profiler.span("evaluate", datasets=datasets):
+            latency, *baseline = [evaluate_latency(datasets, batch_size, maxlen, dtype, run_fn, c,
+                                                   decode_samples=args.decode_samples, spec=spec, kv_dbyte=kv_dtype)
+                                  for c in configs]
+        H100_time, AgentX_time = latency.h100.sum(axis=0), latency.agentx.sum(axis=0)
+        rows = [{"dataset": dataset, "H100 (s)": float(H100_time[j]),
+                 "AgentX (s)": float(AgentX_time[j]), "speedup": float(H100_time[j] / AgentX_time[j])}
+                for j, dataset in enumerate(datasets)]
+        if baseline:
+            # Decode throughput and end-to-end latency change against plain decoding.
+            base_H100, base_AgentX = baseline[0].h100.sum(axis=0), baseline[0].agentx.sum(axis=0)
+            tps = {device: (latency.tokens_per_s(device), baseline[0].tokens_per_s(device))
+                   for device in ("h100", "agentx")}
+            for j, row in enumerate(rows):
+                row.update({"H100 tok/s": float(tps["h100"][0][j]), "H100 base tok/s": float(tps["h100"][1][j]),
+                            "H100 change (%)": float(100 * (H100_time[j] / base_H100[j] - 1)),
+                            "AgentX tok/s": float(tps["agentx"][0][j]),
+                            "AgentX base tok/s": float(tps["agentx"][1][j]),
+                            "AgentX change (%)": float(100 * (AgentX_time[j] / base_AgentX[j] - 1))})
+
+        if len(rows) == 1 and not baseline:
+            row = rows[0]
+            print("Total latency on H100 for", row["dataset"], ":", row["H100 (s)"], "s")
+            print("Total latency on AgentX for", row["dataset"], ":", row["AgentX (s)"], "s")
+            print("Speedup (H100 / AgentX):", row["speedup"])
+        else:
+            print(format_table(rows))
+        if args.output is not None:
+            write_latency_table(latency.rows(), args.output)
+            print("Per-role latency table written to", args.output)
+        if cache is not None:
+            print("Simulation cache:", cache.stats)
+        if args.profile is not None:
+            report = profiler.report()
+            profiler.write(args.profile)
+            print(format_table(report["summary"]))
+            print(f"Wall time {report['wall_time']:.3f} s, peak RSS {report['peak_rss']['self'] / 2 ** 20:.1f} MB "
+                  f"(simulator {report['peak_rss']['children'] / 2 ** 20:.1f} MB). Profile written to {args.profile}")
     else:
         raise ValueError(f"Unknown device type: {args.device}")
 
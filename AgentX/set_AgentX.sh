@@ -27,6 +27,8 @@ cp -f ../src/no_refresh.cpp                                    src/dram_controll
 cp -f ../src/NDP_scheduler.cpp                                 src/dram_controller/impl/scheduler/
 cp -f ../src/NDP_loadstore_trace.cpp                           src/frontend/impl/memory_trace/
 cp -f ../src/AgentX_NDP_system.cpp                             src/memory_system/impl/
+mkdir -p src/python
+cp -f ../src/AgentX_python.cpp                                 src/python/
 
 echo "All *cpp *h templates applied."
 
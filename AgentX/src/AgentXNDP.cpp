@@ -155,6 +155,12 @@ class AgentXNDP : public IDRAM, public Implementation {
 
 
   public:
+    ~AgentXNDP() {
+      for (auto channel : m_channels) {
+        delete_node(channel);
+      }
+    };
+
     void tick() override {
       m_clk++;
     };
@@ -712,6 +718,13 @@ class AgentXNDP : public IDRAM, public Implementation {
         m_channels.push_back(channel);
       }
     };
+
+    static void delete_node(Node* node) {
+      for (auto child : node->m_child_nodes) {
+        delete_node(child);
+      }
+      delete node;
+    };
 };
 
 
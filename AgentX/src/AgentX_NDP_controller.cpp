@@ -15,6 +15,10 @@ class AgentXNDPController final : public IDRAMController, public Implementation
     ReqBuffer m_write_buffer;         // Host write buffer
 
     int m_row_addr_idx = -1;
+    int m_rank_addr_idx = -1;
+    int m_bankgroup_addr_idx = -1;
+    int m_bank_addr_idx = -1;
+    std::vector<bool> m_cmd_all_bank;  // Whether a command covers every bank of its rank
 
     float m_wr_low_watermark;
     float m_wr_high_watermark;
@@ -47,7 +51,19 @@ class AgentXNDPController final : public IDRAMController, public Implementation
     void setup(IFrontEnd* frontend, IMemorySystem* memory_system) override {
       m_dram = memory_system->get_ifce<IDRAM>();
       m_row_addr_idx = m_dram->m_levels("row");
+      m_rank_addr_idx = m_dram->m_levels("rank");
+      m_bankgroup_addr_idx = m_dram->m_levels("bankgroup");
+      m_bank_addr_idx = m_dram->m_levels("bank");
       m_priority_buffer.max_size = 512*3 + 32;
+
+      m_cmd_counts.assign(m_dram->m_commands.size(), 0);
+      for (int cmd = 0; cmd < int(m_dram->m_commands.size()); cmd++) {
+        std::string name(m_dram->m_commands(cmd));
+        bool is_all_bank_pim = name.size() > 2 && name.compare(name.size() - 2, 2, "AB") == 0;
+        m_cmd_all_bank.push_back(m_dram->m_command_scopes[cmd] <= m_rank_addr_idx || is_all_bank_pim);
+      }
+      m_bank_cmd_counts.assign(m_dram->get_level_size("rank") * m_dram->get_level_size("bankgroup") *
+                               m_dram->get_level_size("bank"), 0);
     };
 
     bool send(Request& req) override {
@@ -113,10 +129,17 @@ class AgentXNDPController final : public IDRAMController, public Implementation
         plugin->update(request_found, req_it);
       }
 
+      // A refresh waiting in the priority buffer blocks everything else
+      if (!request_found && m_priority_buffer.size() != 0 &&
+          (m_active_buffer.size() || m_pim_buffer.size() || m_read_buffer.size() || m_write_buffer.size())) {
+        m_refresh_stall_clks++;
+      }
+
       // 4. Finally, issue the commands to serve the request
       if (request_found) {
         // If we find a real request to serve
         m_dram->issue_command(req_it->command, req_it->addr_vec);
+        count_command(req_it->command, req_it->addr_vec);
 
         // If we are issuing the last command, set depart clock cycle and move the request to the pending queue
         if (req_it->command == req_it->final_command) {
@@ -146,6 +169,33 @@ class AgentXNDPController final : public IDRAMController, public Implementation
     };
 
   private:
+    /**
+     * @brief    Counts an issued command for its type and for every bank it covers
+     * @details
+     * All-bank commands (rank scope, ACTAB/MACAB/WRAB) and address levels left at -1 count on every bank.
+     */
+    void count_command(int command, const AddrVec_t& addr_vec) {
+      m_cmd_counts[command]++;
+
+      int num_ranks = m_dram->get_level_size("rank");
+      int num_bankgroups = m_dram->get_level_size("bankgroup");
+      int num_banks = m_dram->get_level_size("bank");
+      bool all_bank = m_cmd_all_bank[command];
+      auto range = [](int addr, int size, bool all) {
+        return (all || addr < 0) ? std::make_pair(0, size) : std::make_pair(addr, addr + 1);
+      };
+      auto [rank_lo, rank_hi] = range(addr_vec[m_rank_addr_idx], num_ranks, false);
+      auto [bg_lo, bg_hi] = range(addr_vec[m_bankgroup_addr_idx], num_bankgroups, all_bank);
+      auto [bank_lo, bank_hi] = range(addr_vec[m_bank_addr_idx], num_banks, all_bank);
+      for (int rank = rank_lo; rank < rank_hi; rank++) {
+        for (int bg = bg_lo; bg < bg_hi; bg++) {
+          for (int bank = bank_lo; bank < bank_hi; bank++) {
+            m_bank_cmd_counts[(rank * num_bankgroups + bg) * num_banks + bank]++;
+          }
+        }
+      }
+    };
+
     /**
      * @brief    Helper function to serve the completed read requests
      * @details
@@ -224,6 +274,10 @@ class AgentXNDPController final : public IDRAMController, public Implementation
         // 2.2.2    If no request to be scheduled in the priority buffer, check the pim buffer for PIM operations.
         if (!request_found) {
           auto& buffer = m_pim_buffer;
+          // A barrier at the head of the buffer is retired by the scheduler in this call.
+          if (buffer.size() != 0 && buffer.begin()->type_id == Request::Type::PIM_BARRIER) {
+            m_barrier_clks.push_back(m_clk);
+          }
           if (req_it = m_scheduler->get_best_request(buffer); req_it != buffer.end()) {
             request_found = m_dram->check_ready(req_it->command, req_it->addr_vec);
             req_buffer = &buffer;
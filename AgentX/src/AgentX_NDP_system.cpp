@@ -1,3 +1,5 @@
+#include <algorithm>
+
 #include "memory_system/memory_system.h"
 #include "translation/translation.h"
 #include "dram_controller/controller.h"
@@ -21,8 +23,25 @@ class AgentXNDPSystem final : public IMemorySystem, public Implementation {
     int s_num_pim_mac_requests = 0;
     int s_num_pim_write_requests = 0;
     int s_num_other_requests = 0;
+    // Cycle at which the n-th PIM_BARRIER has retired on every channel
+    std::vector<Clk_t> s_barrier_cycles;
+    // Per-channel counts collected from the controllers at the end of the simulation
+    std::vector<std::vector<Clk_t>> s_cmd_counts;   // [command][channel]
+    std::vector<Clk_t> s_bank_cmd_counts;           // [channel][rank][bankgroup][bank]
+    std::vector<Clk_t> s_refresh_stall_cycles;      // [channel]
 
   public:
+    /**
+     * @brief    Frees the components below the system (gathered by the factory,
+     *           each once). Ramulator never deletes a memory system; the _agentx
+     *           module deletes its AgentX-NDP system on every reset.
+     */
+    ~AgentXNDPSystem() {
+      for (auto component : m_components) {
+        delete component;
+      }
+    };
+
     void init() override { 
       // Create device (a top-level node wrapping all channel nodes)
       m_dram = create_child_ifce<IDRAM>();
@@ -46,6 +65,14 @@ class AgentXNDPSystem final : public IMemorySystem, public Implementation {
       register_stat(s_num_pim_mac_requests).name("total_num_pim_mac_requests");
       register_stat(s_num_pim_write_requests).name("total_num_pim_write_requests");
       register_stat(s_num_other_requests).name("total_num_other_requests");
+      register_stat(s_barrier_cycles).name("barrier_cycles");
+
+      s_cmd_counts.resize(m_dram->m_commands.size());
+      for (size_t cmd = 0; cmd < s_cmd_counts.size(); cmd++) {
+        register_stat(s_cmd_counts[cmd]).name(fmt::format("num_{}_commands", m_dram->m_commands(cmd)));
+      }
+      register_stat(s_bank_cmd_counts).name("bank_command_counts");
+      register_stat(s_refresh_stall_cycles).name("refresh_stall_cycles");
     };
 
     void setup(IFrontEnd* frontend, IMemorySystem* memory_system) override { }
@@ -92,6 +119,24 @@ class AgentXNDPSystem final : public IMemorySystem, public Implementation {
       for (auto controller : m_controllers) {
         controller->tick();
       }
+      update_barrier_cycles();
+    };
+
+    void finalize() override {
+      for (size_t cmd = 0; cmd < s_cmd_counts.size(); cmd++) {
+        s_cmd_counts[cmd].clear();
+        for (auto controller : m_controllers) {
+          s_cmd_counts[cmd].push_back(controller->m_cmd_counts[cmd]);
+        }
+      }
+      s_bank_cmd_counts.clear();
+      s_refresh_stall_cycles.clear();
+      for (auto controller : m_controllers) {
+        s_bank_cmd_counts.insert(s_bank_cmd_counts.end(), controller->m_bank_cmd_counts.begin(),
+                                 controller->m_bank_cmd_counts.end());
+        s_refresh_stall_cycles.push_back(controller->m_refresh_stall_clks);
+      }
+      IMemorySystem::finalize();
     };
 
     float get_tCK() override {
@@ -102,6 +147,22 @@ class AgentXNDPSystem final : public IMemorySystem, public Implementation {
     //   return m_dram->m_requests;
     // };
 
+    /**
+     * @brief    Records the cycle at which the next barrier has retired on all channels.
+     * 
+     */
+    void update_barrier_cycles() {
+      size_t n_done = s_barrier_cycles.size();
+      Clk_t latest = 0;
+      for (auto controller : m_controllers) {
+        if (controller->m_barrier_clks.size() <= n_done) {
+          return;
+        }
+        latest = std::max(latest, controller->m_barrier_clks[n_done]);
+      }
+      s_barrier_cycles.push_back(latest);
+    };
+
     bool is_pending() override {
       bool is_pending = false;
       for (auto controller : m_controllers) {
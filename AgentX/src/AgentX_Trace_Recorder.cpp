@@ -2,6 +2,8 @@
 #include <unordered_map>
 #include <limits>
 #include <filesystem>
+#include <fstream>
+#include <cstring>
 
 #include <spdlog/spdlog.h>
 #include <spdlog/sinks/stdout_color_sinks.h>
@@ -13,18 +15,79 @@
 
 namespace Ramulator {
 
+/**
+ * Records the commands issued by its channel's controller to "<path>.ch<N>".
+ *
+ * mode:
+ *   off      records nothing.
+ *   summary  counts the commands and writes the counts once, at the end.
+ *   sampled  records every sample_every-th command issued in [window_start, window_end).
+ *   full     records every command.
+ *
+ * Records are written through a buffer of buffer_size bytes. With format: binary
+ * (main.py's jobs use it) the log is
+ *   header  | magic "AGXCMD01" | #levels (uint8) | #commands (uint8) | NUL-terminated command names
+ *   records | clk (uint64) | command (uint8) | addr_vec (int32 per level), little endian
+ * and with format: text (the default) every record is one "clk, command, addr_vec" line.
+ */
 class AgentXTraceRecorder : public IControllerPlugin, public Implementation {
-  RAMULATOR_REGISTER_IMPLEMENTATION(IControllerPlugin, AgentXTraceRecorder, "AgentXTraceRecorder", "CounterBasedTRR.")
+  RAMULATOR_REGISTER_IMPLEMENTATION(IControllerPlugin, AgentXTraceRecorder, "AgentXTraceRecorder", "Records the issued commands.")
   private:
+    enum class Mode { Off, Summary, Sampled, Full };
+
+    static constexpr char BINARY_MAGIC[] = "AGXCMD01";
+
     IDRAM* m_dram;
 
-    std::filesystem::path m_trace_path; 
-    Logger_t m_tracer;
+    std::filesystem::path m_trace_path;
+    Mode m_mode = Mode::Full;
+    bool m_binary = true;
+
+    uint64_t m_sample_every = 1;
+    Clk_t m_window_start = 0;
+    Clk_t m_window_end = std::numeric_limits<Clk_t>::max();
+
+    std::ofstream m_log;
+    std::vector<char> m_buffer;
+    size_t m_buffer_size = 0;
+
+    std::vector<uint64_t> m_cmd_counts;
+    uint64_t m_num_sampled = 0;
 
     Clk_t m_clk = 0;
 
   public:
-    void init() override { 
+    void init() override {
+      std::string mode = param<std::string>("mode").desc("off, summary, sampled or full.").default_val("full");
+      if (mode == "off") {
+        m_mode = Mode::Off;
+      } else if (mode == "summary") {
+        m_mode = Mode::Summary;
+      } else if (mode == "sampled") {
+        m_mode = Mode::Sampled;
+      } else if (mode == "full") {
+        m_mode = Mode::Full;
+      } else {
+        throw ConfigurationError("Unknown trace recorder mode {}!", mode);
+      }
+
+      std::string format = param<std::string>("format").desc("Log format (text or binary).").default_val("text");
+      if (format != "binary" && format != "text") {
+        throw ConfigurationError("Unknown trace recorder format {}!", format);
+      }
+      m_binary = format == "binary";
+
+      m_sample_every = param<uint64_t>("sample_every").desc("Record every Nth command (sampled mode).").default_val(1);
+      m_window_start = param<Clk_t>("window_start").desc("First recorded cycle (sampled mode).").default_val(0);
+      m_window_end = param<Clk_t>("window_end").desc("End of the recorded cycles, exclusive (sampled mode).").default_val(std::numeric_limits<Clk_t>::max());
+      m_buffer_size = param<size_t>("buffer_size").desc("Log buffer size in bytes.").default_val(1 << 20);
+      if (m_sample_every == 0) {
+        throw ConfigurationError("sample_every of the trace recorder must be positive!");
+      }
+
+      if (m_mode == Mode::Off) {
+        return;
+      }
       m_trace_path = param<std::string>("path").desc("Path to the trace file").required();
       auto parent_path = m_trace_path.parent_path();
       std::filesystem::create_directories(parent_path);
@@ -37,24 +100,102 @@ class AgentXTraceRecorder : public IControllerPlugin, public Implementation {
       m_ctrl = cast_parent<IDRAMController>();
       m_dram = m_ctrl->m_dram;
 
-      auto sink = std::make_shared<spdlog::sinks::basic_file_sink_mt>(fmt::format("{}.ch{}", m_trace_path.string(), m_ctrl->m_channel_id), true);
-      m_tracer = std::make_shared<spdlog::logger>(fmt::format("trace_recorder_ch{}", m_ctrl->m_channel_id), sink);
-      m_tracer->set_pattern("%v");
-      m_tracer->set_level(spdlog::level::trace);      
+      if (m_mode == Mode::Off) {
+        return;
+      }
+      auto log_path = fmt::format("{}.ch{}", m_trace_path.string(), m_ctrl->m_channel_id);
+      m_log.open(log_path, m_binary && m_mode != Mode::Summary ? std::ios::binary | std::ios::trunc : std::ios::trunc);
+      if (!m_log) {
+        throw ConfigurationError("Cannot open trace file {}!", log_path);
+      }
+      if (m_mode == Mode::Summary) {
+        m_cmd_counts.assign(m_dram->m_commands.size(), 0);
+        return;
+      }
+      m_buffer.reserve(m_buffer_size);
+      if (m_binary) {
+        write_header();
+      }
     };
 
     void update(bool request_found, ReqBuffer::iterator& req_it) override {
       m_clk++;
 
-      if (request_found) {
-        m_tracer->trace(
-          "{}, {}, {}", 
-          m_clk,
-          m_dram->m_commands(req_it->command),
-          fmt::join(req_it->addr_vec, ", ")
-        );
+      if (!request_found || m_mode == Mode::Off) {
+        return;
+      }
+      if (m_mode == Mode::Summary) {
+        m_cmd_counts[req_it->command]++;
+        return;
+      }
+      if (m_mode == Mode::Sampled) {
+        if (m_clk < m_window_start || m_clk >= m_window_end) {
+          return;
+        }
+        if (m_num_sampled++ % m_sample_every != 0) {
+          return;
+        }
+      }
+      record(req_it->command, req_it->addr_vec);
+    };
+
+    void finalize() override {
+      if (m_mode == Mode::Off) {
+        return;
+      }
+      if (m_mode == Mode::Summary) {
+        m_log << "channel: " << m_ctrl->m_channel_id << "\n";
+        m_log << "cycles: " << m_clk << "\n";
+        m_log << "commands:\n";
+        for (size_t cmd = 0; cmd < m_cmd_counts.size(); cmd++) {
+          m_log << "  " << m_dram->m_commands(cmd) << ": " << m_cmd_counts[cmd] << "\n";
+        }
+      } else {
+        flush();
       }
+      m_log.close();
+    };
 
+  private:
+    void append(const void* data, size_t size) {
+      if (m_buffer.size() + size > m_buffer_size) {
+        flush();
+      }
+      const char* bytes = static_cast<const char*>(data);
+      m_buffer.insert(m_buffer.end(), bytes, bytes + size);
+    };
+
+    void flush() {
+      m_log.write(m_buffer.data(), m_buffer.size());
+      m_buffer.clear();
+    };
+
+    void write_header() {
+      append(BINARY_MAGIC, sizeof(BINARY_MAGIC) - 1);
+      uint8_t n_levels = m_dram->m_levels.size();
+      uint8_t n_commands = m_dram->m_commands.size();
+      append(&n_levels, sizeof(n_levels));
+      append(&n_commands, sizeof(n_commands));
+      for (size_t cmd = 0; cmd < m_dram->m_commands.size(); cmd++) {
+        std::string name(m_dram->m_commands(cmd));
+        append(name.c_str(), name.size() + 1);
+      }
+    };
+
+    void record(int command, const AddrVec_t& addr_vec) {
+      if (!m_binary) {
+        std::string line = fmt::format("{}, {}, {}\n", m_clk, m_dram->m_commands(command), fmt::join(addr_vec, ", "));
+        append(line.data(), line.size());
+        return;
+      }
+      uint64_t clk = m_clk;
+      uint8_t cmd = command;
+      append(&clk, sizeof(clk));
+      append(&cmd, sizeof(cmd));
+      for (auto addr : addr_vec) {
+        int32_t level_addr = addr;
+        append(&level_addr, sizeof(level_addr));
+      }
     };
 
 };
@@ -0,0 +1,121 @@
+#include <memory>
+#include <string>
+
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+
+#include "base/base.h"
+#include "base/config.h"
+#include "memory_system/memory_system.h"
+
+namespace py = pybind11;
+
+namespace Ramulator {
+
+/**
+ * In-process AgentX-NDP memory system, driven like the AgentX binary drives
+ * it from NDPLoadStoreTrace but fed from a NumPy buffer of requests:
+ *   uint64 (n,)   records of the binary trace format (request type in bits
+ *                 63..56, address in bits 55..0), e.g. a view of a binary trace;
+ *   uint64 (n, 2) (request type, address) rows.
+ * The buffer is read in place. The system is built once from the config and
+ * rebuilt from the parsed config by reset(), without any file I/O; the old
+ * system is deleted first (an AgentX-NDP system frees its components).
+ */
+class PySimulator {
+  private:
+    static constexpr int BINARY_OP_SHIFT = 56;
+    static constexpr uint64_t BINARY_ADDR_MASK = (uint64_t(1) << BINARY_OP_SHIFT) - 1;
+
+    YAML::Node m_config;
+    std::unique_ptr<IMemorySystem> m_memory_system;
+    int m_frontend_tick = 1;
+    bool m_has_run = false;
+
+  public:
+    PySimulator(const std::string& config_yaml) {
+      m_config = YAML::Load(config_yaml);
+      if (m_config["Frontend"] && m_config["Frontend"]["clock_ratio"]) {
+        m_frontend_tick = m_config["Frontend"]["clock_ratio"].as<int>();
+      }
+      reset();
+    };
+
+    /**
+     * @brief    Deletes the memory system and builds a fresh one from the
+     *           config.
+     */
+    void reset() {
+      m_memory_system.reset();
+      m_memory_system.reset(Factory::create_memory_system(m_config));
+      m_memory_system->connect_frontend(nullptr);
+      m_memory_system->m_print_stats = false;
+      m_has_run = false;
+    };
+
+    /**
+     * @brief    Simulates the requests of trace until all of them have been
+     *           served and returns the memory system stats as YAML.
+     */
+    std::string run(py::array_t<uint64_t, py::array::c_style> trace) {
+      if (m_has_run) {
+        throw std::runtime_error("The memory system has already been run; reset() it first.");
+      }
+      bool is_pairs = trace.ndim() == 2 && trace.shape(1) == 2;
+      if (!is_pairs && trace.ndim() != 1) {
+        throw py::value_error("trace must be a uint64 array of shape (n,) or (n, 2)");
+      }
+      const uint64_t* data = trace.data();
+      size_t n_requests = trace.shape(0);
+      m_has_run = true;
+
+      {
+        py::gil_scoped_release release;
+        int mem_tick = m_memory_system->get_clock_ratio();
+        int tick_mult = m_frontend_tick * mem_tick;
+        size_t pos = 0;
+        for (uint64_t i = 0;; i++) {
+          if (((i % tick_mult) % mem_tick) == 0) {
+            while (pos < n_requests) {
+              uint64_t type = is_pairs ? data[2 * pos] : data[pos] >> BINARY_OP_SHIFT;
+              Addr_t addr = is_pairs ? data[2 * pos + 1] : data[pos] & BINARY_ADDR_MASK;
+              if (type != Request::Type::Read && type != Request::Type::Write &&
+                  type != Request::Type::PIM_MACAB && type != Request::Type::PIM_WRAB &&
+                  type != Request::Type::PIM_BARRIER) {
+                throw std::invalid_argument(fmt::format("Unknown request type {} at trace index {}!", type, pos));
+              }
+              if (!m_memory_system->send({addr, int(type)})) {
+                break;
+              }
+              pos++;
+            }
+          }
+
+          if ((i % tick_mult) % m_frontend_tick == 0) {
+            m_memory_system->tick();
+          }
+
+          if (pos == n_requests && !m_memory_system->is_pending()) {
+            break;
+          }
+        }
+        m_memory_system->finalize();
+      }
+      return m_memory_system->stats_yaml();
+    };
+};
+
+}        // namespace Ramulator
+
+
+PYBIND11_MODULE(_agentx, m) {
+  m.doc() = "In-process AgentX-NDP memory system.";
+
+  py::class_<Ramulator::PySimulator>(m, "Simulator")
+    .def(py::init<const std::string&>(), py::arg("config_yaml"),
+         "Builds the memory system of an AgentX config (YAML text).")
+    .def("reset", &Ramulator::PySimulator::reset,
+         "Rebuilds the memory system for another run.")
+    .def("run", &Ramulator::PySimulator::run, py::arg("trace").noconvert(),
+         "Simulates a uint64 (n,) binary-format or (n, 2) (type, address) trace and returns the stats YAML.");
+}
@@ -1,6 +1,15 @@
 #include <filesystem>
 #include <iostream>
 #include <fstream>
+#include <cstring>
+#include <algorithm>
+#include <charconv>
+#include <string_view>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
 #include "frontend/frontend.h"
 #include "base/exception.h"
@@ -17,7 +26,54 @@ class NDPLoadStoreTrace : public IFrontEnd, public Implementation {
       int req_type;
       Addr_t addr;
     };
-    std::vector<Trace> m_trace;
+
+    // Text trace line. "<cmd> addr" is a 1x1 loop; "<cmd>_LOOP base stride_ch
+    // n_ch stride_idx n_idx" stands for n_idx * n_ch requests to
+    // base + i * stride_idx + c * stride_ch, with c varying fastest. Loops are
+    // expanded one request at a time as the memory system accepts them.
+    struct TraceLoop {
+      int req_type;
+      Addr_t base;
+      Addr_t stride_ch;
+      size_t n_ch;
+      Addr_t stride_idx;
+      size_t n_idx;
+    };
+    TraceLoop m_curr_loop;
+    bool m_has_loop = false;
+    size_t m_curr_loop_pos = 0;
+
+    // Text traces are streamed: the file is read in blocks into a bounded
+    // buffer and parsed in place, one line when the previous loop is
+    // drained, so memory does not grow with the trace length. The path may
+    // also be a pipe (a FIFO, or "-" for stdin) the trace is written into
+    // while it is simulated; a pipe is only read as far as the next line
+    // (or record) needs, so the simulation keeps up with the writer.
+    std::string m_trace_path;
+    int m_fd = -1;
+    bool m_is_file = false;
+    std::vector<char> m_buffer;
+    size_t m_buf_begin = 0;     // First unparsed byte
+    size_t m_buf_end = 0;       // End of the bytes read
+    bool m_eof = false;
+    size_t m_line_no = 0;
+
+    // Binary trace ("format: binary"): 16-byte header (magic "AGXTRC01",
+    // uint64 record count) followed by one uint64 per request, with the
+    // request type in bits 63..56 and the address in bits 55..0. A file is
+    // mapped, and the pages already sent are released every
+    // BINARY_RELEASE_RECORDS records; a pipe is streamed through the buffer.
+    static constexpr char   BINARY_MAGIC[8] = {'A', 'G', 'X', 'T', 'R', 'C', '0', '1'};
+    static constexpr size_t BINARY_HEADER_SIZE = 16;
+    static constexpr int    BINARY_OP_SHIFT = 56;
+    static constexpr uint64_t BINARY_ADDR_MASK = (uint64_t(1) << BINARY_OP_SHIFT) - 1;
+    static constexpr size_t BINARY_RELEASE_RECORDS = size_t(1) << 20;
+
+    bool m_is_binary = false;
+    void* m_mmap_base = nullptr;
+    size_t m_mmap_size = 0;
+    const uint64_t* m_records = nullptr;
+    uint64_t m_curr_record = 0;
 
     size_t m_trace_length = 0;
     size_t m_curr_trace_idx = 0;
@@ -29,12 +85,41 @@ class NDPLoadStoreTrace : public IFrontEnd, public Implementation {
   public:
     void init() override {
       std::string trace_path_str = param<std::string>("path").desc("Path to the load store trace file.").required();
+      std::string trace_format = param<std::string>("format").desc("Trace file format (text or binary).").default_val("text");
+      size_t buffer_size = param<size_t>("buffer_size").desc("Read buffer size of text traces in bytes.").default_val(1 << 22);
       m_clock_ratio = param<uint>("clock_ratio").required();
 
       m_logger = Logging::create_logger("LoadStoreTrace");
       m_logger->info("Loading trace file {} ...", trace_path_str);
-      init_trace(trace_path_str);
-      m_logger->info("Loaded {} lines.", m_trace.size());
+      if (trace_format != "text" && trace_format != "binary") {
+        throw ConfigurationError("Unknown trace format {}!", trace_format);
+      }
+      m_is_file = open_trace(trace_path_str);
+      if (trace_format == "text") {
+        init_trace(buffer_size);
+        m_logger->info("Streaming trace lines through a {} KiB buffer.", buffer_size >> 10);
+      } else if (m_is_file) {
+        init_binary_trace();
+        m_logger->info("Mapped {} records.", m_trace_length);
+      } else {
+        init_binary_stream(buffer_size);
+        m_logger->info("Streaming trace records ({} records) through a {} KiB buffer.", m_trace_length, buffer_size >> 10);
+      }
+    };
+
+    ~NDPLoadStoreTrace() {
+      if (m_mmap_base != nullptr) {
+        munmap(m_mmap_base, m_mmap_size);
+      }
+      if (m_fd >= 0 && m_fd != STDIN_FILENO) {
+        close(m_fd);
+      }
+    };
+
+    void finalize() override {
+      // Streamed traces are only counted once they have been sent.
+      m_logger->info("Loaded {} lines.", m_trace_count);
+      IFrontEnd::finalize();
     };
 
 
@@ -44,7 +129,7 @@ class NDPLoadStoreTrace : public IFrontEnd, public Implementation {
       }
       bool req_full = false;
       while(!req_full && !is_finished()) {
-        const Trace& t = m_trace[m_curr_trace_idx];
+        const Trace t = get_trace();
         bool request_sent = false;
         switch (t.req_type) {
           case  0: request_sent = m_memory_system->send({t.addr, Request::Type::Read}); break;
@@ -55,7 +140,7 @@ class NDPLoadStoreTrace : public IFrontEnd, public Implementation {
           default:;
         }
         if (request_sent) {
-          m_curr_trace_idx = (m_curr_trace_idx + 1) % m_trace_length;
+          advance_trace();
           m_trace_count++;
         }
         else {
@@ -66,60 +151,266 @@ class NDPLoadStoreTrace : public IFrontEnd, public Implementation {
 
 
   private:
-    void init_trace(const std::string& file_path_str) {
-      fs::path trace_path(file_path_str);
-      if (!fs::exists(trace_path)) {
-        throw ConfigurationError("Trace {} does not exist!", file_path_str);
+    Trace get_trace() const {
+      if (m_is_binary) {
+        uint64_t record = m_records != nullptr ? m_records[m_curr_trace_idx] : m_curr_record;
+        return {int(record >> BINARY_OP_SHIFT), Addr_t(record & BINARY_ADDR_MASK)};
       }
+      const TraceLoop& loop = m_curr_loop;
+      Addr_t idx = m_curr_loop_pos / loop.n_ch;
+      Addr_t ch = m_curr_loop_pos % loop.n_ch;
+      return {loop.req_type, loop.base + idx * loop.stride_idx + ch * loop.stride_ch};
+    };
 
-      std::ifstream trace_file(trace_path);
-      if (!trace_file.is_open()) {
+    void advance_trace() {
+      if (m_is_binary && m_records == nullptr) {
+        // m_trace_count is incremented after this.
+        if (m_trace_count + 1 < m_trace_length) {
+          m_curr_record = next_record();
+        }
+        return;
+      }
+      if (m_is_binary) {
+        m_curr_trace_idx = (m_curr_trace_idx + 1) % m_trace_length;
+        if (m_curr_trace_idx % BINARY_RELEASE_RECORDS == 0) {
+          release_sent_records();
+        }
+        return;
+      }
+      if (++m_curr_loop_pos == m_curr_loop.n_ch * m_curr_loop.n_idx) {
+        m_curr_loop_pos = 0;
+        m_has_loop = next_loop();
+      }
+    };
+
+    void release_sent_records() {
+      // Drops the mapped pages before the current record from memory.
+      size_t page_size = sysconf(_SC_PAGESIZE);
+      size_t sent_bytes = BINARY_HEADER_SIZE + m_curr_trace_idx * sizeof(uint64_t);
+      size_t release_bytes = sent_bytes / page_size * page_size;
+      if (release_bytes > 0) {
+        madvise(m_mmap_base, release_bytes, MADV_DONTNEED);
+      }
+    };
+
+    // Opens path ("-" is stdin) as m_fd; returns whether it is a regular file.
+    bool open_trace(const std::string& file_path_str) {
+      m_trace_path = file_path_str;
+      if (file_path_str == "-") {
+        m_fd = STDIN_FILENO;
+      } else {
+        if (!fs::exists(fs::path(file_path_str))) {
+          throw ConfigurationError("Trace {} does not exist!", file_path_str);
+        }
+        m_fd = open(file_path_str.c_str(), O_RDONLY);
+      }
+      struct stat st;
+      if (m_fd < 0 || fstat(m_fd, &st) != 0) {
         throw ConfigurationError("Trace {} cannot be opened!", file_path_str);
       }
+      if (!S_ISREG(st.st_mode)) {
+        return false;
+      }
+      posix_fadvise(m_fd, 0, 0, POSIX_FADV_SEQUENTIAL);
+      return true;
+    };
+
+    void init_binary_trace() {
+      struct stat st;
+      if (fstat(m_fd, &st) != 0 || size_t(st.st_size) < BINARY_HEADER_SIZE) {
+        throw ConfigurationError("Trace {} format invalid!", m_trace_path);
+      }
+      m_mmap_size = st.st_size;
+      m_mmap_base = mmap(nullptr, m_mmap_size, PROT_READ, MAP_PRIVATE, m_fd, 0);
+      close(m_fd);
+      m_fd = -1;
+      if (m_mmap_base == MAP_FAILED) {
+        m_mmap_base = nullptr;
+        throw ConfigurationError("Trace {} cannot be mapped!", m_trace_path);
+      }
+      madvise(m_mmap_base, m_mmap_size, MADV_SEQUENTIAL);
+
+      const char* header = static_cast<const char*>(m_mmap_base);
+      uint64_t n_records = 0;
+      std::memcpy(&n_records, header + sizeof(BINARY_MAGIC), sizeof(n_records));
+      if (std::memcmp(header, BINARY_MAGIC, sizeof(BINARY_MAGIC)) != 0 ||
+          n_records > (m_mmap_size - BINARY_HEADER_SIZE) / sizeof(uint64_t)) {
+        throw ConfigurationError("Trace {} format invalid!", m_trace_path);
+      }
+
+      m_records = reinterpret_cast<const uint64_t*>(header + BINARY_HEADER_SIZE);
+      m_trace_length = n_records;
+      m_is_binary = true;
+    };
+
+    void init_binary_stream(size_t buffer_size) {
+      m_buffer.resize(std::max(buffer_size, BINARY_HEADER_SIZE));
+      refill(BINARY_HEADER_SIZE);
+      if (m_buf_end < BINARY_HEADER_SIZE || std::memcmp(m_buffer.data(), BINARY_MAGIC, sizeof(BINARY_MAGIC)) != 0) {
+        throw ConfigurationError("Trace {} format invalid!", m_trace_path);
+      }
+      uint64_t n_records = 0;
+      std::memcpy(&n_records, m_buffer.data() + sizeof(BINARY_MAGIC), sizeof(n_records));
+      m_buf_begin = BINARY_HEADER_SIZE;
+      m_trace_length = n_records;
+      m_is_binary = true;
+      if (m_trace_length > 0) {
+        m_curr_record = next_record();
+      }
+    };
+
+    uint64_t next_record() {
+      if (m_buf_end - m_buf_begin < sizeof(uint64_t)) {
+        refill(sizeof(uint64_t));
+        if (m_buf_end - m_buf_begin < sizeof(uint64_t)) {
+          throw ConfigurationError("Trace {} is truncated ({} records expected)!", m_trace_path, m_trace_length);
+        }
+      }
+      uint64_t record;
+      std::memcpy(&record, m_buffer.data() + m_buf_begin, sizeof(record));
+      m_buf_begin += sizeof(record);
+      return record;
+    };
+
+    void init_trace(size_t buffer_size) {
+      m_buffer.resize(buffer_size);
+      m_has_loop = next_loop();
+    };
 
-      std::string line;
-      while (std::getline(trace_file, line)) {
-        std::vector<std::string> tokens;
-        tokenize(tokens, line, " ");
-        
-        //printf("Debug: Read line: %s\n", line.c_str());
-        // TODO: Add line number here for better error messages
-        if (tokens.size() != 2) {
-          throw ConfigurationError("Trace {} format invalid!", file_path_str);
+    // Moves the unparsed bytes to the front of the buffer and reads after them:
+    // from a regular file until the buffer is full, from a pipe until the
+    // buffer holds min_bytes bytes (binary), or a complete line if min_bytes
+    // is 0 (text), so that a slow writer does not block the simulation.
+    void refill(size_t min_bytes = 0) {
+      size_t n_left = m_buf_end - m_buf_begin;
+      if (n_left == m_buffer.size()) {
+        throw ConfigurationError("Trace {} line {} is longer than the {} byte buffer!", m_trace_path, m_line_no + 1, m_buffer.size());
+      }
+      std::memmove(m_buffer.data(), m_buffer.data() + m_buf_begin, n_left);
+      m_buf_begin = 0;
+      m_buf_end = n_left;
+      while (m_buf_end < m_buffer.size()) {
+        ssize_t n_read = read(m_fd, m_buffer.data() + m_buf_end, m_buffer.size() - m_buf_end);
+        if (n_read < 0) {
+          throw ConfigurationError("Trace {} cannot be read!", m_trace_path);
+        }
+        if (n_read == 0) {
+          m_eof = true;
+          break;
         }
-       // printf("Debug: Token[0]: %s, Token[1]: %s\n", tokens[0].c_str(), tokens[1].c_str());
-        int req_type = -1; 
-        if (tokens[0] == "LD") {
-          req_type = 0;
-        } else if (tokens[0] == "ST") {
-          req_type = 1;
-        } else if (tokens[0] == "PIM_MACAB") {
-          req_type = 4;
-        } else if (tokens[0] == "PIM_WRAB") {
-          req_type = 5;
-        } else if (tokens[0] == "PIM_BARRIER") {
-          req_type = 6;
-        } else {
-          throw ConfigurationError("Trace {} format invalid!", file_path_str);
+        const char* read_begin = m_buffer.data() + m_buf_end;
+        m_buf_end += n_read;
+        if (!m_is_file && (min_bytes > 0 ? m_buf_end >= min_bytes : std::memchr(read_begin, '\n', n_read) != nullptr)) {
+          break;
         }
+      }
+    };
 
-        Addr_t addr = -1;
-        if (tokens[1].compare(0, 2, "0x") == 0 | tokens[1].compare(0, 2, "0X") == 0) {
-          addr = std::stoll(tokens[1].substr(2), nullptr, 16);
-        } else {
-          addr = std::stoll(tokens[1]);
+    // Parses the next non-empty line into m_curr_loop; false at the end of the trace.
+    bool next_loop() {
+      while (true) {
+        const char* begin = m_buffer.data() + m_buf_begin;
+        const char* newline = static_cast<const char*>(std::memchr(begin, '\n', m_buf_end - m_buf_begin));
+        if (newline == nullptr && !m_eof) {
+          refill();
+          continue;
+        }
+        const char* end = newline != nullptr ? newline : m_buffer.data() + m_buf_end;
+        if (begin == end && m_eof) {
+          return false;
+        }
+        m_buf_begin = end - m_buffer.data() + (newline != nullptr);
+        m_line_no++;
+        if (parse_line(begin, end)) {
+          return true;
         }
-        m_trace.push_back({req_type, addr});
       }
+    };
 
-      trace_file.close();
+    static bool is_space(char c) {
+      return c == ' ' || c == '\t' || c == '\r';
+    };
 
-      m_trace_length = m_trace.size();
+    // The next whitespace-separated token in [p, end), advancing p past it.
+    static std::string_view next_token(const char*& p, const char* end) {
+      while (p < end && is_space(*p)) p++;
+      const char* begin = p;
+      while (p < end && !is_space(*p)) p++;
+      return std::string_view(begin, p - begin);
+    };
+
+    template <typename T>
+    bool parse_number(std::string_view token, T& value) const {
+      int base = 10;
+      if (token.size() > 2 && token[0] == '0' && (token[1] == 'x' || token[1] == 'X')) {
+        token.remove_prefix(2);
+        base = 16;
+      }
+      auto [ptr, ec] = std::from_chars(token.data(), token.data() + token.size(), value, base);
+      return ec == std::errc() && ptr == token.data() + token.size();
+    };
+
+    static int parse_req_type(std::string_view cmd) {
+      if (cmd == "PIM_MACAB")   return 4;
+      if (cmd == "PIM_BARRIER") return 6;
+      if (cmd == "PIM_WRAB")    return 5;
+      if (cmd == "LD")          return 0;
+      if (cmd == "ST")          return 1;
+      return -1;
+    };
+
+    // Parses one line in place; false for blank lines.
+    bool parse_line(const char* p, const char* end) {
+      std::string_view tokens[7];
+      size_t n_tokens = 0;
+      for (std::string_view token = next_token(p, end); !token.empty(); token = next_token(p, end)) {
+        if (n_tokens == 7) {
+          break;
+        }
+        tokens[n_tokens++] = token;
+      }
+      if (n_tokens == 0) {
+        return false;
+      }
+      if (n_tokens != 2 && n_tokens != 6) {
+        throw_format_error();
+      }
+
+      std::string_view cmd = tokens[0];
+      bool is_loop = n_tokens == 6;
+      if (is_loop) {
+        constexpr std::string_view suffix = "_LOOP";
+        if (cmd.size() <= suffix.size() || cmd.substr(cmd.size() - suffix.size()) != suffix) {
+          throw_format_error();
+        }
+        cmd.remove_suffix(suffix.size());
+      }
+
+      TraceLoop loop = {parse_req_type(cmd), 0, 0, 1, 0, 1};
+      if (loop.req_type < 0 || !parse_number(tokens[1], loop.base)) {
+        throw_format_error();
+      }
+      if (is_loop) {
+        if (!parse_number(tokens[2], loop.stride_ch) || !parse_number(tokens[3], loop.n_ch) ||
+            !parse_number(tokens[4], loop.stride_idx) || !parse_number(tokens[5], loop.n_idx) ||
+            loop.n_ch == 0 || loop.n_idx == 0) {
+          throw_format_error();
+        }
+      }
+      m_curr_loop = loop;
+      return true;
+    };
+
+    [[noreturn]] void throw_format_error() const {
+      throw ConfigurationError("Trace {} line {} format invalid!", m_trace_path, m_line_no);
     };
 
     // TODO: FIXME
     bool is_finished() override {
-      return m_trace_count >= m_trace_length; 
+      if (m_is_binary) {
+        return m_trace_count >= m_trace_length;
+      }
+      return !m_has_loop;
     };
 };
 
@@ -1,26 +1,52 @@
-from dataclasses import dataclass
-from typing import Dict
+import csv
+import copy
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
 from pathlib import Path
-import pandas as pd
-from src.model_config import model_config
+import numpy as np
+from src.model_config import model_config, model_params
+from src.hw_spec import DEFAULT_SPEC, HardwareSpec
+from src.profiler import profiler
+
+ROLES = ["planner", "critic", "tool_s", "tool_m", "tool_l"]
+# Fields of AgentConfig as a NumPy structured dtype
+AGENT_DTYPE = np.dtype([("size", np.int64), ("cycle", np.float64),
+                        ("prefill", np.float64), ("decode", np.float64),
+                        ("draft", np.int64), ("draft_len", np.int64), ("accept", np.float64),
+                        ("model", "U16")])
+
 @dataclass
 class AgentConfig:
     size: int
     cycle: float
     prefill: float
     decode: float
+    # Speculative decoding: a draft-B model proposes draft_len tokens per round,
+    # verified by this model in one pass and each accepted with probability
+    # accept. draft == 0 decodes one token per step.
+    draft: int = 0
+    draft_len: int = 0
+    accept: float = 0.0
+    # Key of the role's model in model_config (e.g. "30B-A3B" for an MoE
+    # model); default f"{size}B". size stays the total parameter count (B).
+    model: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.model:
+            self.model = f"{self.size}B"
 
     def __getitem__(self, key: str):
         return getattr(self, key)
 
+    @property
+    def draft_model(self) -> str:
+        return f"{self.draft}B" if self.draft else ""
+
 
 class AgentConfigStore:
     def __init__(self) -> None:
-        self.length_map: Dict[float, int] = {
-            0.5: 0, 1: 1, 2: 2, 3: 3, 4: 4,
-            6: 5, 8: 6, 12: 7, 16: 8, 24: 9,
-        }
-        
         self.pcle = 32 #pcle4 x16
 
         self.agent_config: Dict[str, Dict[str, AgentConfig]] = {
@@ -130,105 +156,400 @@ class AgentConfigStore:
             )
         return self.agent_config[dataset]
 
+    @property
+    def datasets(self) -> List[str]:
+        return list(self.agent_config)
+
+    def speculative(self, role: str, draft: int, draft_len: int, accept: float) -> "AgentConfigStore":
+        """
+        A copy of the store in which role decodes speculatively in every
+        dataset: the draft-B model drafts draft_len tokens per round and the
+        role's model verifies them in one pass, accepting each with
+        probability accept.
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown role '{role}'. Valid roles are: {', '.join(ROLES)}")
+        if f"{draft}B" not in model_config:
+            raise ValueError(f"Unknown draft model {draft}B")
+        if draft_len < 1 or not 0 <= accept <= 1:
+            raise ValueError(f"Speculative decoding needs draft_len >= 1 and accept in [0, 1], "
+                             f"got {draft_len} and {accept}")
+        store = copy.copy(self)
+        store.agent_config = {
+            dataset: {name: replace(agent, draft=draft, draft_len=draft_len, accept=accept) if name == role else agent
+                      for name, agent in roles.items()}
+            for dataset, roles in self.agent_config.items()}
+        return store
+
+    def with_model(self, role: str, model: str) -> "AgentConfigStore":
+        # A copy of the store in which role runs model (a model_config key, e.g. 30B-A3B) in every dataset.
+        if role not in ROLES:
+            raise ValueError(f"Unknown role '{role}'. Valid roles are: {', '.join(ROLES)}")
+        model = model.upper()
+        if model not in model_config:
+            raise ValueError(f"Unknown model {model}. Valid models are: {', '.join(model_config)}")
+        store = copy.copy(self)
+        store.agent_config = {
+            dataset: {name: replace(agent, size=model_params(model), model=model) if name == role else agent
+                      for name, agent in roles.items()}
+            for dataset, roles in self.agent_config.items()}
+        return store
+
+    def as_array(self, datasets: Optional[Sequence[str]] = None) -> np.ndarray:
+        # roles x datasets structured array with the AGENT_DTYPE fields.
+        datasets = self.datasets if datasets is None else datasets
+        return np.array([[tuple(self[dataset][role][name] for name in AGENT_DTYPE.names)
+                          for dataset in datasets] for role in ROLES], dtype=AGENT_DTYPE)
+
 default_agent_config = AgentConfigStore()
 
 MAX_OFF_PCLE_BW_UTIL = 0.85
 
-def load_csv_or_error(filename: str):
-    path = Path(filename)
-    if not path.exists():
-        raise FileNotFoundError(f"File {filename} not found. Please first run real_vllmtest.py or place the corresponding file in this folder.")
-    return pd.read_csv(path)
+# Columns written by real_vllmtest.py: length (K tokens), prefill (s), decode (ms/token)
+LATENCY_COLUMNS = ("length", "prefill", "decode")
+LATENCY_INTERP = ["linear", "loglog"]
+
+
+class LatencyTable:
+    """
+    Measured H100 latency of one model (a model_size*.csv written by
+    real_vllmtest.py): prefill (s) and decode (ms/token) per context length.
+
+    Lookups interpolate between the measured lengths, piecewise-linearly or
+    linearly in log-log space, and extend the first and last segments beyond
+    them. Measured lengths return the measured values exactly.
+
+    The CSV is only read on the first lookup. Its columns are kept as NumPy
+    arrays and, with cache=True, saved next to it as a .npz file that later
+    runs load instead while it is newer than the CSV.
+    """
+
+    def __init__(self, filename: str, cache: bool = True) -> None:
+        self.path = Path(filename)
+        self.cache = cache
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def cache_path(self) -> Path:
+        return self.path.with_suffix(".npz")
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        if self._columns is None:
+            if not self.path.exists():
+                raise FileNotFoundError(f"File {self.path} not found. Please first run real_vllmtest.py or place the corresponding file in this folder.")
+            if self.cache and self.cache_path.exists() and \
+                    self.cache_path.stat().st_mtime_ns >= self.path.stat().st_mtime_ns:
+                with np.load(self.cache_path) as npz:
+                    if all(name in npz.files for name in LATENCY_COLUMNS):
+                        self._columns = {name: npz[name] for name in LATENCY_COLUMNS}
+            if self._columns is None:
+                self._columns = self._read_csv()
+                if self.cache:
+                    self._save_cache()
+        return self._columns
+
+    def _read_csv(self) -> Dict[str, np.ndarray]:
+        with open(self.path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        missing = [name for name in LATENCY_COLUMNS if rows and name not in rows[0]]
+        if len(rows) < 2 or missing:
+            raise ValueError(f"File {self.path} needs at least two latency rows with columns {list(LATENCY_COLUMNS)}.")
+        columns = {name: np.array([float(row[name]) for row in rows]) for name in LATENCY_COLUMNS}
+        order = np.argsort(columns["length"], kind="stable")
+        return {name: values[order] for name, values in columns.items()}
+
+    def _save_cache(self) -> None:
+        # Written under a temporary name and renamed, so a concurrent reader
+        # never sees a partial file; a read-only directory just skips the cache.
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.stem}.{os.getpid()}.tmp.npz")
+        try:
+            np.savez(tmp_path, **self._columns)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+
+    def lookup(self, column: str, length, interp: str = "linear") -> np.ndarray:
+        """column at context lengths given in K tokens."""
+        columns = self.columns()
+        x, y = columns["length"], columns[column]
+        length = np.asarray(length, dtype=np.float64)
+        if interp == "loglog":
+            x, y, at = np.log(x), np.log(y), np.log(length)
+        elif interp == "linear":
+            at = length
+        else:
+            raise ValueError(f"Unknown latency interpolation: {interp}")
+
+        # Segment of every query, the end segments extended outwards.
+        seg = np.clip(np.searchsorted(x, at, side="right") - 1, 0, len(x) - 2)
+        slope = (y[seg + 1] - y[seg]) / (x[seg + 1] - x[seg])
+        value = y[seg] + slope * (at - x[seg])
+        if interp == "loglog":
+            value = np.exp(value)
+        measured = np.searchsorted(x, at).clip(max=len(x) - 1)
+        return np.where(x[measured] == at, columns[column][measured], value)
+
+    def prefill(self, length: float, interp: str = "linear") -> float:
+        return float(self.lookup("prefill", length, interp))
+
+    def decode(self, length: float, interp: str = "linear") -> float:
+        return float(self.lookup("decode", length, interp))
+
+    def __len__(self) -> int:
+        return len(self.columns()["length"])
+
+
+class LatencyTables:
+    """
+    The model_size<model>.csv tables found in directory, by model key (e.g.
+    model_size8B.csv, model_size30B-A3B.csv). interp selects how lengths
+    between measurements are looked up.
+    """
+
+    def __init__(self, directory: str = "./src", interp: str = "linear") -> None:
+        self.directory = Path(directory)
+        self.interp = interp
+        self._tables: Dict[str, LatencyTable] = {}
+
+    def models(self) -> List[str]:
+        models = []
+        for path in self.directory.glob("model_size*.csv"):
+            match = re.fullmatch(r"model_size(.+)\.csv", path.name)
+            if match:
+                models.append(match.group(1))
+        return sorted(models)
 
-model_8B = load_csv_or_error("./src/model_size8B.csv")
-model_14B = load_csv_or_error("./src/model_size14B.csv")
-model_32B = load_csv_or_error("./src/model_size32B.csv")
+    def __getitem__(self, model: str) -> LatencyTable:
+        if model not in self._tables:
+            path = self.directory / f"model_size{model}.csv"
+            if not path.exists():
+                found = ", ".join(self.models()) or "none"
+                raise FileNotFoundError(f"File {path} not found (latency tables found: {found}). "
+                                        f"Please first run real_vllmtest.py or place the corresponding file in this folder.")
+            self._tables[model] = LatencyTable(str(path))
+        return self._tables[model]
+
+    def lookup(self, models: np.ndarray, lengths: np.ndarray, column: str) -> np.ndarray:
+        # column of each model at each length (K tokens), same shape as models.
+        latency = np.empty(np.shape(models))
+        for model in np.unique(models):
+            mask = models == model
+            latency[mask] = self[str(model)].lookup(column, lengths[mask], self.interp)
+        return latency
+
+
+latency_tables = LatencyTables()
+
+def lookup_latency(agents: np.ndarray, column: str) -> np.ndarray:
+    # H100 latency of every role at its prefill length.
+    return latency_tables.lookup(agents["model"], agents["prefill"], column)
+
+def lookup_draft_latency(agents: np.ndarray, column: str) -> np.ndarray:
+    # H100 latency of every role's draft model at its prefill length, 0 without one.
+    latency = np.zeros(np.shape(agents))
+    drafted = agents["draft"] > 0
+    if drafted.any():
+        drafts = np.char.add(agents["draft"][drafted].astype(str), "B")
+        latency[drafted] = latency_tables.lookup(drafts, agents["prefill"][drafted], column)
+    return latency
+
+def expected_tokens(draft_len, accept):
+    """
+    Tokens a speculative round yields on average: the accepted prefix of the
+    draft_len drafted tokens plus the verifier's own, sum of accept**i for
+    i <= draft_len. 1 for plain decoding (draft_len 0).
+    """
+    draft_len, accept = np.asarray(draft_len), np.asarray(accept, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(accept < 1, (1 - accept ** (draft_len + 1)) / (1 - accept), draft_len + 1.0)
+
+@profiler.timed("h100_prefill")
+def role_prefill_time(agents: np.ndarray, config = default_agent_config) -> np.ndarray:
+    # A draft model prefills the context as well.
+    return (lookup_latency(agents, "prefill") + lookup_draft_latency(agents, "prefill")) * agents["cycle"]
+
+@profiler.timed("h100_pcle")
+def role_pcle_time(agents: np.ndarray, config = default_agent_config) -> np.ndarray:
+    # Weights, draft model included, are moved over PCIe twice per cycle (GB over GB/s).
+    pcle = config.pcle * MAX_OFF_PCLE_BW_UTIL
+    return 2 * (agents["size"] + agents["draft"]) * agents["cycle"] / pcle
+
+@profiler.timed("h100_decode")
+def role_decode_time(agents: np.ndarray, config = default_agent_config) -> np.ndarray:
+    # decode column is in ms per token.
+    per_token = lookup_latency(agents, "decode")
+    drafted = agents["draft"] > 0
+    if drafted.any():
+        # A round is draft_len draft decode steps and a verify pass of
+        # draft_len + 1 tokens. That pass takes at least a decode step and
+        # at least the prefill time per token of the context for each token.
+        draft_len = agents["draft_len"]
+        prefill_per_token = lookup_latency(agents, "prefill") * 1000 / (agents["prefill"] * 1024)
+        verify = np.maximum(per_token, (draft_len + 1) * prefill_per_token)
+        per_round = draft_len * lookup_draft_latency(agents, "decode") + verify
+        per_token = np.where(drafted, per_round / expected_tokens(draft_len, agents["accept"]), per_token)
+    return agents["decode"] * agents["cycle"] * per_token / 1000
 
 def get_prefill_time(dataset: str,device: str, config = default_agent_config):
     if device in ("H100", "AgentX"):
-        length_map = default_agent_config.length_map
-        config = config[dataset]
-        prefill_latency = model_32B.loc[length_map[config["planner"].prefill], "prefill"] * config["planner"].cycle + \
-                          model_32B.loc[length_map[config["critic"].prefill], "prefill"] * config["critic"].cycle + \
-                          model_8B.loc[length_map[config["tool_s"].prefill], "prefill"] * config["tool_s"].cycle + \
-                          model_14B.loc[length_map[config["tool_m"].prefill], "prefill"] * config["tool_m"].cycle + \
-                          model_32B.loc[length_map[config["tool_l"].prefill], "prefill"] * config["tool_l"].cycle
-        return prefill_latency
+        return float(role_prefill_time(config.as_array([dataset]), config).sum())
     else:
         raise ValueError(f"Unknown device type: {device}")
     
 def get_pcle_time(dataset: str,device: str,config = default_agent_config):
     if device == "H100":
-        pcle = default_agent_config.pcle * MAX_OFF_PCLE_BW_UTIL
-        config = config[dataset]
-        pcle_latency = 2 * ( config["planner"].size * config["planner"].cycle + \
-                           config["critic"].size * config["critic"].cycle + \
-                           config["tool_s"].size * config["tool_s"].cycle + \
-                           config["tool_m"].size * config["tool_m"].cycle + \
-                           config["tool_l"].size * config["tool_l"].cycle ) / pcle
-        return pcle_latency
+        return float(role_pcle_time(config.as_array([dataset]), config).sum())
     else:
         raise ValueError(f"Unknown device type: {device}")
 
 def get_decode_time(dataset: str,device: str,config = default_agent_config):
     if device == "H100":
-        length_map = default_agent_config.length_map
-        config = config[dataset]
-        decode_latency = (config["planner"].decode * config["planner"].cycle * model_32B.loc[length_map[config["planner"].prefill], "decode"] + \
-                          config["critic"].decode * config["critic"].cycle * model_32B.loc[length_map[config["critic"].prefill], "decode"] + \
-                          config["tool_s"].decode * config["tool_s"].cycle * model_8B.loc[length_map[config["tool_s"].prefill], "decode"] + \
-                          config["tool_m"].decode * config["tool_m"].cycle * model_14B.loc[length_map[config["tool_m"].prefill], "decode"] + \
-                          config["tool_l"].decode * config["tool_l"].cycle * model_32B.loc[length_map[config["tool_l"].prefill], "decode"]) / 1000
-        return decode_latency
+        return float(role_decode_time(config.as_array([dataset]), config).sum())
     else:
         raise ValueError(f"Unknown device type: {device}")
 
-def get_AgentX_time(dataset: str,device: str,batch_size: int, maxlen: int, dbyte: int, run_lpddrpim, config = default_agent_config):
+def step_cycles(modelsize: str, context_len: float, n_steps: float, stride: float, batch_size: int, maxlen: int,
+                dbyte: float, run_lpddrpim, decode_samples: int = 1, kv_dbyte: Optional[float] = None,
+                n_query: int = 1) -> float:
+    """
+    Per-layer AgentX cycles summed over n_steps steps of n_query tokens
+    each, starting at context_len, with the context growing by stride tokens
+    per step.
+
+    With decode_samples == 1 every step is assumed to see the prefill context.
+    Otherwise the per-step cycles are simulated at decode_samples context lengths
+    spread over the steps, linearly interpolated and summed over every step,
+    so the growing KV cache is accounted for.
+    """
+    if decode_samples <= 1:
+        return run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte, kv_dbyte, n_query) * n_steps
+
+    steps = np.arange(np.ceil(n_steps)) * stride + context_len
+    sample_lens = np.unique(np.rint(np.linspace(steps[0], steps[-1], decode_samples)).astype(int))
+    sample_cycles = [run_lpddrpim(modelsize, int(L), batch_size, maxlen, dbyte, kv_dbyte, n_query)
+                     for L in sample_lens]
+    return float(np.interp(steps, sample_lens, sample_cycles).sum()) * n_steps / steps.size
+
+def decode_cycles(role: AgentConfig, batch_size: int, maxlen: int, dbyte: float, run_lpddrpim, decode_samples: int = 1,
+                  kv_dbyte: Optional[float] = None):
+    """
+    Per-layer AgentX cycles summed over all decode steps of a role, with
+    dbyte-wide weights and a kv_dbyte-wide KV cache (None: dbyte), one
+    token per step (see step_cycles).
+    """
+    return step_cycles(role.model, role.prefill * 1024, role.decode, 1, batch_size, maxlen, dbyte,
+                       run_lpddrpim, decode_samples, kv_dbyte)
+
+def speculative_cycles(role: AgentConfig, batch_size: int, maxlen: int, dbyte: float, run_lpddrpim,
+                       decode_samples: int = 1, kv_dbyte: Optional[float] = None):
+    """
+    AgentX cycles of all layers summed over the speculative decode of a role:
+    decode / expected_tokens rounds, each draft_len decode steps of the draft
+    model and one verify pass of draft_len + 1 queries (a multi-query trace)
+    of the role's model. The context grows by the tokens of every round.
+    """
+    context_len = role.prefill * 1024
+    tokens = float(expected_tokens(role.draft_len, role.accept))
+    rounds = role.decode / tokens
+    draft = step_cycles(role.draft_model, context_len, rounds * role.draft_len, tokens / role.draft_len,
+                        batch_size, maxlen, dbyte, run_lpddrpim, decode_samples, kv_dbyte)
+    verify = step_cycles(role.model, context_len, rounds, tokens, batch_size, maxlen, dbyte,
+                         run_lpddrpim, decode_samples, kv_dbyte, role.draft_len + 1)
+    return draft * model_config[role.draft_model]["layer"] + verify * model_config[role.model]["layer"]
+
+def role_AgentX_time(datasets: Sequence[str], batch_size: int, maxlen: int, dbyte: float, run_lpddrpim,
+                     config = default_agent_config, decode_samples: int = 1,
+                     spec: HardwareSpec = DEFAULT_SPEC, kv_dbyte: Optional[float] = None) -> np.ndarray:
+    """
+    roles x datasets AgentX decode time (s). run_lpddrpim gives the per-layer
+    cycles of one decode step (or multi-query verify pass) on spec; both K and
+    V passes are counted. Weights are dbyte and the KV cache kv_dbyte (default
+    dbyte) bytes per element. Roles with a draft model decode speculatively.
+    """
+    tck_ns = spec.tck_ns  # 6400MT/s -> 0.3125ns per tick
+    agents = config.as_array(datasets)
+
+    def role_cycles(dataset: str, role: str) -> float:
+        # Cycles of all layers.
+        agent = config[dataset][role]
+        with profiler.span("agentx_decode", dataset=dataset, role=role):
+            if agent.draft:
+                return speculative_cycles(agent, batch_size, maxlen, dbyte, run_lpddrpim, decode_samples, kv_dbyte)
+            return (decode_cycles(agent, batch_size, maxlen, dbyte, run_lpddrpim, decode_samples, kv_dbyte) *
+                    model_config[agent.model]["layer"])
+
+    cycles = np.array([[role_cycles(dataset, role) for dataset in datasets] for role in ROLES])
+    return (cycles * tck_ns * agents["cycle"] * 2) / 1e9
+
+def get_AgentX_time(dataset: str,device: str,batch_size: int, maxlen: int, dbyte: float, run_lpddrpim, config = default_agent_config,
+                    decode_samples: int = 1, spec: HardwareSpec = DEFAULT_SPEC, kv_dbyte: Optional[float] = None):
     if device == "AgentX":
-        config = config[dataset]
-        tck_ns = 0.3125  # 6400MT/s -> 0.3125ns per tick
-        
-        modelsize = str(config["planner"].size) + "B"
-        context_len = config["planner"].prefill * 1024
-        layer = model_config[modelsize]["layer"]
-        decode_len = config["planner"].decode
-        cycle = config["planner"].cycle
-        planner_decode_cycles = run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte)
-        planner_decode_time = (planner_decode_cycles * tck_ns * layer * decode_len * cycle * 2) / 1e9
-        
-        modelsize = str(config["critic"].size) + "B"
-        context_len = config["critic"].prefill * 1024
-        layer = model_config[modelsize]["layer"]
-        decode_len = config["critic"].decode
-        cycle = config["critic"].cycle
-        critic_decode_cycles = run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte)
-        critic_decode_time = (critic_decode_cycles * tck_ns * layer * decode_len * cycle * 2) / 1e9
-        
-        modelsize = str(config["tool_s"].size) + "B"
-        context_len = config["tool_s"].prefill * 1024
-        layer = model_config[modelsize]["layer"]
-        decode_len = config["tool_s"].decode
-        cycle = config["tool_s"].cycle
-        tool_s_decode_cycles = run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte)
-        tool_s_decode_time = (tool_s_decode_cycles * tck_ns * layer * decode_len * cycle * 2) / 1e9
-        
-        modelsize = str(config["tool_m"].size) + "B"
-        context_len = config["tool_m"].prefill * 1024
-        layer = model_config[modelsize]["layer"]
-        decode_len = config["tool_m"].decode
-        cycle = config["tool_m"].cycle
-        tool_m_decode_cycles = run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte)
-        tool_m_decode_time = (tool_m_decode_cycles * tck_ns * layer * decode_len * cycle * 2) / 1e9
-        
-        modelsize = str(config["tool_l"].size) + "B"
-        context_len = config["tool_l"].prefill * 1024
-        layer = model_config[modelsize]["layer"]
-        decode_len = config["tool_l"].decode
-        cycle = config["tool_l"].cycle
-        tool_l_decode_cycles = run_lpddrpim(modelsize, context_len, batch_size, maxlen, dbyte)
-        tool_l_decode_time = (tool_l_decode_cycles * tck_ns * layer * decode_len * cycle * 2) / 1e9
-        
-        total_decode_time = planner_decode_time + critic_decode_time + tool_s_decode_time + tool_m_decode_time + tool_l_decode_time
-        return total_decode_time
+        return float(role_AgentX_time([dataset], batch_size, maxlen, dbyte, run_lpddrpim, config, decode_samples,
+                                      spec, kv_dbyte).sum())
     else:
-        raise ValueError(f"Unknown device type: {device}")
\ No newline at end of file
+        raise ValueError(f"Unknown device type: {device}")
+
+
+LATENCY_PARTS = ["h100_prefill", "h100_pcle", "h100_decode", "agentx_prefill", "agentx_decode"]
+
+@dataclass
+class LatencyBreakdown:
+    """Per-role latency parts (s), each a roles x datasets array."""
+    datasets: List[str]
+    agents: np.ndarray
+    parts: Dict[str, np.ndarray]
+
+    @property
+    def h100(self) -> np.ndarray:
+        return self.parts["h100_prefill"] + self.parts["h100_pcle"] + self.parts["h100_decode"]
+
+    @property
+    def agentx(self) -> np.ndarray:
+        return self.parts["agentx_prefill"] + self.parts["agentx_decode"]
+
+    def tokens_per_s(self, device: str) -> np.ndarray:
+        # Decoded tokens per second of decode time of every dataset on device ("h100" or "agentx").
+        tokens = (self.agents["decode"] * self.agents["cycle"]).sum(axis=0)
+        return tokens / self.parts[f"{device}_decode"].sum(axis=0)
+
+    def rows(self) -> List[dict]:
+        """
+        One row per dataset and role with its latency parts, plus a "total"
+        row per dataset; speedup is H100 / AgentX.
+        """
+        h100, agentx = self.h100, self.agentx
+        rows = []
+        for j, dataset in enumerate(self.datasets):
+            for i, role in enumerate(ROLES + ["total"]):
+                if role == "total":
+                    row = {"dataset": dataset, "role": role, "size": ""}
+                    row.update({part: float(values[:, j].sum()) for part, values in self.parts.items()})
+                    row.update({"h100": float(h100[:, j].sum()), "agentx": float(agentx[:, j].sum())})
+                else:
+                    row = {"dataset": dataset, "role": role, "size": str(self.agents["model"][i, j])}
+                    row.update({part: float(values[i, j]) for part, values in self.parts.items()})
+                    row.update({"h100": float(h100[i, j]), "agentx": float(agentx[i, j])})
+                row["speedup"] = row["h100"] / row["agentx"]
+                rows.append(row)
+        return rows
+
+def evaluate_latency(datasets: Sequence[str], batch_size: int, maxlen: int, dbyte: float, run_lpddrpim,
+                     config = default_agent_config, decode_samples: int = 1,
+                     spec: HardwareSpec = DEFAULT_SPEC, kv_dbyte: Optional[float] = None) -> LatencyBreakdown:
+    """
+    H100 and AgentX latency of every role of every dataset in one pass. The
+    H100 parts are array lookups; AgentX calls run_lpddrpim per role and
+    dataset, so it should be backed by precomputed or cached simulations.
+    """
+    datasets = list(datasets)
+    agents = config.as_array(datasets)
+    prefill = role_prefill_time(agents, config)
+    parts = {
+        "h100_prefill": prefill,
+        "h100_pcle": role_pcle_time(agents, config),
+        "h100_decode": role_decode_time(agents, config),
+        "agentx_prefill": prefill,
+        "agentx_decode": role_AgentX_time(datasets, batch_size, maxlen, dbyte, run_lpddrpim, config, decode_samples,
+                                          spec, kv_dbyte),
+    }
+    return LatencyBreakdown(datasets, agents, parts)
@@ -0,0 +1,112 @@
+import atexit
+import importlib
+import importlib.machinery
+import shutil
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import yaml
+
+try:
+    from src.gen_trace import generate_decode_trace
+    from src.sim_stats import SimStats, parse_stats
+except ImportError:
+    from gen_trace import generate_decode_trace
+    from sim_stats import SimStats, parse_stats
+
+# Extension module built with cmake -DAgentX_PYTHON=ON (src/AgentX_python.cpp)
+EXTENSION = "_agentx"
+# Header of the binary trace format (magic and record count)
+BINARY_HEADER_SIZE = 16
+
+_simulators: Dict[str, "InProcessSimulator"] = {}
+_work_dir: Optional[Path] = None
+
+
+def extension_path(agentx_dir: str = ".") -> Path:
+    # The built module next to the AgentX binary, e.g. _agentx.cpython-310-x86_64-linux-gnu.so.
+    for suffix in importlib.machinery.EXTENSION_SUFFIXES:
+        path = Path(agentx_dir) / (EXTENSION + suffix)
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"Cannot find the {EXTENSION} module in {Path(agentx_dir).resolve()}. Build it with cmake "
+                            f"-DAgentX_PYTHON=ON and copy it next to AgentX (see README).")
+
+
+def load_extension(agentx_dir: str = "."):
+    # The module is looked up next to the AgentX binary.
+    path = str(Path(agentx_dir).resolve())
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    try:
+        return importlib.import_module(EXTENSION)
+    except ImportError as e:
+        raise ImportError(f"Cannot import {EXTENSION} from {path}. Build it with cmake -DAgentX_PYTHON=ON "
+                          f"and copy it next to AgentX (see README).") from e
+
+
+def check_trace(trace: np.ndarray) -> None:
+    # The extension reads the buffer in place, so it must be C-contiguous native uint64.
+    if not isinstance(trace, np.ndarray):
+        raise ValueError(f"trace must be a NumPy array, got {type(trace).__name__}")
+    if trace.dtype != np.dtype(np.uint64):
+        raise ValueError(f"trace must be a native uint64 array, got {trace.dtype.str}")
+    if not (trace.ndim == 1 or (trace.ndim == 2 and trace.shape[1] == 2)):
+        raise ValueError(f"trace must have shape (n,) or (n, 2), got {trace.shape}")
+    if not trace.flags.c_contiguous:
+        raise ValueError("trace must be C-contiguous (e.g. np.ascontiguousarray(trace))")
+
+
+class InProcessSimulator:
+    """
+    The AgentX-NDP memory system of one config, simulated in this process.
+    It is built once; every further run() resets it first, so one instance
+    serves any number of traces.
+    """
+
+    def __init__(self, config: dict, agentx_dir: str = ".") -> None:
+        self._sim = load_extension(agentx_dir).Simulator(yaml.safe_dump(config, sort_keys=False))
+        self._fresh = True
+
+    def run(self, trace: np.ndarray) -> SimStats:
+        """
+        Simulates trace, read in place: uint64 binary-format records of shape
+        (n,) (see trace_records) or (type, address) rows of shape (n, 2).
+        """
+        check_trace(trace)
+        if not self._fresh:
+            self._sim.reset()
+        self._fresh = False
+        return parse_stats(self._sim.run(trace).splitlines(keepends=True))
+
+
+def get_simulator(config: dict, agentx_dir: str = ".") -> InProcessSimulator:
+    # One simulator per distinct config and process.
+    key = yaml.safe_dump(config, sort_keys=True)
+    if key not in _simulators:
+        _simulators[key] = InProcessSimulator(config, agentx_dir)
+    return _simulators[key]
+
+
+def work_dir() -> Path:
+    """
+    Directory for the recorder logs of in-process runs. It is the same for
+    all of a process's runs, so their configs (and simulators) are shared,
+    and it is removed at exit.
+    """
+    global _work_dir
+    if _work_dir is None:
+        _work_dir = Path(tempfile.mkdtemp(prefix="agentx-inproc-"))
+        atexit.register(shutil.rmtree, _work_dir, ignore_errors=True)
+    return _work_dir
+
+
+def trace_records(*args, **kwargs) -> np.ndarray:
+    # generate_decode_trace(*args, **kwargs) as binary records, without copying them.
+    buffer = BytesIO()
+    generate_decode_trace(*args, sink=buffer, trace_format="binary", **kwargs)
+    return np.frombuffer(buffer.getbuffer(), dtype="<u8", offset=BINARY_HEADER_SIZE)
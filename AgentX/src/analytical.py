@@ -0,0 +1,118 @@
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.gen_trace import decode_stage_names, decode_stages
+from src.hw_spec import BASE_RATE, DEFAULT_SPEC, HardwareSpec
+from src.model_config import get_decode_shapes
+
+DEFAULT_FAST_MODEL = "./src/fast_model.json"
+
+# (modelsize, context_len) simulated by --calibrate
+CALIBRATION_POINTS = [(size, context_len)
+                      for size in ("8B", "14B", "32B")
+                      for context_len in (512, 2048, 8192, 16384)]
+
+# AgentX_6400 defaults used before calibration: nCCDAB per MACAB, nRCD + nRPab per row.
+DEFAULT_T_CMD = 6.0
+DEFAULT_T_ROW = 32.0
+
+
+def rows_opened(base: int, n_outer: int, n_inner: int, stride: int, spec: HardwareSpec = DEFAULT_SPEC) -> int:
+    # Rows a stage opens in each channel; column index is the lowest address field.
+    n_col = spec.n_col
+    col0 = base // spec.gs["col"]
+    if stride == n_inner:
+        return (col0 + n_outer * n_inner - 1) // n_col - col0 // n_col + 1
+    return sum((col0 + n * stride + n_inner - 1) // n_col - (col0 + n * stride) // n_col + 1
+               for n in range(n_outer))
+
+
+def stage_features(modelsize: str, context_len: float, batch_size: int = 1, dbyte: float = 2,
+                   kv_dbyte: Optional[float] = None, n_query: int = 1,
+                   spec: HardwareSpec = DEFAULT_SPEC) -> Dict[str, tuple]:
+    """
+    Per-stage (MACAB commands, rows opened) of one channel for one decoder
+    layer, in closed form from the stage layout; no trace is generated.
+    """
+    model_config = get_decode_shapes(modelsize, batch_size, context_len, n_query)
+    groups, _ = decode_stages(model_config, spec.n_mac(dbyte), spec,
+                              kv_n_mac=spec.n_mac(dbyte if kv_dbyte is None else kv_dbyte))
+    stages = [stage for group in groups for stage in group]
+    return {name: (n_outer * n_inner, rows_opened(base, n_outer, n_inner, stride, spec))
+            for name, (base, n_outer, n_inner, stride) in zip(decode_stage_names(model_config), stages)}
+
+
+def macab_bound_cycles(modelsize: str, context_len: float, batch_size: int = 1, maxlen: int = 32768,
+                       dbyte: float = 2, kv_dbyte: Optional[float] = None, n_query: int = 1,
+                       spec: HardwareSpec = DEFAULT_SPEC) -> int:
+    """
+    Lower bound on the per-layer cycles of a decode step: every channel issues
+    its MACABs at least nCCDAB cycles apart. Same signature as run_lpddrpim.
+    """
+    per_stage = stage_features(modelsize, context_len, batch_size, dbyte, kv_dbyte, n_query, spec).values()
+    n_cmd = sum(n for n, _ in per_stage)
+    return n_cmd * spec.timings()["nCCDAB"]
+
+
+@dataclass
+class FastModel:
+    """
+    Linear cycle model of the AgentX-NDP memory system:
+        cycles = t_cmd * MACAB commands + t_row * rows opened + t_const
+    with per-channel counts (channels run in lockstep on identical streams).
+    t_row is fitted at BASE_RATE and rescaled to the data rate of other specs,
+    like the row timings; t_cmd (nCCDAB) is counted in clocks.
+    """
+    t_cmd: float = DEFAULT_T_CMD
+    t_row: float = DEFAULT_T_ROW
+    t_const: float = 0.0
+    calibrated: bool = False
+    error: Dict[str, float] = field(default_factory=dict)
+
+    @staticmethod
+    def features(modelsize: str, context_len: float, batch_size: int = 1, dbyte: float = 2,
+                 kv_dbyte: Optional[float] = None, n_query: int = 1,
+                 spec: HardwareSpec = DEFAULT_SPEC) -> List[float]:
+        per_stage = stage_features(modelsize, context_len, batch_size, dbyte, kv_dbyte, n_query, spec).values()
+        return [sum(n_cmd for n_cmd, _ in per_stage), sum(n_row for _, n_row in per_stage), 1.0]
+
+    def cycles(self, modelsize: str, context_len: float, batch_size: int = 1,
+               maxlen: int = 32768, dbyte: float = 2, kv_dbyte: Optional[float] = None,
+               n_query: int = 1, spec: HardwareSpec = DEFAULT_SPEC) -> int:
+        # Same signature as run_lpddrpim, so it can stand in for the simulator.
+        n_cmd, n_row, const = self.features(modelsize, context_len, batch_size, dbyte, kv_dbyte, n_query, spec)
+        t_row = self.t_row * spec.rate / BASE_RATE
+        return int(round(self.t_cmd * n_cmd + t_row * n_row + self.t_const * const))
+
+    @classmethod
+    def fit(cls, points: Sequence[tuple], sim_cycles: Sequence[int],
+            spec: HardwareSpec = DEFAULT_SPEC) -> "FastModel":
+        """
+        Least-squares fit against simulated points, given as run_lpddrpim
+        positional arguments with their simulated cycles on spec.
+        """
+        # Points are run_lpddrpim arguments; features has no maxlen.
+        X = np.array([cls.features(*p[:3], *p[4:7], spec=spec) for p in points])
+        y = np.array(sim_cycles, dtype=float)
+        (t_cmd, t_row, t_const), *_ = np.linalg.lstsq(X, y, rcond=None)
+        model = cls(float(t_cmd), float(t_row) * BASE_RATE / spec.rate, float(t_const), calibrated=True)
+        rel_err = np.abs(np.array([model.cycles(*p, spec=spec) for p in points]) - y) / y
+        model.error = {"points": len(points),
+                       "mean_abs_rel_err": float(rel_err.mean()),
+                       "max_abs_rel_err": float(rel_err.max())}
+        return model
+
+    def save(self, path: str = DEFAULT_FAST_MODEL) -> None:
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_FAST_MODEL) -> "FastModel":
+        if not Path(path).exists():
+            return cls()
+        with open(path) as f:
+            return cls(**json.load(f))
@@ -0,0 +1,215 @@
+import argparse
+import io
+import math
+import time
+
+import gen_trace
+from gen_trace import n_package, n_channel, n_rank, n_bank, n_bg, LPDDR_GS
+from hw_spec import dtype_bytes
+from model_config import get_decode_shapes
+
+
+def run_decode_loop(model_config, n_mac):
+    # Reference: the per-stage loops of the original generator, ported verbatim
+    # (command lists made local, the trace returned instead of written).
+    addr_offset = 0 
+    addr_tmp = 0
+    cmd_qkv_macab      = []
+    cmd_score_macab    = []
+    cmd_context_macab  = []
+    cmd_oproj_macab    = []
+    cmd_ffn1_macab     = []
+    cmd_ffn2_macab     = []
+    cmd_ffn3_macab     = []
+    
+    q_w = model_config["q_proj"]["weight"]
+    for n_idx in range(math.ceil(q_w[1] / n_channel)):
+      for k_idx in range(math.ceil(q_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(q_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    k_w = model_config["k_proj"]["weight"]
+    for n_idx in range(math.ceil(k_w[1] / n_channel)):
+      for k_idx in range(math.ceil(k_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(k_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    v_w = model_config["v_proj"]["weight"]
+    for n_idx in range(math.ceil(v_w[1] / n_channel)):
+      for k_idx in range(math.ceil(v_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(v_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    n_head_per_channel = math.ceil(model_config["meta"]["n_kv"] / n_channel)
+    
+    score_w = model_config["attn_qk"]["weight"]
+    for n_idx in range(math.ceil(score_w[0] * n_head_per_channel / n_mac)):
+      for k_idx in range(math.ceil(score_w[1] / (n_rank * n_bg * n_bank * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(score_w[1] / (n_rank * n_bg * n_bank)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_score_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    context_w = model_config["attn_av"]["matmul_v"] 
+    for n_idx in range(math.ceil(context_w[1] * n_head_per_channel / n_mac)):
+      for k_idx in range(math.ceil(context_w[0] / (n_rank * n_bg * n_bank * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(context_w[0] / (n_rank * n_bg * n_bank)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_context_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    oproj_w = model_config["o_proj"]["weight"]
+    for n_idx in range(math.ceil(oproj_w[1] / n_channel)):
+      for k_idx in range(math.ceil(oproj_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(oproj_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_oproj_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    ffn1_w = model_config["gate_proj"]["weight"]
+    for n_idx in range(math.ceil(ffn1_w[1] / n_channel)):
+      for k_idx in range(math.ceil(ffn1_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(ffn1_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_ffn1_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    ffn2_w = model_config["up_proj"]["weight"]
+    for n_idx in range(math.ceil(ffn2_w[1] / n_channel)):
+      for k_idx in range(math.ceil(ffn2_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(ffn2_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_ffn2_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    ffn3_w = model_config["down_proj"]["weight"]
+    for n_idx in range(math.ceil(ffn3_w[0] / n_channel)):
+      for k_idx in range(math.ceil(ffn3_w[1] / (n_rank * n_bg * n_bank * n_mac * n_package))):
+        for lch in range(n_channel):
+          idx = n_idx * math.ceil(ffn3_w[1] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
+          addr_tmp+=1
+          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
+          hex_addr = hex(addr)[2:]
+          cmd_ffn3_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
+    
+    addr_offset += addr_tmp * LPDDR_GS['col']
+    addr_tmp = 0
+    
+    if(addr_offset > LPDDR_GS['ch']):
+      raise ValueError("Error: exceed the memory size!")
+      
+    ##-- Ovelapping Commands --##
+    barrier = []
+    for lch in range(n_channel):
+      addr = lch * LPDDR_GS['ch']
+      hex_addr = hex(addr)[2:]
+      barrier.append("PIM_BARRIER 0x{0:0>8}".format(hex_addr))
+    
+    total_cmd = []
+    total_cmd += cmd_qkv_macab
+    total_cmd += barrier
+    total_cmd += cmd_score_macab
+    total_cmd += barrier
+    total_cmd += cmd_context_macab
+    total_cmd += barrier
+    total_cmd += cmd_oproj_macab
+    total_cmd += barrier
+    total_cmd += cmd_ffn1_macab
+    total_cmd += barrier
+    total_cmd += cmd_ffn2_macab
+    total_cmd += barrier
+    total_cmd += cmd_ffn3_macab
+    
+    trace_file = io.StringIO()
+    for cmd in total_cmd:
+      trace_file.write(cmd + "\n")
+
+    return trace_file.getvalue().encode(), len(total_cmd)
+
+
+def run_decode_vectorized(model, context_len, batch_size, dbyte):
+  sink = io.BytesIO()
+  n_cmd = gen_trace.generate_decode_trace(model, context_len, batch_size, dbyte=dbyte, sink=sink)
+  return sink.getvalue(), n_cmd
+
+
+def best_of(fn, repeat):
+  best = math.inf
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fn()
+    best = min(best, time.perf_counter() - start)
+  return best, result
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare loop and vectorized trace generation throughput",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("-modelsize", "--modelsize", type=str, nargs="+", default=["8B", "32B", "70B"],
+                      help="model sizes")
+  parser.add_argument("-len", "--contextlen", type=int, nargs="+", default=[2048, 16384, 32768],
+                      help="context lengths")
+  parser.add_argument("-batch", "--batchsize", type=int, default=1,
+                      help="batchsize, default= 1")
+  parser.add_argument("-db", "--dbyte", type=dtype_bytes, default=2,
+                      help="data type: bytes or fp16, bf16, fp8, int8, int4, default= 2")
+  parser.add_argument("-r", "--repeat", type=int, default=3,
+                      help="repetitions, best time is reported")
+  args = parser.parse_args()
+
+  n_mac = int(gen_trace.prefetch_size / args.dbyte)
+  print(f"{'model':>6} {'context':>8} {'commands':>10} {'loop cmd/s':>12} {'numpy cmd/s':>12} {'speedup':>8} {'identical':>9}")
+  for model in args.modelsize:
+    for context_len in args.contextlen:
+      model_config = get_decode_shapes(model, args.batchsize, context_len)
+      t_loop, (ref, n_cmd) = best_of(lambda: run_decode_loop(model_config, n_mac), args.repeat)
+      t_vec, (out, _) = best_of(lambda: run_decode_vectorized(model, context_len, args.batchsize, args.dbyte),
+                                 args.repeat)
+      print(f"{model:>6} {context_len:>8} {n_cmd:>10} {n_cmd / t_loop:>12.3e} {n_cmd / t_vec:>12.3e} "
+            f"{t_loop / t_vec:>7.1f}x {str(out == ref):>9}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,64 @@
+import argparse
+import sys
+from typing import List, Tuple
+
+import numpy as np
+
+## -------------------  AgentXTraceRecorder binary log  -------------------##
+## header  | magic "AGXCMD01" | #levels (uint8) | #commands (uint8)        |
+##         | NUL-terminated command names                                 |
+## records | clk (uint64) | command (uint8) | addr_vec (int32 per level)  |
+## All little endian, one file per channel (<path>.ch<N>).
+CMD_LOG_MAGIC = b"AGXCMD01"
+
+
+def record_dtype(n_levels: int) -> np.dtype:
+    return np.dtype([("clk", "<u8"), ("command", "u1"), ("addr", "<i4", (n_levels,))])
+
+
+def read_cmd_log(path: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Reads a binary command log written by AgentXTraceRecorder. Returns the
+    command names and the records, indexed by command number.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(CMD_LOG_MAGIC):
+        raise ValueError(f"{path} is not a binary AgentXTraceRecorder log")
+    n_levels, n_commands = data[len(CMD_LOG_MAGIC)], data[len(CMD_LOG_MAGIC) + 1]
+    offset = len(CMD_LOG_MAGIC) + 2
+    commands = []
+    for _ in range(n_commands):
+        end = data.index(b"\0", offset)
+        commands.append(data[offset:end].decode())
+        offset = end + 1
+
+    dtype = record_dtype(n_levels)
+    if (len(data) - offset) % dtype.itemsize:
+        raise ValueError(f"{path} ends with a truncated record")
+    return commands, np.frombuffer(data, dtype=dtype, offset=offset)
+
+
+def write_text(commands: List[str], records: np.ndarray, out) -> None:
+    # The "clk, command, addr_vec" lines of the recorder's text format.
+    for clk, command, addr in records:
+        out.write(f"{clk}, {commands[command]}, {', '.join(map(str, addr))}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log",
+                        type=str,
+                        help="binary command log of one channel, e.g. log/AgentX-NDP/cmd.log.ch0")
+    parser.add_argument("-s", "--summary",
+                        action="store_true",
+                        help="print the number of records of every command instead of the records")
+    args = parser.parse_args()
+
+    commands, records = read_cmd_log(args.log)
+    if args.summary:
+        counts = np.bincount(records["command"], minlength=len(commands))
+        for name, count in zip(commands, counts):
+            print(f"{name}: {count}")
+    else:
+        write_text(commands, records, sys.stdout)
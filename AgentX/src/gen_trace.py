@@ -1,28 +1,30 @@
-from model_config import get_decode_shapes
+try:
+  from src.model_config import get_decode_shapes, is_moe
+  from src.hw_spec import DEFAULT_SPEC, HardwareSpec, dtype_bytes
+except ImportError:
+  from model_config import get_decode_shapes, is_moe
+  from hw_spec import DEFAULT_SPEC, HardwareSpec, dtype_bytes
 import argparse
 import math
+import struct
+import sys
+from contextlib import contextmanager
+import numpy as np
 
-# Memory system configuration
-n_package = 6
-n_channel = 8
-n_rank = 1
-n_bank = 4
-n_bg = 4
-n_row = pow(2, 17)
-n_col = pow(2, 6)
-prefetch_size = 32 # byte 16*16/8
+# Memory system configuration of the default hardware spec (see hw_spec.py);
+# every layout function takes a spec, these are kept for scripts.
+n_package = DEFAULT_SPEC.n_package
+n_channel = DEFAULT_SPEC.n_channel
+n_rank = DEFAULT_SPEC.n_rank
+n_bank = DEFAULT_SPEC.n_bank
+n_bg = DEFAULT_SPEC.n_bg
+n_row = DEFAULT_SPEC.n_row
+n_col = DEFAULT_SPEC.n_col
+prefetch_size = DEFAULT_SPEC.prefetch_size # byte 16*16/8
 
 
 # Granularity size
-LPDDR_GS = {}
-LPDDR_GS['col']     = prefetch_size
-LPDDR_GS['row']     = n_col * LPDDR_GS['col']
-LPDDR_GS['ba']      = n_row * LPDDR_GS['row'] 
-LPDDR_GS['bg']      = n_bank * LPDDR_GS['ba'] 
-LPDDR_GS['rank']    = n_bg * LPDDR_GS['bg'] 
-LPDDR_GS['ch']      = n_rank * LPDDR_GS['rank']
-LPDDR_GS['package'] = n_channel * LPDDR_GS['ch']
-LPDDR_GS['AgentX']  = n_package * LPDDR_GS['package']
+LPDDR_GS = DEFAULT_SPEC.gs
 
 
 ## --------------------------------------  LPDDR memory space -----------------------------------------##
@@ -32,179 +34,379 @@ LPDDR_GS['AgentX']  = n_package * LPDDR_GS['package']
 ## ----------------------------  Commands -------------------------------##
 ##               PIM_MACAB       PIM_WRAB      PIM_BARRIER
 
-cmd_qkv_macab      = []
-cmd_score_macab    = []
-cmd_context_macab  = []
-cmd_oproj_macab    = []
-cmd_ffn1_macab     = []
-cmd_ffn2_macab     = []
-cmd_ffn3_macab     = []
-
-def cmd_list_reset():
-  cmd_qkv_macab      = []
-  cmd_score_macab    = []
-  cmd_context_macab  = []
-  cmd_oproj_macab    = []
-  cmd_ffn1_macab     = []
-  cmd_ffn2_macab     = []
-  cmd_ffn3_macab     = []
-
-def run_decode(model_config, trace_file_name):
-
-    addr_offset = 0 
-    addr_tmp = 0
-    cmd_list_reset()
-    
-    q_w = model_config["q_proj"]["weight"]
-    for n_idx in range(math.ceil(q_w[1] / n_channel)):
-      for k_idx in range(math.ceil(q_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(q_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    k_w = model_config["k_proj"]["weight"]
-    for n_idx in range(math.ceil(k_w[1] / n_channel)):
-      for k_idx in range(math.ceil(k_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(k_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    v_w = model_config["v_proj"]["weight"]
-    for n_idx in range(math.ceil(v_w[1] / n_channel)):
-      for k_idx in range(math.ceil(v_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(v_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_qkv_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    n_head_per_channel = math.ceil(model_config["meta"]["n_kv"] / n_channel)
-    
-    score_w = model_config["attn_qk"]["weight"]
-    for n_idx in range(math.ceil(score_w[0] * n_head_per_channel / n_mac)):
-      for k_idx in range(math.ceil(score_w[1] / (n_rank * n_bg * n_bank * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(score_w[1] / (n_rank * n_bg * n_bank)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_score_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    context_w = model_config["attn_av"]["matmul_v"] 
-    for n_idx in range(math.ceil(context_w[1] * n_head_per_channel / n_mac)):
-      for k_idx in range(math.ceil(context_w[0] / (n_rank * n_bg * n_bank * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(context_w[0] / (n_rank * n_bg * n_bank)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_context_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    oproj_w = model_config["o_proj"]["weight"]
-    for n_idx in range(math.ceil(oproj_w[1] / n_channel)):
-      for k_idx in range(math.ceil(oproj_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(oproj_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_oproj_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    ffn1_w = model_config["gate_proj"]["weight"]
-    for n_idx in range(math.ceil(ffn1_w[1] / n_channel)):
-      for k_idx in range(math.ceil(ffn1_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(ffn1_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_ffn1_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    ffn2_w = model_config["up_proj"]["weight"]
-    for n_idx in range(math.ceil(ffn2_w[1] / n_channel)):
-      for k_idx in range(math.ceil(ffn2_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(ffn2_w[0] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_ffn2_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    ffn3_w = model_config["down_proj"]["weight"]
-    for n_idx in range(math.ceil(ffn3_w[0] / n_channel)):
-      for k_idx in range(math.ceil(ffn3_w[1] / (n_rank * n_bg * n_bank * n_mac * n_package))):
-        for lch in range(n_channel):
-          idx = n_idx * math.ceil(ffn3_w[1] / (n_rank * n_bg * n_bank * n_mac * n_package)) + k_idx
-          addr_tmp+=1
-          addr = addr_offset + lch * LPDDR_GS["ch"] + idx * LPDDR_GS["col"]
-          hex_addr = hex(addr)[2:]
-          cmd_ffn3_macab.append("PIM_MACAB 0x{0:0>8}".format(hex_addr))
-    
-    addr_offset += addr_tmp * LPDDR_GS['col']
-    addr_tmp = 0
-    
-    if(addr_offset > LPDDR_GS['ch']):
-      print("Error: exceed the memory size!")
-      exit(0)
-      
-    ##-- Ovelapping Commands --##
-    barrier = []
-    for lch in range(n_channel):
-      addr = lch * LPDDR_GS['ch']
-      hex_addr = hex(addr)[2:]
-      barrier.append("PIM_BARRIER 0x{0:0>8}".format(hex_addr))
-    
-    total_cmd = []
-    total_cmd += cmd_qkv_macab
-    total_cmd += barrier
-    total_cmd += cmd_score_macab
-    total_cmd += barrier
-    total_cmd += cmd_context_macab
-    total_cmd += barrier
-    total_cmd += cmd_oproj_macab
-    total_cmd += barrier
-    total_cmd += cmd_ffn1_macab
-    total_cmd += barrier
-    total_cmd += cmd_ffn2_macab
-    total_cmd += barrier
-    total_cmd += cmd_ffn3_macab
-    
-    trace_file = open(trace_file_name, 'w')
-    for cmd in total_cmd:
-      trace_file.write(cmd + "\n")
-
-    trace_file.close()
+# Opcodes shared with NDPLoadStoreTrace (req_type in NDP_loadstore_trace.cpp)
+OPCODES = {"LD": 0, "ST": 1, "PIM_MACAB": 4, "PIM_WRAB": 5, "PIM_BARRIER": 6}
 
-def main():
-  global dhead, max_L, data_size, n_mac
+## -------------------------  Binary trace format  -------------------------##
+## header | magic "AGXTRC01" (8B) | number of records (uint64 LE)          |
+## record | opcode (bits 63..56) | address (bits 55..0), one uint64 LE     |
+BINARY_MAGIC = b"AGXTRC01"
+BINARY_OP_SHIFT = 56
+
+# Two ASCII hex digits for every byte value, read as one native uint16.
+_HEX_PAIRS = np.frombuffer(
+  b"".join(b"%02x" % v for v in range(256)), dtype=np.uint16)
+_MIN_HEX_WIDTH = 8
+
+## ----------------------  Loop trace format (text)  ----------------------##
+## <cmd>_LOOP base stride_ch n_ch stride_idx n_idx                         ##
+## expands to <cmd> base + i*stride_idx + c*stride_ch for i < n_idx, c < n_ch ##
+## (c varying fastest); plain "<cmd> addr" lines may be mixed in.          ##
+LOOP_SUFFIX = "_LOOP"
+
+# Frontend format NDPLoadStoreTrace reads each generated trace format with
+TRACE_FORMATS = {"text": "text", "loop": "text", "binary": "binary"}
+
+# Commands formatted per chunk; bounds the generator's peak memory.
+CHUNK_CMDS = 1 << 16
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+# PIM_MACAB stages of one decoder layer, in trace order
+STAGE_NAMES = ["q_proj", "k_proj", "v_proj", "attn_qk", "attn_av",
+               "o_proj", "gate_proj", "up_proj", "down_proj"]
+# Barrier-separated stage groups; only score and context depend on the context length
+GROUP_NAMES = ["qkv", "score", "context", "oproj", "ffn1", "ffn2", "ffn3"]
+CONTEXT_GROUPS = ["score", "context"]
+# Groups of an MoE layer: the router GEMV runs before the experts' FFN
+MOE_GROUP_NAMES = ["qkv", "score", "context", "oproj", "router", "ffn1", "ffn2", "ffn3"]
+# Expert FFN stages of an MoE layer, one per activated expert
+EXPERT_STAGE_NAMES = ["gate_proj", "up_proj", "down_proj"]
+
+
+def group_names(model):
+  # Barrier-separated stage groups of model's decoder layer.
+  return MOE_GROUP_NAMES if is_moe(model) else GROUP_NAMES
+
+
+def weight_stage(w, n_mac, spec=DEFAULT_SPEC):
+  # (n_outer, n_inner, stride) of a weight GEMV: output columns are split over
+  # channels, the reduction dimension over all banks of every package.
+  n_banks = spec.n_rank * spec.n_bg * spec.n_bank
+  n_inner = math.ceil(w[0] / (n_banks * n_mac * spec.n_package))
+  return math.ceil(w[1] / spec.n_channel), n_inner, n_inner
+
+
+def attn_stage(n_vec, n_tok, n_mac, n_head_per_channel, spec=DEFAULT_SPEC):
+  # (n_outer, n_inner, stride) of an attention GEMV over the KV cache. Rows are
+  # strided by a single package's token share, as in the original layout.
+  n_banks = spec.n_rank * spec.n_bg * spec.n_bank
+  n_outer = math.ceil(n_vec * n_head_per_channel / n_mac)
+  n_inner = math.ceil(n_tok / (n_banks * spec.n_package))
+  return n_outer, n_inner, math.ceil(n_tok / n_banks)
+
+
+def expert_selection(meta, experts=None, expert_seed=0):
+  """
+  Sorted ids of the experts an MoE layer activates in a decode step: experts
+  if given, otherwise top_k experts sampled per token (every query of every
+  sequence, uniformly, with expert_seed) and merged. None for a dense model.
+  """
+  if "n_experts" not in meta:
+    return None
+  if experts is not None:
+    experts = sorted(set(experts))
+    if not experts or experts[0] < 0 or experts[-1] >= meta["n_experts"]:
+      raise ValueError(f"Expert ids must be in [0, {meta['n_experts']}), got {experts}")
+    return experts
+  rng = np.random.default_rng(expert_seed)
+  active = set()
+  for _ in range(meta["batch"] * meta["queries"]):
+    active.update(rng.choice(meta["n_experts"], meta["top_k"], replace=False).tolist())
+  return sorted(active)
+
+
+def decode_stage_names(model_config, experts=None, expert_seed=0):
+  # Names of the stages decode_stages returns, in trace order.
+  experts = expert_selection(model_config["meta"], experts, expert_seed)
+  if experts is None:
+    return STAGE_NAMES
+  return (STAGE_NAMES[:6] + ["router"] +
+          [f"{name}.{e}" for name in EXPERT_STAGE_NAMES for e in experts])
+
+
+def decode_stages(model_config, n_mac, spec=DEFAULT_SPEC, base_addr=0, experts=None, expert_seed=0,
+                  kv_n_mac=None):
+  """
+  Returns the barrier-separated groups of PIM_MACAB stages of one decoder layer
+  as [[(base, n_outer, n_inner, stride), ...], ...] and the end address offset.
+  The layer is laid out from base_addr of every channel. n_mac is the number
+  of weight elements per MAC and kv_n_mac that of KV cache elements (default
+  n_mac), which sizes the score and context stages.
+
+  For an MoE model the weights of all experts are laid out (expert after
+  expert, per projection), so the offset covers every resident expert, but
+  the FFN groups only hold the stages of the activated experts (see
+  expert_selection); the router GEMV is a group of its own.
+  """
+  meta = model_config["meta"]
+  if kv_n_mac is None:
+    kv_n_mac = n_mac
+  n_head_per_channel = math.ceil(meta["n_kv"] / spec.n_channel)
+  score_w = model_config["attn_qk"]["weight"]
+  context_w = model_config["attn_av"]["matmul_v"]
+  ffn3_w = model_config["down_proj"]["weight"]
+  ffn_shapes = [
+    weight_stage(model_config["gate_proj"]["weight"], n_mac, spec),
+    weight_stage(model_config["up_proj"]["weight"], n_mac, spec),
+    weight_stage([ffn3_w[1], ffn3_w[0]], n_mac, spec),
+  ]
+
+  shapes = [
+    weight_stage(model_config["q_proj"]["weight"], n_mac, spec),
+    weight_stage(model_config["k_proj"]["weight"], n_mac, spec),
+    weight_stage(model_config["v_proj"]["weight"], n_mac, spec),
+    attn_stage(score_w[0], score_w[1], kv_n_mac, n_head_per_channel, spec),
+    attn_stage(context_w[1], context_w[0], kv_n_mac, n_head_per_channel, spec),
+    weight_stage(model_config["o_proj"]["weight"], n_mac, spec),
+  ]
+  experts = expert_selection(meta, experts, expert_seed)
+  if experts is None:
+    shapes += ffn_shapes
+    # o_proj and gate_proj share the same base address; the offset is only
+    # advanced (by both stages) after gate_proj.
+    advance = [True, True, True, True, True, False, True, True, True]
+  else:
+    shapes.append(weight_stage(model_config["router"]["weight"], n_mac, spec))
+    shapes += [shape for shape in ffn_shapes for _ in range(meta["n_experts"])]
+    advance = [True] * len(shapes)
+
+  stages = []
+  addr_offset = base_addr
+  addr_tmp = 0
+  for (n_outer, n_inner, stride), adv in zip(shapes, advance):
+    stages.append((addr_offset, n_outer, n_inner, stride))
+    addr_tmp += n_outer * n_inner * spec.n_channel
+    if adv:
+      addr_offset += addr_tmp * spec.gs['col']
+      addr_tmp = 0
+
+  groups = [stages[0:3], [stages[3]], [stages[4]], [stages[5]]]
+  if experts is None:
+    groups += [[stages[6]], [stages[7]], [stages[8]]]
+  else:
+    expert_stages = stages[7:]
+    groups.append([stages[6]])
+    groups += [[expert_stages[i * meta["n_experts"] + e] for e in experts] for i in range(len(ffn_shapes))]
+  return groups, addr_offset
+
+
+def layout_footprint(model, context_len, batch_size=1, dbyte=2, spec=DEFAULT_SPEC, kv_dbyte=None, n_query=1):
+  # Bytes per channel the decoder layer layout of model occupies on spec
+  # (dbyte-wide weights, kv_dbyte-wide KV cache, default dbyte).
+  model_config = get_decode_shapes(model, batch_size, context_len, n_query)
+  _, addr_offset = decode_stages(model_config, spec.n_mac(dbyte), spec,
+                                 kv_n_mac=spec.n_mac(dbyte if kv_dbyte is None else kv_dbyte))
+  return addr_offset
+
+
+def weights_base(model, context_len, batch_size=1, dbyte=2, spec=DEFAULT_SPEC, base_addr=0,
+                 kv_dbyte=None, n_query=1):
+  # Address the stages after score/context (o_proj onwards) are laid out from:
+  # the only part of the weight groups' addresses the context length moves.
+  model_config = get_decode_shapes(model, batch_size, context_len, n_query)
+  groups, _ = decode_stages(model_config, spec.n_mac(dbyte), spec, base_addr,
+                            kv_n_mac=spec.n_mac(dbyte if kv_dbyte is None else kv_dbyte))
+  return groups[3][0][0]
+
+
+def stage_len(stage, spec=DEFAULT_SPEC):
+  _, n_outer, n_inner, _ = stage
+  return n_outer * n_inner * spec.n_channel
+
+
+def stage_addrs(base, n_outer, n_inner, stride, start=0, stop=None, spec=DEFAULT_SPEC):
+  # Addresses of commands [start, stop) in (n_idx, k_idx, lch) order, lch
+  # varying fastest.
+  if stop is None:
+    stop = n_outer * n_inner * spec.n_channel
+  gs = spec.gs
+  row, lch = np.divmod(np.arange(start, stop, dtype=np.int64), spec.n_channel)
+  n_idx, k_idx = np.divmod(row, n_inner)
+  return base + (n_idx * stride + k_idx) * gs["col"] + lch * gs["ch"]
+
+
+def format_cmds(cmd, addrs):
+  """
+  Formats "<cmd> 0x%08x\n" for every address into one bytes object. Digits are
+  rendered as a fixed-width byte matrix and the surplus leading zeros of the
+  narrower addresses are masked out, so no per-command Python work is done.
+  """
+  addrs = np.asarray(addrs, dtype=np.uint64)
+  if addrs.size == 0:
+    return b""
+  width = max(_MIN_HEX_WIDTH, (int(addrs.max()).bit_length() + 3) // 4)
+  be_bytes = addrs.astype(">u8").view(np.uint8).reshape(-1, 8)
+  digits = _HEX_PAIRS[be_bytes].view(np.uint8)[:, 16 - width:]
+
+  prefix = np.frombuffer(cmd.encode() + b" 0x", dtype=np.uint8)
+  lines = np.empty((addrs.size, prefix.size + width + 1), dtype=np.uint8)
+  lines[:, :prefix.size] = prefix
+  lines[:, prefix.size:-1] = digits
+  lines[:, -1] = ord("\n")
+  if width == _MIN_HEX_WIDTH:
+    return lines.tobytes()
+
+  # Leading zeros beyond the %08x padding are dropped per address.
+  n_pad = np.full(addrs.size, width - _MIN_HEX_WIDTH, dtype=np.int64)
+  for n_digits in range(_MIN_HEX_WIDTH, width):
+    n_pad -= addrs >= np.uint64(1 << (4 * n_digits))
+  keep = np.ones(lines.shape, dtype=bool)
+  keep[:, prefix.size:-1] = np.arange(width)[None, :] >= n_pad[:, None]
+  return lines[keep].tobytes()
 
+
+def pack_cmds(cmd, addrs):
+  # Binary records: one little-endian uint64 per command, opcode in the top byte.
+  addrs = np.asarray(addrs, dtype=np.uint64)
+  if addrs.size and int(addrs.max()) >> BINARY_OP_SHIFT:
+    raise ValueError(f"Address {int(addrs.max()):#x} does not fit a binary trace record.")
+  op = np.uint64(OPCODES[cmd] << BINARY_OP_SHIFT)
+  return (addrs | op).astype("<u8").tobytes()
+
+
+def decode_addr_chunks(groups, chunk_cmds=CHUNK_CMDS, spec=DEFAULT_SPEC):
+  """
+  Yields (cmd, addrs) for one decoder layer in trace order, at most chunk_cmds
+  addresses at a time, with a PIM_BARRIER per channel between stage groups.
+  """
+  ##-- Ovelapping Commands --##
+  barrier = np.arange(spec.n_channel, dtype=np.int64) * spec.gs['ch']
+
+  for i, group in enumerate(groups):
+    if i > 0:
+      yield "PIM_BARRIER", barrier
+    for stage in group:
+      n_cmd = stage_len(stage, spec)
+      for start in range(0, n_cmd, chunk_cmds):
+        yield "PIM_MACAB", stage_addrs(*stage, start, min(start + chunk_cmds, n_cmd), spec=spec)
+
+
+def decode_cmd_chunks(groups, chunk_cmds=CHUNK_CMDS, spec=DEFAULT_SPEC):
+  # Text trace of one decoder layer as bytes chunks.
+  for cmd, addrs in decode_addr_chunks(groups, chunk_cmds, spec):
+    yield format_cmds(cmd, addrs)
+
+
+def stage_loops(base, n_outer, n_inner, stride, spec=DEFAULT_SPEC):
+  # (base, n_idx) of the loops covering a stage: one for a contiguous stage,
+  # otherwise one per strided row.
+  if stride == n_inner:
+    return [(base, n_outer * n_inner)]
+  return [(base + n_idx * stride * spec.gs["col"], n_inner) for n_idx in range(n_outer)]
+
+
+def format_loop(cmd, base, stride_ch, n_ch, stride_idx, n_idx):
+  return b"%s%s 0x%08x 0x%x %d 0x%x %d\n" % (cmd.encode(), LOOP_SUFFIX.encode(),
+                                              base, stride_ch, n_ch, stride_idx, n_idx)
+
+
+def decode_loop_chunks(groups, spec=DEFAULT_SPEC):
+  """
+  Loop trace of one decoder layer as bytes chunks: the same command stream as
+  decode_cmd_chunks, but one line per stage (or strided row) and per barrier.
+  """
+  gs = spec.gs
+  for i, group in enumerate(groups):
+    if i > 0:
+      yield format_loop("PIM_BARRIER", 0, gs['ch'], spec.n_channel, 0, 1)
+    for stage in group:
+      if stage_len(stage, spec) == 0:
+        continue
+      yield b"".join(format_loop("PIM_MACAB", base, gs['ch'], spec.n_channel, gs['col'], n_idx)
+                     for base, n_idx in stage_loops(*stage, spec=spec))
+
+
+def trace_len(groups, spec=DEFAULT_SPEC):
+  # Number of commands in the layer trace, barriers included.
+  return (sum(stage_len(stage, spec) for group in groups for stage in group) +
+          (len(groups) - 1) * spec.n_channel)
+
+
+@contextmanager
+def open_sink(sink):
+  # A path is opened (and closed) here; a binary file-like object is used as is.
+  if hasattr(sink, "write"):
+    yield sink
+  else:
+    with open(sink, 'wb', buffering=WRITE_BUFFER_SIZE) as trace_file:
+      yield trace_file
+
+
+def write_trace(chunks, trace_file):
+  for chunk in chunks:
+    trace_file.write(chunk)
+
+
+def write_binary_trace(addr_chunks, n_records, trace_file):
+  trace_file.write(BINARY_MAGIC + struct.pack("<Q", n_records))
+  for cmd, addrs in addr_chunks:
+    trace_file.write(pack_cmds(cmd, addrs))
+
+
+def generate_decode_trace(model, context_len, batch_size=1, maxlen=32768, dbyte=2,
+                          sink="AgentX-NDP.trace", trace_format="text", chunk_cmds=CHUNK_CMDS,
+                          groups=None, trailing_barrier=False, spec=DEFAULT_SPEC, base_addr=0,
+                          experts=None, expert_seed=0, kv_dbyte=None, n_query=1):
+  """
+  Generates the NDP trace of one decoder layer and writes it to sink (a path or
+  a binary file-like object). Holds no state between calls.
+
+  groups optionally restricts the trace to a subset of group_names(model)
+  (still at their full-layout addresses and separated by barriers). trailing_barrier
+  appends a barrier after the last group, so its end is timestamped as well.
+
+  spec is the HardwareSpec the layer is laid out on, from base_addr of every
+  channel (the model's region, see placement.py).
+
+  For an MoE model, experts lists the activated expert ids; by default they
+  are sampled with expert_seed (see expert_selection). All experts stay
+  resident, so the capacity check covers every expert's weights.
+
+  dbyte is the size (B) of a weight element and kv_dbyte that of a KV cache
+  element (default dbyte); e.g. 0.5 for int4 weights packs twice as many
+  elements per MAC as 1 (int8 or fp8), halving the weight stages' MACABs.
+
+  n_query > 1 traces a multi-token pass, e.g. the verification of n_query - 1
+  draft tokens in speculative decoding. As with the sequences of a batch in
+  the weight stages, every MACAB serves all queries of a sequence, so the
+  pass costs a decode step over n_query - 1 more KV cache tokens.
+
+  maxlen is accepted for CLI compatibility; the layout does not depend on it.
+  trace_format is "text", "binary" or "loop" (PIM_MACAB_LOOP lines, expanded
+  by the frontend). Returns the number of commands, with loops expanded. Raises ValueError if the layout does
+  not fit one channel.
+  """
+  n_mac = spec.n_mac(dbyte)
+  kv_n_mac = spec.n_mac(dbyte if kv_dbyte is None else kv_dbyte)
+  model_config = get_decode_shapes(model, batch_size, context_len, n_query)
+  all_groups, addr_offset = decode_stages(model_config, n_mac, spec, base_addr, experts, expert_seed, kv_n_mac)
+  if groups is None:
+    groups = all_groups
+  else:
+    groups = [all_groups[group_names(model).index(name)] for name in groups]
+  if trailing_barrier:
+    groups = groups + [[]]
+
+  if(addr_offset > spec.gs['ch']):
+    raise ValueError(f"Error: exceed the memory size! ({model}, context {context_len}, batch {batch_size} "
+                     f"needs {addr_offset - base_addr} B per channel from {base_addr:#x}, "
+                     f"{spec.gs['ch']} B available)")
+
+  if trace_format not in TRACE_FORMATS:
+    raise ValueError(f"Unknown trace format: {trace_format}")
+
+  n_cmd = trace_len(groups, spec)
+  with open_sink(sink) as trace_file:
+    if trace_format == "binary":
+      write_binary_trace(decode_addr_chunks(groups, chunk_cmds, spec), n_cmd, trace_file)
+    elif trace_format == "loop":
+      write_trace(decode_loop_chunks(groups, spec), trace_file)
+    else:
+      write_trace(decode_cmd_chunks(groups, chunk_cmds, spec), trace_file)
+  return n_cmd
+
+def main():
   parser = argparse.ArgumentParser(description="Output path and operation infos",
                                formatter_class=argparse.ArgumentDefaultsHelpFormatter)
   parser.add_argument("-modelsize", "--modelsize", type=str, default="32B", 
@@ -213,33 +415,52 @@ def main():
                         help="context length, default= 8192")
   parser.add_argument("-batch", "--batchsize", type=int, default=1, 
                         help="batchsize, default= 1")
+  parser.add_argument("-nq", "--queries", type=int, default=1,
+                        help="query tokens per sequence (draft tokens + 1 for a speculative verify pass), default= 1")
   parser.add_argument("-maxl", "--maxlen", type=int, default=32768, 
                         help="maximum L, default= 32768") 
-  parser.add_argument("-db", "--dbyte", type=int, default=2, 
-                      help="data type (B), default= 2")
+  parser.add_argument("-db", "--dbyte", type=dtype_bytes, default=2, 
+                      help="weight data type: bytes or fp16, bf16, fp8, int8, int4, default= 2")
+  parser.add_argument("-kvdb", "--kvdbyte", type=dtype_bytes, default=None,
+                      help="KV cache data type, like -db; default= -db")
+  parser.add_argument("-chunk", "--chunkcmds", type=int, default=CHUNK_CMDS,
+                      help="commands formatted per write")
+  parser.add_argument("-fmt", "--format", type=str, default="text", choices=list(TRACE_FORMATS),
+                      help="trace file format")
   parser.add_argument("-o", "--output", type=str, default="AgentX-NDP.trace", 
-                      help="output path")
+                      help="output path, - for stdout (e.g. piped into AgentX with path: -)")
+  parser.add_argument("-hw", "--hwspec", type=str, default=None,
+                      help="hardware spec file (YAML/JSON), default= AgentX-NDP defaults")
+  parser.add_argument("-base", "--baseaddr", type=lambda v: int(v, 0), default=0,
+                      help="per-channel address the layer is laid out from (see placement.py)")
+  parser.add_argument("-experts", "--experts", type=lambda v: [int(e) for e in v.split(",")], default=None,
+                      help="activated expert ids of an MoE model, e.g. 0,5,17; default= sampled per token")
+  parser.add_argument("-eseed", "--expertseed", type=int, default=0,
+                      help="seed of the sampled expert selection of an MoE model")
 
   args = parser.parse_args()
+  # With the trace on stdout, the log goes to stderr.
+  log = sys.stderr if args.output == "-" else sys.stdout
 
-  model = args.modelsize.lower()
-  context_len = args.contextlen
-  batch_size = args.batchsize
-  model_config = get_decode_shapes(model, batch_size, context_len)
-  max_L = args.maxlen
-  data_size = args.dbyte
-  n_mac = int(prefetch_size / data_size)
-
-  print("------   Make a trace of bank-level AttAcc   ------")
+  print("------   Make a trace of bank-level AttAcc   ------", file=log)
 
   args_dict = vars(args)
-  print("All Arguments:")
+  print("All Arguments:", file=log)
   for key, value in args_dict.items():
-      print(f"     {key}: {value}")
-  print("---------------------------------------------------")
+      print(f"     {key}: {value}", file=log)
+  print("---------------------------------------------------", file=log)
 
-  run_decode(model_config, args.output)
+  try:
+    spec = HardwareSpec.load(args.hwspec) if args.hwspec else DEFAULT_SPEC
+    sink = sys.stdout.buffer if args.output == "-" else args.output
+    generate_decode_trace(args.modelsize, args.contextlen, args.batchsize, args.maxlen, args.dbyte,
+                          sink, args.format, args.chunkcmds, spec=spec, base_addr=args.baseaddr,
+                          experts=args.experts, expert_seed=args.expertseed, kv_dbyte=args.kvdbyte,
+                          n_query=args.queries)
+  except ValueError as e:
+    print(e, file=log)
+    exit(1)
 
 
 if __name__ == "__main__":
-  main()
\ No newline at end of file
+  main()
@@ -0,0 +1,200 @@
+import argparse
+import math
+import sys
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict
+
+import yaml
+
+# m_internal_prefetch_size of the AgentX-NDP device (AgentXNDP.cpp)
+INTERNAL_PREFETCH = 16
+
+# Device densities (Mb) AgentXNDP.cpp has refresh timings and org presets for
+DENSITIES_MB = (2048, 4096, 8192, 16384, 32768)
+
+# AgentX_6400 timing preset (AgentXNDP.cpp), in cycles at BASE_RATE MT/s
+BASE_RATE = 6400
+BASE_TIMINGS = {
+    "nBL16": 4, "nCL": 20, "nRCD": 15, "nRPab": 17, "nRPpb": 15, "nRAS": 34, "nRC": 30,
+    "nWR": 28, "nRTP": 4, "nCWL": 11, "nCCD": 4, "nCCDAB": 6, "nRRD": 4, "nRRDAB": 6,
+    "nWTRS": 5, "nWTRL": 10, "nFAW": 16, "nPPD": 2, "nCS": 2,
+}
+# Timings counted in command clocks; the others are fixed in ns and rescaled
+# to the data rate.
+CLOCK_TIMINGS = {"nBL16", "nCCD", "nCCDAB", "nPPD", "nCS"}
+
+# Bytes per element of the precisions weights and KV caches can be stored in
+DTYPE_BYTES = {"fp32": 4, "fp16": 2, "bf16": 2, "fp8": 1, "int8": 1, "int4": 0.5}
+
+
+def is_pow2(n: int) -> bool:
+    return n > 0 and n & (n - 1) == 0
+
+
+def dtype_bytes(value: str) -> float:
+    # Bytes per element of a precision name (DTYPE_BYTES) or of a size in bytes, e.g. "int4" or "2".
+    if value.lower() in DTYPE_BYTES:
+        return DTYPE_BYTES[value.lower()]
+    try:
+        size = float(value)
+    except ValueError:
+        raise ValueError(f"Unknown data type {value} (use bytes or one of {', '.join(DTYPE_BYTES)})") from None
+    if size <= 0:
+        raise ValueError(f"Data type size must be positive, got {value}")
+    return int(size) if size.is_integer() else size
+
+
+@dataclass(frozen=True)
+class HardwareSpec:
+    """
+    AgentX-NDP hardware description. The trace generator lays models out on
+    this geometry and the DRAM section of the simulator config is generated
+    from it, so the two cannot disagree.
+
+    n_package packages of n_channel channels each; a channel holds n_rank ranks
+    of n_bg bank groups of n_bank banks with n_row rows of n_col columns.
+    Only one package is simulated; the others process their share of every
+    reduction in lockstep.
+    """
+    n_package: int = 6
+    n_channel: int = 8
+    n_rank: int = 1
+    n_bg: int = 4
+    n_bank: int = 4
+    n_row: int = 2 ** 17
+    n_col: int = 2 ** 6
+    channel_width: int = 16
+    rate: int = BASE_RATE
+
+    def __post_init__(self) -> None:
+        for name in ("n_channel", "n_rank", "n_bg", "n_bank", "n_row", "n_col", "channel_width"):
+            if not is_pow2(getattr(self, name)):
+                raise ValueError(f"HardwareSpec.{name} must be a power of two, got {getattr(self, name)}")
+        if self.n_package < 1 or self.rate <= 0:
+            raise ValueError(f"HardwareSpec needs n_package >= 1 and rate > 0, got {self.n_package} and {self.rate}")
+        if self.density_mb not in DENSITIES_MB:
+            raise ValueError(f"HardwareSpec density {self.density_mb} Mb is not supported by AgentX-NDP "
+                             f"(supported: {', '.join(map(str, DENSITIES_MB))} Mb)")
+
+    @property
+    def prefetch_size(self) -> int:
+        # Bytes per column access (16*16/8).
+        return INTERNAL_PREFETCH * self.channel_width // 8
+
+    @property
+    def density_mb(self) -> int:
+        return (self.n_bg * self.n_bank * self.n_row * self.n_col * self.channel_width * INTERNAL_PREFETCH) >> 20
+
+    @property
+    def gs(self) -> Dict[str, int]:
+        # Granularity size (bytes) of every address level, column first.
+        gs = {}
+        gs['col']     = self.prefetch_size
+        gs['row']     = self.n_col * gs['col']
+        gs['ba']      = self.n_row * gs['row']
+        gs['bg']      = self.n_bank * gs['ba']
+        gs['rank']    = self.n_bg * gs['bg']
+        gs['ch']      = self.n_rank * gs['rank']
+        gs['package'] = self.n_channel * gs['ch']
+        gs['AgentX']  = self.n_package * gs['package']
+        return gs
+
+    @property
+    def capacity(self) -> int:
+        # Bytes over all packages.
+        return self.gs['AgentX']
+
+    @property
+    def capacity_gb(self) -> float:
+        return self.capacity / 2 ** 30
+
+    @property
+    def tck_ns(self) -> float:
+        # Two transfers per clock: 6400 MT/s -> 0.3125 ns per tick.
+        return 2000 / self.rate
+
+    def n_mac(self, dbyte: float) -> int:
+        # Elements per MAC: one column access of dbyte-wide values (int4: two per byte).
+        n_mac = int(self.prefetch_size / dbyte)
+        if n_mac < 1:
+            raise ValueError(f"{dbyte} B elements do not fit a {self.prefetch_size} B column access")
+        return n_mac
+
+    def timings(self) -> Dict[str, int]:
+        # AgentX_6400 timings at this data rate.
+        scale = self.rate / BASE_RATE
+        return {name: cycles if name in CLOCK_TIMINGS else math.ceil(cycles * scale - 1e-9)
+                for name, cycles in BASE_TIMINGS.items()}
+
+    def dram_config(self) -> Dict[str, Any]:
+        """
+        DRAM section of the simulator config. Presets are used where the spec
+        matches them, so the default spec reproduces AgentX.yaml.
+        """
+        preset_org = (self.channel_width == 16 and self.n_rank == 1 and self.n_bg == 4 and
+                      self.n_bank == 4 and self.n_col == 2 ** 6)
+        if preset_org:
+            org = {"preset": f"AgentX_{self.density_mb >> 10}Gb_x16",
+                   "channel_width": self.channel_width, "channel": self.n_channel}
+        else:
+            org = {"channel_width": self.channel_width, "dq": self.channel_width, "density": self.density_mb,
+                   "channel": self.n_channel, "rank": self.n_rank, "bankgroup": self.n_bg,
+                   "bank": self.n_bank, "row": self.n_row, "column": self.n_col}
+        if self.rate == BASE_RATE:
+            timing = {"preset": f"AgentX_{BASE_RATE}"}
+        else:
+            timing = {"rate": self.rate, **self.timings()}
+        return {"impl": "AgentX-NDP", "org": org, "timing": timing}
+
+    def apply(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        # Replaces the DRAM section of a loaded simulator config in place.
+        config["MemorySystem"]["DRAM"] = self.dram_config()
+        return config
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+    @classmethod
+    def load(cls, path: str) -> "HardwareSpec":
+        # YAML or JSON mapping of HardwareSpec fields; omitted fields keep their defaults.
+        with open(path) as f:
+            values = yaml.safe_load(f) or {}
+        unknown = set(values) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown hardware spec fields in {path}: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            yaml.safe_dump(self.as_dict(), f, sort_keys=False)
+
+
+DEFAULT_SPEC = HardwareSpec()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a simulator config for a hardware spec",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-hw", "--hwspec", type=str, default=None,
+                        help="hardware spec file (YAML/JSON), default= AgentX-NDP defaults")
+    parser.add_argument("-i", "--input", type=str, default="../AgentX.yaml",
+                        help="simulator config the DRAM section is replaced in")
+    parser.add_argument("-o", "--output", type=str, default="-",
+                        help="output path, - for stdout (the input's comments are not kept, so write a new file)")
+    args = parser.parse_args()
+
+    spec = HardwareSpec.load(args.hwspec) if args.hwspec else DEFAULT_SPEC
+    with open(args.input) as f:
+        config = yaml.safe_load(f)
+    if args.output == "-":
+        yaml.safe_dump(spec.apply(config), sys.stdout, sort_keys=False)
+    else:
+        with open(args.output, "w") as f:
+            yaml.safe_dump(spec.apply(config), f, sort_keys=False)
+    # With the config on stdout, the summary goes to stderr.
+    print(f"{args.output}: {spec.n_package} x {spec.n_channel} channels, {spec.density_mb >> 10} Gb, "
+          f"{spec.rate} MT/s, {spec.capacity_gb:.0f} GB", file=sys.stderr if args.output == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
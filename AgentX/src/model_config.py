@@ -31,16 +31,50 @@ model_config = {
         "n_kv":     8,
         "d_head":   128,
     },
-    
+
+    # Mixture-of-Experts: every FFN is n_experts experts of width d_ff_expert,
+    # of which a router activates top_k per token.
+    "30B-A3B": {
+        "layer":        48,
+        "d_model":      2048,
+        "n_heads":      32,
+        "n_kv":         4,
+        "d_head":       128,
+        "n_experts":    128,
+        "top_k":        8,
+        "d_ff_expert":  768,
+    },
+    "235B-A22B": {
+        "layer":        94,
+        "d_model":      4096,
+        "n_heads":      64,
+        "n_kv":         4,
+        "d_head":       128,
+        "n_experts":    128,
+        "top_k":        8,
+        "d_ff_expert":  1536,
+    },
 }
 
-def get_decode_shapes(model_name: str, batch_size: int, context_len: int):
+def model_params(model_name: str) -> int:
+    # Total parameters (B) in a model name, e.g. 30 for 30B-A3B.
+    return int(model_name.upper().partition("B")[0])
+
+def is_moe(model_name: str) -> bool:
+    return "n_experts" in model_config[model_name.upper()]
+
+def get_decode_shapes(model_name: str, batch_size: int, context_len: int, n_query: int = 1):
+    # n_query > 1 is a multi-token pass over every sequence (e.g. verifying
+    # n_query - 1 draft tokens): its queries attend to the draft tokens too.
     cfg = model_config[model_name.upper()]
     d_model = cfg["d_model"]
-    d_ff    = cfg["d_ff"]
+    # The FFN shapes of an MoE model are those of one expert.
+    d_ff    = cfg["d_ff_expert"] if "n_experts" in cfg else cfg["d_ff"]
     n_heads = cfg["n_heads"]
     n_kv    = cfg["n_kv"]
     d_head  = cfg["d_head"]
+    n_tok   = batch_size * n_query
+    kv_len  = context_len + n_query - 1
 
     shapes = {
         "meta": {
@@ -52,57 +86,67 @@ def get_decode_shapes(model_name: str, batch_size: int, context_len: int):
             "d_head":    d_head,
             "batch":     batch_size,
             "context":   context_len,
+            "queries":   n_query,
         },
 
         # ========= Stage 1: Q / K / V projection =========
         "q_proj": {
-            "input":  [batch_size, d_model],
+            "input":  [n_tok, d_model],
             "weight": [d_model, n_heads * d_head],     
-            "output": [batch_size, n_heads * d_head],  
+            "output": [n_tok, n_heads * d_head],  
         },
         "k_proj": {
-            "input":  [batch_size, d_model],
+            "input":  [n_tok, d_model],
             "weight": [d_model, n_kv * d_head],        
-            "output": [batch_size, n_kv * d_head],
+            "output": [n_tok, n_kv * d_head],
         },
         "v_proj": {
-            "input":  [batch_size, d_model],
+            "input":  [n_tok, d_model],
             "weight": [d_model, n_kv * d_head],
-            "output": [batch_size, n_kv * d_head],
+            "output": [n_tok, n_kv * d_head],
         },
 
         # ========= Stage 2: Attention=========
         "attn_qk": {
-            "weight":  [batch_size * d_head, context_len],
+            "weight":  [batch_size * d_head, kv_len],
         },
         "attn_av": {
-            "matmul_v":     [context_len, batch_size * d_head],
+            "matmul_v":     [kv_len, batch_size * d_head],
         },
         # O projection
         "o_proj": {
-            "input":  [batch_size, n_heads * d_head],  
+            "input":  [n_tok, n_heads * d_head],  
             "weight": [n_heads * d_head, d_model], 
-            "output": [batch_size, d_model],
+            "output": [n_tok, d_model],
         },
 
         # ========= Stage 3: FFN (SwiGLU) =========
         "gate_proj": {
-            "input":  [batch_size, d_model],
+            "input":  [n_tok, d_model],
             "weight": [d_model, d_ff],                 
-            "output": [batch_size, d_ff],
+            "output": [n_tok, d_ff],
         },
         "up_proj": {
-            "input":  [batch_size, d_model],
+            "input":  [n_tok, d_model],
             "weight": [d_model, d_ff],
-            "output": [batch_size, d_ff],
+            "output": [n_tok, d_ff],
         },
         "down_proj": {
-            "input":  [batch_size, d_ff],
+            "input":  [n_tok, d_ff],
             "weight": [d_ff, d_model],
-            "output": [batch_size, d_model],
+            "output": [n_tok, d_model],
         },
     }
 
+    if "n_experts" in cfg:
+        shapes["meta"].update(n_experts=cfg["n_experts"], top_k=cfg["top_k"])
+        # ========= Router: expert scores of every token =========
+        shapes["router"] = {
+            "input":  [n_tok, d_model],
+            "weight": [d_model, cfg["n_experts"]],
+            "output": [n_tok, cfg["n_experts"]],
+        }
+
     return shapes
 
 # print(default_agent_config.agent_config["SWE-bench"]["planner"].decode)
@@ -0,0 +1,175 @@
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    from src.gen_trace import layout_footprint
+    from src.hw_spec import DEFAULT_SPEC, HardwareSpec, dtype_bytes
+    from src.model_config import model_config
+except ImportError:
+    from gen_trace import layout_footprint
+    from hw_spec import DEFAULT_SPEC, HardwareSpec, dtype_bytes
+    from model_config import model_config
+
+
+@dataclass(frozen=True)
+class Region:
+    """
+    Per-channel address range [base, base + size) a model occupies on every
+    channel: n_layer decoder layers of layer_size bytes each, laid out like
+    layer 0 (the one traced) with the KV cache reserved for reserve_len tokens
+    of n_seq sequences.
+    """
+    model: str
+    base: int
+    layer_size: int
+    n_layer: int
+    n_seq: int
+    reserve_len: int
+
+    @property
+    def size(self) -> int:
+        return self.layer_size * self.n_layer
+
+    @property
+    def end(self) -> int:
+        return self.base + self.size
+
+
+class PlacementError(ValueError):
+    """The models do not fit the per-channel address space together."""
+
+    def __init__(self, footprints: Dict[str, int], available: int, spec: HardwareSpec) -> None:
+        self.footprints = footprints
+        self.required = sum(footprints.values())
+        self.available = available
+        self.spec = spec
+        parts = ", ".join(f"{model} {size / 2 ** 20:.1f} MB" for model, size in footprints.items())
+        super().__init__(f"Models do not fit: {self.required / 2 ** 20:.1f} MB per channel needed "
+                         f"({parts}), {available / 2 ** 20:.1f} MB available")
+
+
+@dataclass(frozen=True)
+class Placement:
+    """Regions of the resident models on spec, in address order."""
+    regions: Tuple[Region, ...]
+    spec: HardwareSpec
+
+    def __getitem__(self, model: str) -> Region:
+        for region in self.regions:
+            if region.model == model.upper():
+                return region
+        raise KeyError(f"{model} has no region (placed: {', '.join(r.model for r in self.regions)})")
+
+    @property
+    def used(self) -> int:
+        return self.regions[-1].end if self.regions else 0
+
+    @property
+    def available(self) -> int:
+        return self.spec.gs['ch']
+
+    def base_addr(self, model: str, context_len: float) -> int:
+        # Base address a decode trace of model at context_len is generated from.
+        region = self[model]
+        if context_len > region.reserve_len:
+            raise ValueError(f"{model} at context {context_len} overflows its region "
+                             f"(KV reserved for {region.reserve_len} tokens)")
+        return region.base
+
+    def rows(self) -> List[dict]:
+        return [{"model": r.model, "base": f"{r.base:#x}", "end": f"{r.end:#x}",
+                 "layers": r.n_layer, "sequences": r.n_seq, "reserve_len": r.reserve_len,
+                 "MB/ch": round(r.size / 2 ** 20, 1), "share": round(r.size / self.available, 3)}
+                for r in self.regions]
+
+
+def align_up(n: int, align: int) -> int:
+    return -(-n // align) * align
+
+
+def model_footprint(model: str, reserve_len: int, n_seq: int = 1, dbyte: float = 2,
+                    spec: HardwareSpec = DEFAULT_SPEC, kv_dbyte: Optional[float] = None) -> Tuple[int, int]:
+    """
+    (layer size, number of layers) of model on spec, from its decode shapes.
+    Layers are row aligned, so no DRAM row holds data of two layers or models.
+    """
+    layer_size = layout_footprint(model, reserve_len, n_seq, dbyte, spec, kv_dbyte)
+    return align_up(layer_size, spec.gs['row']), model_config[model.upper()]["layer"]
+
+
+def plan_placement(models: Mapping[str, int], reserve_len: int, dbyte: float = 2,
+                   spec: HardwareSpec = DEFAULT_SPEC, kv_dbyte: Optional[float] = None) -> Placement:
+    """
+    Packs models ({model size: sequences whose KV cache it holds}) into the
+    per-channel address space of spec, largest first. Footprints are computed
+    analytically, so no trace is generated; raises PlacementError if the
+    models do not fit together.
+    """
+    sized = []
+    for model, n_seq in models.items():
+        layer_size, n_layer = model_footprint(model, reserve_len, n_seq, dbyte, spec, kv_dbyte)
+        sized.append(Region(model.upper(), 0, layer_size, n_layer, n_seq, reserve_len))
+    sized.sort(key=lambda r: r.size, reverse=True)
+
+    footprints = {r.model: r.size for r in sized}
+    if sum(footprints.values()) > spec.gs['ch']:
+        raise PlacementError(footprints, spec.gs['ch'], spec)
+
+    regions, base = [], 0
+    for r in sized:
+        regions.append(Region(r.model, base, r.layer_size, r.n_layer, r.n_seq, r.reserve_len))
+        base += r.size
+    return Placement(tuple(regions), spec)
+
+
+def resident_models(config, datasets: Sequence[str]) -> Dict[str, int]:
+    """
+    Models the agent roles of datasets keep resident, as {model: sequences}.
+    Roles sharing a model share its weights and each keep a KV cache; a
+    role's draft model (speculative decoding) keeps one for the role as well.
+    """
+    models: Dict[str, int] = {}
+    for dataset in datasets:
+        per_dataset: Dict[str, int] = {}
+        for agent in config[dataset].values():
+            for model in (agent.model, agent.draft_model):
+                if model:
+                    per_dataset[model] = per_dataset.get(model, 0) + 1
+        for model, n_seq in per_dataset.items():
+            models[model] = max(models.get(model, 0), n_seq)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan the regions of models resident together",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--models", type=str, nargs="+", default=["32B:3", "14B", "8B"],
+                        help="model sizes, each optionally with the number of sequences it serves (32B:3)")
+    parser.add_argument("-maxl", "--maxlen", type=int, default=32768,
+                        help="context length the KV caches are reserved for")
+    parser.add_argument("-db", "--dbyte", type=dtype_bytes, default=2,
+                        help="weight data type: bytes or fp16, bf16, fp8, int8, int4, default= 2")
+    parser.add_argument("-kvdb", "--kvdbyte", type=dtype_bytes, default=None,
+                        help="KV cache data type, like -db; default= -db")
+    parser.add_argument("-hw", "--hwspec", type=str, default=None,
+                        help="hardware spec file (YAML/JSON), default= AgentX-NDP defaults")
+    args = parser.parse_args()
+
+    spec = HardwareSpec.load(args.hwspec) if args.hwspec else DEFAULT_SPEC
+    models = {}
+    for entry in args.models:
+        model, _, n_seq = entry.partition(":")
+        models[model] = int(n_seq or 1)
+    try:
+        placement = plan_placement(models, args.maxlen, args.dbyte, spec, args.kvdbyte)
+    except PlacementError as e:
+        print(e)
+        exit(1)
+    for row in placement.rows():
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+    print(f"{placement.used / 2 ** 20:.1f} of {placement.available / 2 ** 20:.1f} MB per channel used")
+
+
+if __name__ == "__main__":
+    main()
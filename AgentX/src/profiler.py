@@ -0,0 +1,191 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# ru_maxrss is in KiB on Linux and in bytes on macOS.
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss(children: bool = False) -> int:
+    """Peak resident set size (bytes) of this process, or of its waited-for children."""
+    if resource is None:
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss * RSS_UNIT
+
+
+@dataclass
+class Span:
+    """
+    A timed region with its nested spans and counters (e.g. trace bytes).
+    children ran one after another inside the span; parallel holds spans that
+    overlapped them (e.g. grafted from worker processes), which are reported
+    apart and not subtracted from the span's self time.
+    """
+    name: str
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    start: float = 0.0
+    duration: float = 0.0
+    peak_rss: int = 0
+    counters: Dict[str, float] = field(default_factory=dict)
+    children: List["Span"] = field(default_factory=list)
+    parallel: List["Span"] = field(default_factory=list)
+
+    @property
+    def self_time(self) -> float:
+        return self.duration - sum(child.duration for child in self.children)
+
+    def as_dict(self, t0: float) -> Dict[str, Any]:
+        # start is made relative to t0 (perf_counter is system-wide, so worker spans line up).
+        return {"name": self.name, "attrs": self.attrs, "start": self.start - t0,
+                "duration": self.duration, "peak_rss": self.peak_rss, "counters": self.counters,
+                "children": [child.as_dict(t0) for child in self.children],
+                "parallel": [span.as_dict(t0) for span in self.parallel]}
+
+    def total_counters(self) -> Dict[str, float]:
+        # Counters of this span and all spans below it, parallel ones included.
+        totals = dict(self.counters)
+        for child in self.children + self.parallel:
+            for name, value in child.total_counters().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+class Profiler:
+    """
+    Hierarchical wall-clock profiler. Disabled by default, in which case
+    span() and count() do nothing, so instrumented code pays no cost.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.root = Span("total", start=time.perf_counter())
+        self._stack = [self.root]
+
+    def enable(self) -> None:
+        # Starts a new profile.
+        self.__init__(enabled=True)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, attrs, time.perf_counter())
+        self._stack[-1].children.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            span.peak_rss = peak_rss()
+            self._stack.pop()
+
+    def timed(self, name: str):
+        # Decorator running every call of a function in a span.
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1) -> None:
+        # Adds value to a counter of the innermost open span.
+        if self.enabled:
+            counters = self._stack[-1].counters
+            counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def detached(self):
+        """
+        Records into a fresh root span that is not attached to the open spans,
+        e.g. in a worker process whose spans are sent back and grafted.
+        """
+        root, stack = Span("detached", start=time.perf_counter()), self._stack
+        self._stack = [root]
+        try:
+            yield root
+        finally:
+            root.duration = time.perf_counter() - root.start
+            self._stack = stack
+
+    def graft(self, spans: List[Span]) -> None:
+        # Adds spans of parallel workers as parallel spans of the innermost open span.
+        if self.enabled:
+            self._stack[-1].parallel.extend(spans)
+
+    def record(self, name: str, start: float, duration: float, parallel: bool = False, **attrs) -> None:
+        """
+        Adds a span measured elsewhere (e.g. summed over a worker thread's
+        calls) below the innermost open span; with parallel, as one of its
+        parallel spans, for time that overlapped its children.
+        """
+        if self.enabled:
+            span = Span(name, attrs, start, duration, peak_rss())
+            (self._stack[-1].parallel if parallel else self._stack[-1].children).append(span)
+
+    def summary_rows(self) -> List[dict]:
+        """
+        Spans aggregated by their path, in first-seen order: calls, total and
+        self time, share of the wall time and the summed counters. Parallel
+        spans (and the spans below them) are aggregated apart, marked
+        "(parallel)": their time overlaps the rest, so it is not part of any
+        self time, and their shares can add up to more than 100%.
+        """
+        self.root.duration = time.perf_counter() - self.root.start
+        paths: Dict[tuple, dict] = {}
+
+        def visit(span: Span, path: tuple) -> None:
+            row = paths.setdefault(path, {"calls": 0, "total": 0.0, "self": 0.0, "counters": {}})
+            row["calls"] += 1
+            row["total"] += span.duration
+            row["self"] += span.self_time
+            for name, value in span.counters.items():
+                row["counters"][name] = row["counters"].get(name, 0) + value
+            for child in span.children:
+                visit(child, path + (child.name,))
+            for child in span.parallel:
+                visit(child, path + (f"{child.name} (parallel)",))
+
+        visit(self.root, ())
+        del paths[()]
+        wall_time = self.root.duration
+        # Every path is listed below its parent, siblings in first-seen order.
+        order = {path: i for i, path in enumerate(paths)}
+        names = sorted({name for row in paths.values() for name in row["counters"]})
+        rows = []
+        for path in sorted(paths, key=lambda p: [order[p[:k]] for k in range(1, len(p) + 1)]):
+            row = paths[path]
+            rows.append({"span": "  " * (len(path) - 1) + path[-1], "calls": row["calls"],
+                         "total (s)": row["total"], "self (s)": row["self"],
+                         "share (%)": 100 * row["total"] / wall_time if wall_time > 0 else 0.0,
+                         **{name: row["counters"].get(name, 0) for name in names}})
+        return rows
+
+    def report(self) -> Dict[str, Any]:
+        self.root.duration = time.perf_counter() - self.root.start
+        return {"wall_time": self.root.duration,
+                "peak_rss": {"self": peak_rss(), "children": peak_rss(children=True)},
+                "counters": self.root.total_counters(),
+                "summary": self.summary_rows(),
+                "spans": [span.as_dict(self.root.start) for span in self.root.children],
+                "parallel": [span.as_dict(self.root.start) for span in self.root.parallel]}
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# Process-wide profiler, enabled by main.py --profile.
+profiler = Profiler()
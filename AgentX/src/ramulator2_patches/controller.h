@@ -25,6 +25,11 @@ class IDRAMController : public Clocked<IDRAMController> {
     IRefreshManager*   m_refresh = nullptr;
 
     int m_channel_id = -1;
+
+    std::vector<Clk_t> m_barrier_clks;   // Cycles at which PIM_BARRIERs retired (NDP controllers)
+    std::vector<Clk_t> m_cmd_counts;      // Commands issued per command id (NDP controllers)
+    std::vector<Clk_t> m_bank_cmd_counts; // Commands issued per (rank, bankgroup, bank); rank/all-bank commands count on every bank they cover
+    Clk_t m_refresh_stall_clks = 0;       // Cycles a pending refresh kept queued requests from issuing
   public:
     /**
      * @brief       Send a request to the memory controller.
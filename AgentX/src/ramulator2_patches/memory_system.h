@@ -30,16 +30,29 @@ class IMemorySystem : public TopLevel<IMemorySystem> {
       }
     };
 
+    // Whether finalize() prints the stats; off when they are read through stats_yaml() instead
+    bool m_print_stats = true;
+
     virtual void finalize() { 
       for (auto component : m_components) {
         component->finalize();
       }
 
+      if (m_print_stats) {
+        std::cout << stats_yaml() << std::endl;
+      }
+    };
+
+    /**
+     * @brief    Returns the stats of the memory system as the YAML document finalize() prints
+     * 
+     */
+    std::string stats_yaml() {
       YAML::Emitter emitter;
       emitter << YAML::BeginMap;
       m_impl->print_stats(emitter);
       emitter << YAML::EndMap;
-      std::cout << emitter.c_str() << std::endl;
+      return emitter.c_str();
     };
 
     /**
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+DEFAULT_CACHE_DIR = ".agentx_cache"
+DEFAULT_MAX_ENTRIES = 4096
+
+_digest_memo: Dict[tuple, str] = {}
+
+
+def file_digest(path) -> str:
+    """sha256 of a file, memoized per (path, mtime, size) so large binaries are hashed once."""
+    path = Path(path).resolve()
+    st = path.stat()
+    memo_key = (str(path), st.st_mtime_ns, st.st_size)
+    if memo_key not in _digest_memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _digest_memo[memo_key] = h.hexdigest()
+    return _digest_memo[memo_key]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __iadd__(self, other: "CacheStats") -> "CacheStats":
+        self.hits += other.hits
+        self.misses += other.misses
+        self.evictions += other.evictions
+        return self
+
+    def __str__(self) -> str:
+        return (f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions "
+                f"(hit rate {self.hit_rate:.0%})")
+
+
+class SimCache:
+    """
+    On-disk cache of simulation results (SQLite under cache_dir).
+
+    Entries are keyed by the simulation parameters and the sha256 of every file
+    the result depends on (AgentX.yaml, the AgentX binary, the trace generator),
+    so rebuilding or reconfiguring the simulator invalidates old entries.
+    Least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        # The timeout lets concurrent simulation processes share one cache.
+        self._db = sqlite3.connect(self.cache_dir / "sim_cache.sqlite", timeout=60)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " params TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)")
+
+    @staticmethod
+    def make_key(params: Dict[str, Any], depends_on: Iterable = ()) -> str:
+        payload = json.dumps({
+            "params": params,
+            "files": [file_digest(p) for p in depends_on],
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        with self._db:
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, params: Dict[str, Any], value: Any) -> None:
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, params, value, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(params, sort_keys=True), json.dumps(value), now, now))
+            self._evict()
+
+    def _evict(self) -> None:
+        n_over = len(self) - self.max_entries
+        if n_over > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used ASC LIMIT ?)", (n_over,))
+            self.stats.evictions += n_over
+
+    def clear(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM results")
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
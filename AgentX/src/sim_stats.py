@@ -0,0 +1,158 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Union
+
+Stat = Union[int, float, str, List[int]]
+
+# Stat names of the AgentX-NDP memory system (AgentX_NDP_system.cpp)
+_CMD_STAT = re.compile(r"num_(.+)_commands")
+_REQUEST_STAT = re.compile(r"total_num_(.+)_requests")
+# NDPLoadStoreTrace log line with the number of trace commands
+_LOADED = re.compile(r"Loaded (\d+) lines")
+# Output lines kept for error messages
+TAIL_LINES = 50
+
+
+def parse_value(text: str) -> Stat:
+    # Scalar or flow-style list stat value.
+    text = text.strip()
+    if text.startswith("["):
+        return [int(v) for v in text.strip("[]").split(",") if v.strip()]
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+@dataclass
+class SimStats:
+    """
+    Statistics of one AgentX run, read from its YAML stats output.
+
+    cycles is memory_system_cycles; barrier_cycles the cycle each PIM_BARRIER
+    retired on all channels. commands maps a DRAM command (MACAB, ACTAB,
+    REFab, ...) to its per-channel issue counts, bank_commands holds the
+    commands covering each bank, channel-major ([channel][rank][bankgroup][bank]
+    flattened), and refresh_stall_cycles the per-channel cycles a pending
+    refresh held back queued requests. Builds without these counters leave
+    them empty. stats keeps every stat by section, e.g.
+    stats["MemorySystem"]["total_num_pim_mac_requests"].
+    """
+    cycles: Optional[int] = None
+    barrier_cycles: List[int] = field(default_factory=list)
+    requests: Dict[str, int] = field(default_factory=dict)
+    commands: Dict[str, List[int]] = field(default_factory=dict)
+    bank_commands: List[int] = field(default_factory=list)
+    refresh_stall_cycles: List[int] = field(default_factory=list)
+    trace_commands: Optional[int] = None
+    stats: Dict[str, Dict[str, Stat]] = field(default_factory=dict)
+    tail: List[str] = field(default_factory=list)
+
+    @property
+    def n_channel(self) -> int:
+        return max((len(counts) for counts in self.commands.values()), default=0)
+
+    def total_commands(self, command: str) -> int:
+        return sum(self.commands.get(command, []))
+
+    def bank_commands_by_channel(self) -> List[List[int]]:
+        n_channel = self.n_channel
+        if not n_channel or len(self.bank_commands) % n_channel:
+            return []
+        n_bank = len(self.bank_commands) // n_channel
+        return [self.bank_commands[ch * n_bank:(ch + 1) * n_bank] for ch in range(n_channel)]
+
+    def refresh_stall_fraction(self) -> float:
+        # Share of the simulated cycles the slowest channel lost to refresh.
+        if not self.cycles or not self.refresh_stall_cycles:
+            return 0.0
+        return max(self.refresh_stall_cycles) / self.cycles
+
+    def stage_breakdown(self, groups: List[str], trailing_barrier: bool = False) -> Dict[str, int]:
+        """
+        Cycles between consecutive barrier retirements, one entry per stage group.
+        Without a trailing barrier the last group runs until the simulation ends.
+        """
+        output = "".join(self.tail)
+        if self.cycles is None:
+            raise RuntimeError("Cannot find 'memory_system_cycles' in AgentX output.\n"
+                               f"Last lines of output:\n{output}")
+
+        n_barriers = len(groups) if trailing_barrier else len(groups) - 1
+        barriers = self.barrier_cycles if "barrier_cycles" in self.stats.get("MemorySystem", {}) else None
+        if barriers is None or len(barriers) != n_barriers:
+            raise RuntimeError(f"Expected {n_barriers} 'barrier_cycles' entries in AgentX output "
+                               f"(rebuild AgentX with set_AgentX.sh).\nLast lines of output:\n{output}")
+
+        bounds = [0] + barriers + ([] if trailing_barrier else [self.cycles])
+        return {group: bounds[i + 1] - bounds[i] for i, group in enumerate(groups)}
+
+
+class StatsParser:
+    """
+    Incremental parser of AgentX stdout: log lines and the YAML stats the
+    components print when the simulation ends ("Section:" maps of scalar,
+    block-list or flow-list stats). Lines are fed one at a time, so the
+    output is never held in memory; only the last TAIL_LINES are kept.
+    """
+
+    def __init__(self) -> None:
+        self.sections: Dict[str, Dict[str, Stat]] = {}
+        self.trace_commands: Optional[int] = None
+        self._section: Optional[Dict[str, Stat]] = None
+        self._list: Optional[List[int]] = None
+        self._tail = deque(maxlen=TAIL_LINES)
+
+    def feed(self, line: str) -> None:
+        self._tail.append(line if line.endswith("\n") else line + "\n")
+        stripped = line.strip()
+        if not stripped:
+            return
+        if self._list is not None and stripped.startswith("- "):
+            self._list.append(int(stripped[2:]))
+            return
+        self._list = None
+
+        if not line[0].isspace():
+            match = _LOADED.search(line)
+            if match:
+                self.trace_commands = int(match.group(1))
+            # A top-level "Name:" opens a stats section; anything else is a log line.
+            key, sep, rest = stripped.partition(":")
+            self._section = self.sections.setdefault(key, {}) if sep and not rest.strip() else None
+            return
+
+        if self._section is None:
+            return
+        key, sep, rest = stripped.partition(":")
+        if not sep:
+            return
+        if rest.strip():
+            self._section[key] = parse_value(rest)
+        else:
+            self._list = self._section[key] = []
+
+    def result(self) -> SimStats:
+        memory = self.sections.get("MemorySystem", {})
+        stats = SimStats(trace_commands=self.trace_commands, stats=self.sections, tail=list(self._tail))
+        stats.cycles = memory.get("memory_system_cycles")
+        stats.barrier_cycles = memory.get("barrier_cycles", [])
+        stats.bank_commands = memory.get("bank_command_counts", [])
+        stats.refresh_stall_cycles = memory.get("refresh_stall_cycles", [])
+        for key, value in memory.items():
+            if (match := _CMD_STAT.fullmatch(key)) and isinstance(value, list):
+                stats.commands[match.group(1)] = value
+            elif (match := _REQUEST_STAT.fullmatch(key)) and isinstance(value, int):
+                stats.requests[match.group(1)] = value
+        return stats
+
+
+def parse_stats(lines: Iterable[str]) -> SimStats:
+    # Parses AgentX output given as an iterable of lines (e.g. a pipe).
+    parser = StatsParser()
+    for line in lines:
+        parser.feed(line)
+    return parser.result()
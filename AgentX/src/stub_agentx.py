@@ -0,0 +1,136 @@
+"""
+Deterministic stand-in for the AgentX binary, for benchmarking on machines
+without a ramulator2 build. It takes the same "-f config.yaml" arguments,
+reads the trace named in the config with the frontend's text, loop and binary
+formats, and prints the log lines and stats sim_stats.py parses:
+
+    every MACAB takes nCCDAB cycles of its channel, channels run in parallel,
+    and a barrier retires once all channels have drained.
+
+Cycles are a function of the trace only, so results are reproducible.
+"""
+import argparse
+import struct
+import sys
+from pathlib import Path
+
+import yaml
+
+try:
+    from src.gen_trace import BINARY_MAGIC, BINARY_OP_SHIFT, LOOP_SUFFIX, OPCODES
+    from src.hw_spec import BASE_TIMINGS
+except ImportError:
+    from gen_trace import BINARY_MAGIC, BINARY_OP_SHIFT, LOOP_SUFFIX, OPCODES
+    from hw_spec import BASE_TIMINGS
+
+import numpy as np
+
+N_CCDAB = BASE_TIMINGS["nCCDAB"]
+# Cycles from the last retired command to the end of the simulation.
+DRAIN_CYCLES = 20
+
+
+def open_trace(path: Path, mode: str):
+    # "-" is stdin, as for the frontend.
+    if str(path) == "-":
+        return open(sys.stdin.fileno(), mode, closefd=False)
+    return open(path, mode)
+
+
+def read_commands(path: Path, trace_format: str):
+    """
+    Yields (command, count) runs of the trace in order; barriers are yielded
+    one line (or loop) at a time so their retirements can be counted.
+    """
+    if trace_format == "binary":
+        with open_trace(path, "rb") as f:
+            magic, n_records = f.read(len(BINARY_MAGIC)), struct.unpack("<Q", f.read(8))[0]
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"{path} is not a binary trace")
+            ops = np.frombuffer(f.read(8 * n_records), dtype="<u8") >> np.uint64(BINARY_OP_SHIFT)
+        barrier = ops == OPCODES["PIM_BARRIER"]
+        # Runs of barriers and non-barriers.
+        edges = np.flatnonzero(np.diff(barrier.astype(np.int8))) + 1
+        for start, stop in zip(np.r_[0, edges], np.r_[edges, ops.size]):
+            yield ("PIM_BARRIER" if barrier[start] else "PIM_MACAB"), int(stop - start)
+        return
+
+    with open_trace(path, "r") as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0].endswith(LOOP_SUFFIX):
+                yield tokens[0][:-len(LOOP_SUFFIX)], int(tokens[3]) * int(tokens[5])
+            else:
+                yield tokens[0], 1
+
+
+def simulate(path: Path, trace_format: str, n_channel: int):
+    # (commands, MACABs, cycles, barrier retirement cycles) of the trace.
+    n_cmd, n_macab, n_barrier_cmds, barriers = 0, 0, 0, []
+    for cmd, count in read_commands(path, trace_format):
+        n_cmd += count
+        if cmd == "PIM_BARRIER":
+            n_barrier_cmds += count
+            # One barrier per channel; it retires when the last one is read.
+            while n_barrier_cmds >= n_channel:
+                n_barrier_cmds -= n_channel
+                barriers.append(-(-n_macab // n_channel) * N_CCDAB)
+        else:
+            n_macab += count
+    return n_cmd, n_macab, -(-n_macab // n_channel) * N_CCDAB + DRAIN_CYCLES, barriers
+
+
+def per_channel(count: int, n_channel: int):
+    # count commands spread round-robin over the channels, as the trace does.
+    return [count // n_channel + (ch < count % n_channel) for ch in range(n_channel)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic AgentX stand-in")
+    parser.add_argument("-f", "--config_file", type=str, required=True,
+                        help="AgentX config (as written by main.py)")
+    args = parser.parse_args()
+
+    with open(args.config_file) as f:
+        config = yaml.safe_load(f)
+    path = Path(config["Frontend"]["path"])
+    trace_format = config["Frontend"].get("format", "text")
+    org = config["MemorySystem"]["DRAM"]["org"]
+    n_channel = org["channel"]
+    # Presets (AgentX_*Gb_x16) have one rank of 4 bank groups of 4 banks.
+    n_bank = org.get("rank", 1) * org.get("bankgroup", 4) * org.get("bank", 4)
+
+    print(f"[LoadStoreTrace] [info] Loading trace file {path} ...", flush=True)
+    if trace_format == "binary" and str(path) != "-":
+        print(f"[LoadStoreTrace] [info] Mapped {path.stat().st_size // 8 - 2} records.", flush=True)
+    else:
+        print(f"[LoadStoreTrace] [info] Streaming trace {'records' if trace_format == 'binary' else 'lines'} "
+              "through a 4096 KiB buffer.", flush=True)
+    n_cmd, n_macab, cycles, barriers = simulate(path, trace_format, n_channel)
+    macabs = per_channel(n_macab, n_channel)
+    print(f"[LoadStoreTrace] [info] Loaded {n_cmd} lines.", flush=True)
+    print("Frontend:")
+    print("  impl: NDPLoadStoreTrace")
+    print("MemorySystem:")
+    print("  impl: AgentX-NDP")
+    print(f"  memory_system_cycles: {cycles}")
+    print(f"  total_num_pim_mac_requests: {n_macab}")
+    print("  barrier_cycles:")
+    for cycle in barriers:
+        print(f"    - {cycle}")
+    print("  num_MACAB_commands:")
+    for count in macabs:
+        print(f"    - {count}")
+    # MACABs cover every bank; the stub never refreshes.
+    print("  bank_command_counts:")
+    for count in macabs:
+        for _ in range(n_bank):
+            print(f"    - {count}")
+    print(f"  refresh_stall_cycles: [{', '.join('0' for _ in range(n_channel))}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import subprocess
+import sys
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+AGENTX_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENTX_DIR))
+
+from benchmark import make_stub_dir, synthetic_latency_tables
+from src.agent_config import default_agent_config, evaluate_latency, latency_tables
+from src.analytical import macab_bound_cycles
+from src.model_config import model_config
+from src.placement import resident_models
+
+MOE_MODEL = "30B-A3B"
+
+
+@pytest.fixture
+def moe_config(tmp_path):
+    # BBH with tool_l on the MoE model, and synthetic H100 tables for its models.
+    config = default_agent_config.with_model("tool_l", MOE_MODEL)
+    directory = latency_tables.directory
+    latency_tables.directory = synthetic_latency_tables(tmp_path, {agent.model for agent in config["BBH"].values()})
+    latency_tables._tables.clear()
+    yield config
+    latency_tables.directory = directory
+    latency_tables._tables.clear()
+
+
+def test_moe_role_is_evaluated(moe_config):
+    calls = []
+
+    def run_lpddrpim(modelsize, *args):
+        calls.append(modelsize)
+        return macab_bound_cycles(modelsize, *args)
+
+    latency = evaluate_latency(["BBH"], 1, 32768, 2, run_lpddrpim, moe_config)
+    dense = evaluate_latency(["BBH"], 1, 32768, 2, macab_bound_cycles)
+    row = next(row for row in latency.rows() if row["role"] == "tool_l")
+    assert MOE_MODEL in calls
+    assert row["size"] == MOE_MODEL and row["agentx"] > 0
+    # Only the activated experts' FFN weights are streamed per token.
+    assert latency.parts["agentx_decode"][-1, 0] < dense.parts["agentx_decode"][-1, 0]
+    assert resident_models(moe_config, ["BBH"])[MOE_MODEL] == 1
+    assert model_config[MOE_MODEL]["layer"] == 48
+
+
+def test_moe_role_end_to_end(tmp_path):
+    # main.py with the stub simulator: points of the MoE model are simulated and evaluated.
+    agentx_dir = tmp_path / "agentx"
+    agentx_dir.mkdir()
+    make_stub_dir(agentx_dir)
+    models = {agent.model for agent in default_agent_config.with_model("tool_l", MOE_MODEL)["BBH"].values()}
+    latency_dir = synthetic_latency_tables(tmp_path, models)
+    output = tmp_path / "latency.csv"
+    res = subprocess.run([sys.executable, str(AGENTX_DIR / "main.py"), "--dataset", "BBH", "--no_cache",
+                          "--model", f"tool_l={MOE_MODEL}", "--agentx_dir", str(agentx_dir),
+                          "--latency_dir", str(latency_dir), "--output", str(output)],
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, cwd=AGENTX_DIR)
+    assert res.returncode == 0, res.stdout
+    assert f"BBH,tool_l,{MOE_MODEL}," in output.read_text()
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+AGENTX_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENTX_DIR))
+
+from main import job_config
+from src.agentx_sim import InProcessSimulator, check_trace, extension_path, trace_records, work_dir
+from src.profiler import peak_rss
+
+# Runs before the peak RSS is taken as the baseline, and runs after it.
+WARMUP_RUNS = 20
+CHECKED_RUNS = 200
+# Growth of the peak RSS allowed over the checked runs. A leaked memory system
+# (DRAM node tree, controllers and their queues) per run exceeds it many times.
+MAX_RSS_GROWTH = 32 << 20
+
+try:
+    extension_path(AGENTX_DIR)
+    HAS_EXTENSION = True
+except FileNotFoundError:
+    HAS_EXTENSION = False
+
+
+@pytest.mark.skipif(not HAS_EXTENSION, reason="the _agentx module is not built (see README)")
+def test_inprocess_memory_is_bounded():
+    # Every run after the first resets the memory system; the old one must be freed.
+    config = job_config(AGENTX_DIR / "AgentX.yaml", work_dir(), Path("-"), "binary")
+    sim = InProcessSimulator(config, str(AGENTX_DIR))
+    records = trace_records("8B", 512, 1, 1024, 2, groups=["score", "context"])
+    first = sim.run(records)
+    for _ in range(WARMUP_RUNS):
+        sim.run(records)
+    baseline = peak_rss()
+    for _ in range(CHECKED_RUNS):
+        assert sim.run(records).cycles == first.cycles
+    assert peak_rss() - baseline < MAX_RSS_GROWTH
+
+
+def test_check_trace():
+    # The module reads traces in place, so they are validated before a run.
+    records = trace_records("8B", 512, 1, 1024, 2, groups=["score", "context"])
+    check_trace(records)
+    check_trace(np.zeros((4, 2), dtype=np.uint64))
+    for trace in (records.astype(np.int64), records.astype(">u8"), records[::2],
+                  np.zeros((4, 3), dtype=np.uint64), np.zeros((2, 2), dtype=np.uint64).T, list(records)):
+        with pytest.raises(ValueError):
+            check_trace(trace)
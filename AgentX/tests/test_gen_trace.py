@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+AGENTX_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENTX_DIR))
+
+from src.agentx_sim import trace_records
+from src.gen_trace import (BINARY_OP_SHIFT, MOE_GROUP_NAMES, OPCODES, decode_stages, expert_selection,
+                           layout_footprint, stage_addrs, stage_len)
+from src.hw_spec import DEFAULT_SPEC
+from src.model_config import get_decode_shapes
+
+MOE_MODEL = "30B-A3B"
+CONTEXT_LEN = 1024
+FFN_GROUPS = ["ffn1", "ffn2", "ffn3"]
+META = get_decode_shapes(MOE_MODEL, 1, CONTEXT_LEN)["meta"]
+
+
+def macab_addrs(records):
+    ops = records >> np.uint64(BINARY_OP_SHIFT)
+    assert set(ops.tolist()) <= {OPCODES["PIM_MACAB"], OPCODES["PIM_BARRIER"]}
+    return records[ops == OPCODES["PIM_MACAB"]] & np.uint64((1 << BINARY_OP_SHIFT) - 1)
+
+
+def moe_stages(experts):
+    model_config = get_decode_shapes(MOE_MODEL, 1, CONTEXT_LEN)
+    return decode_stages(model_config, DEFAULT_SPEC.n_mac(2), experts=experts)
+
+
+def test_only_activated_experts_are_traced():
+    experts = [3, 70]
+    groups, _ = moe_stages(experts)
+    all_groups, _ = moe_stages(list(range(META["n_experts"])))
+    ffn = [MOE_GROUP_NAMES.index(name) for name in FFN_GROUPS]
+    # The selected experts keep their addresses in the layout of all experts.
+    for i in ffn:
+        assert groups[i] == [all_groups[i][e] for e in experts]
+    expected = np.concatenate([stage_addrs(*stage) for i in ffn for stage in groups[i]])
+    addrs = macab_addrs(trace_records(MOE_MODEL, CONTEXT_LEN, 1, 32768, 2, groups=FFN_GROUPS, experts=experts))
+    assert (addrs == expected.astype(np.uint64)).all()
+
+    # A decode step of one token samples top_k experts.
+    per_expert = sum(stage_len(all_groups[i][0]) for i in ffn)
+    assert len(expert_selection(META)) == META["top_k"]
+    assert macab_addrs(trace_records(MOE_MODEL, CONTEXT_LEN, 1, 32768, 2, groups=FFN_GROUPS)).size == \
+        META["top_k"] * per_expert
+
+
+def test_footprint_covers_all_experts():
+    all_groups, end = moe_stages(list(range(META["n_experts"])))
+    last = all_groups[MOE_GROUP_NAMES.index("ffn3")][-1]
+    assert layout_footprint(MOE_MODEL, CONTEXT_LEN) == end
+    assert moe_stages([0])[1] == end
+    assert end >= last[0] + stage_len(last) * DEFAULT_SPEC.gs["col"]
+
+
+def test_router_group_is_traced():
+    groups, _ = moe_stages(None)
+    router = groups[MOE_GROUP_NAMES.index("router")]
+    assert len(router) == 1 and stage_len(router[0]) > 0
+    assert macab_addrs(trace_records(MOE_MODEL, CONTEXT_LEN, 1, 32768, 2, groups=["router"])).size == \
+        stage_len(router[0])
+    # Every group of the layer is separated by a barrier on each channel.
+    records = trace_records(MOE_MODEL, CONTEXT_LEN, 1, 32768, 2)
+    n_barrier = int(((records >> np.uint64(BINARY_OP_SHIFT)) == OPCODES["PIM_BARRIER"]).sum())
+    assert n_barrier == (len(MOE_GROUP_NAMES) - 1) * DEFAULT_SPEC.n_channel
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+AGENTX_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENTX_DIR))
+
+from src.profiler import Profiler, Span
+
+
+def test_parallel_spans_are_reported_apart():
+    # Three overlapping 1 s worker spans inside a 2 s span leave its self time intact.
+    profiler = Profiler(enabled=True)
+    with profiler.span("simulate") as span:
+        profiler.record("write", span.start, 0.5)
+        profiler.graft([Span("point", start=span.start, duration=1.0, counters={"trace_bytes": 8})
+                        for _ in range(3)])
+    span.duration = 2.0
+    assert span.self_time == pytest.approx(1.5)
+    assert profiler.root.total_counters() == {"trace_bytes": 24}
+
+    rows = {row["span"].strip(): row for row in profiler.summary_rows()}
+    assert rows["point (parallel)"]["calls"] == 3
+    assert rows["simulate"]["self (s)"] == pytest.approx(1.5)
+    assert rows["simulate"]["self (s)"] + rows["write"]["self (s)"] == pytest.approx(rows["simulate"]["total (s)"])
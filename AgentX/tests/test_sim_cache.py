@@ -0,0 +1,53 @@
+import sys
+from functools import partial
+from pathlib import Path
+
+AGENTX_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENTX_DIR))
+
+import main
+from benchmark import make_stub_dir
+from main import run_lpddrpim_stages, sim_cache_entry
+from src.agentx_sim import trace_records
+from src.gen_trace import CONTEXT_GROUPS, GROUP_NAMES
+from src.sim_cache import SimCache
+
+
+def weights_key(agentx_dir, modelsize, n_query):
+    return sim_cache_entry(agentx_dir, "AgentX.yaml", modelsize, 4096, 1, 32768, 2,
+                           segment="weights", n_query=n_query)[1]
+
+
+def test_weights_key_depends_on_queries_for_moe(tmp_path):
+    # The experts an MoE model activates are sampled over all queries of the pass.
+    make_stub_dir(tmp_path)
+    assert weights_key(tmp_path, "8B", 1) == weights_key(tmp_path, "8B", 4)
+    assert weights_key(tmp_path, "30B-A3B", 1) != weights_key(tmp_path, "30B-A3B", 4)
+
+
+def test_reused_weights_match_full_simulation(tmp_path, monkeypatch):
+    # Contexts 4096 and 4100 lay the O-proj/FFN weights out at the same address, 4160 does not.
+    agentx_dir = make_stub_dir(tmp_path)
+    weight_groups = [group for group in GROUP_NAMES if group not in CONTEXT_GROUPS]
+    weights = [trace_records("8B", context_len, 1, 32768, 2, groups=weight_groups)
+               for context_len in (4096, 4100, 4160)]
+    assert (weights[0] == weights[1]).all()
+    assert weights[0].size != weights[2].size or (weights[0] != weights[2]).any()
+
+    simulated = []
+    simulate_trace = main.simulate_trace
+
+    def record_groups(*args, groups, **kwargs):
+        simulated.append(groups)
+        return simulate_trace(*args, groups=groups, **kwargs)
+
+    monkeypatch.setattr(main, "simulate_trace", record_groups)
+    cache = SimCache(str(tmp_path / "cache"))
+    run = partial(run_lpddrpim_stages, "8B", batch_size=1, maxlen=32768, dbyte=2,
+                  output=str(tmp_path / "trace"), agentx_dir=str(agentx_dir))
+    run(4096, cache=cache)
+    reused = run(4100, cache=cache)
+    moved = run(4160, cache=cache)
+    assert simulated == [GROUP_NAMES, CONTEXT_GROUPS, GROUP_NAMES]
+    assert reused == run(4100)
+    assert moved == run(4160)